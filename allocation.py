@@ -0,0 +1,269 @@
+"""Alokasi batch pasien ke RS dengan min-cost flow dan hold tempat tidur"""
+from datetime import datetime, timedelta
+import threading
+import uuid
+
+import numpy as np
+
+BED_HOLD_SECONDS = 120
+
+# Jenis tempat tidur default per tingkat kegawatan
+SEVERITY_BED_TYPE = {
+    "critical": "icu",
+    "urgent": "regular",
+    "semi_urgent": "regular",
+    "non_urgent": "regular"
+}
+
+SEVERITY_PRIORITY = ("critical", "urgent", "semi_urgent", "non_urgent")
+
+BED_TYPES = ("icu", "regular", "isolation")
+
+# Batas ukuran min-cost flow eksak (kelas pasien x RS berslot, ~100 ms);
+# di atasnya dipakai alokasi greedy agar request tidak tertahan lama
+ASSIGNMENT_EXACT_CELLS = 40_000
+
+def min_cost_assignment(cost, capacity, phases, max_cells=ASSIGNMENT_EXACT_CELLS):
+    """Assignment pasien -> RS berkapasitas dengan biaya total minimum.
+
+    ``cost`` berukuran ``(pasien, rs)`` (``np.inf`` = tidak boleh),
+    ``capacity`` jumlah slot per RS, dan ``phases`` daftar indeks pasien
+    berurutan prioritas: fase awal dilayani lebih dulu dan tidak pernah
+    dilepas atau dipindah ke RS lain oleh fase berikutnya. Mengembalikan array indeks RS per pasien
+    (-1 = tidak mendapat tempat).
+
+    Pasien dengan baris biaya identik dalam satu fase (mis. korban dari
+    lokasi kejadian yang sama) digabung menjadi satu kelas berkapasitas,
+    lalu diselesaikan sebagai min-cost flow sumber -> kelas -> RS -> sink
+    dengan successive shortest path (Dijkstra berpotensial, vektor NumPy).
+    Setelah satu fase selesai flow-nya dibekukan: edge balik ke kelas fase
+    sebelumnya tidak ikut di graf residual fase berikutnya.
+
+    Bila jumlah kelas x RS berslot melebihi ``max_cells`` dipakai greedy
+    per fase (pasangan kelas-RS termurah lebih dulu): urutan fase dan
+    kapasitas tetap dipatuhi, tetapi biaya total tidak dijamin minimum.
+    """
+    cost = np.asarray(cost, dtype=float)
+    n_patients, n_hospitals = cost.shape
+    assign = np.full(n_patients, -1)
+    if n_patients == 0 or n_hospitals == 0:
+        return assign
+
+    # Kelompokkan pasien identik per fase menjadi kelas
+    class_rows, class_members, class_phase = [], [], []
+    for k, phase in enumerate(phases):
+        phase = np.asarray([p for p in phase if np.isfinite(cost[p]).any()], dtype=int)
+        if len(phase) == 0:
+            continue
+        groups = {}
+        for p in phase:
+            groups.setdefault(cost[p].tobytes(), []).append(p)
+        for members in groups.values():
+            class_rows.append(cost[members[0]])
+            class_members.append(np.array(members))
+            class_phase.append(k)
+    if not class_rows:
+        return assign
+
+    class_cost = np.array(class_rows)
+    supply = np.array([len(m) for m in class_members])
+    class_phase = np.array(class_phase)
+    # RS tanpa slot tidak pernah terpakai, begitu juga kelas yang tidak punya
+    # RS tujuan tersisa; buang lebih dulu
+    capacity = np.asarray(capacity, dtype=int)
+    columns = np.flatnonzero(capacity > 0)
+    classes = np.flatnonzero(np.isfinite(class_cost[:, columns]).any(axis=1))
+    flow = np.zeros((len(class_rows), n_hospitals), dtype=int)
+    if len(classes):
+        solve = _class_min_cost_flow if len(classes) * len(columns) <= max_cells else _class_greedy_flow
+        flow[np.ix_(classes, columns)] = solve(
+            class_cost[np.ix_(classes, columns)], supply[classes], capacity[columns], class_phase[classes])
+
+    for c, members in enumerate(class_members):
+        start = 0
+        for h in np.flatnonzero(flow[c]):
+            assign[members[start:start + flow[c, h]]] = h
+            start += flow[c, h]
+    return assign
+
+def _class_greedy_flow(cost, supply, capacity, class_phase):
+    """Matriks flow ``(kelas, rs)`` greedy untuk ``min_cost_assignment`` berukuran besar"""
+    flow = np.zeros(cost.shape, dtype=int)
+    free = capacity.copy()
+    for phase in np.unique(class_phase):
+        members = np.flatnonzero(class_phase == phase)
+        # Kelas dengan pilihan termurah dilayani lebih dulu, masing-masing ke RS termurah yang masih berslot
+        for c in members[np.argsort(cost[members].min(axis=1), kind="stable")]:
+            remaining = supply[c]
+            while remaining:
+                candidates = np.where(free > 0, cost[c], np.inf)
+                h = int(np.argmin(candidates))
+                if not np.isfinite(candidates[h]):
+                    break
+                amount = min(remaining, free[h])
+                flow[c, h] += amount
+                free[h] -= amount
+                remaining -= amount
+    return flow
+
+def _class_min_cost_flow(cost, supply, capacity, class_phase):
+    """Matriks flow ``(kelas, rs)`` untuk ``min_cost_assignment``"""
+    n_classes, n_hospitals = cost.shape
+    flow = np.zeros((n_classes, n_hospitals), dtype=int)
+    used = np.zeros(n_hospitals, dtype=int)
+    finite = np.isfinite(cost)
+
+    # Potensial awal membuat semua reduced cost kelas->rs >= 0
+    pi_h = np.where(finite, cost, np.inf).min(axis=0)
+    pi_h[~np.isfinite(pi_h)] = 0.0
+    pi_c = np.zeros(n_classes)
+
+    for phase in np.unique(class_phase):
+        members = np.flatnonzero(class_phase == phase)
+        # Potensial kelas baru: max_h(pi_h - cost) agar reduced cost >= 0
+        pi_c[members] = np.where(finite[members], pi_h[None, :] - cost[members], -np.inf).max(axis=1)
+        current = np.zeros(n_classes, dtype=bool)
+        current[members] = True
+
+        while True:
+            remaining = supply - flow.sum(axis=1)
+            free = members[remaining[members] > 0]
+            if len(free) == 0 or not (used < capacity).any():
+                break
+
+            # Sumber dan sink tidak punya edge residual yang dilalui ke arah
+            # sebaliknya, jadi potensialnya bebas dipilih: pi_s = max pi_c,
+            # pi_t = min pi_h dari RS yang masih punya slot (Dijkstra cepat berhenti).
+            pi_s = pi_c[free].max()
+            pi_t = pi_h[used < capacity].min()
+
+            dist_c = np.full(n_classes, np.inf)
+            dist_c[free] = pi_s - pi_c[free]
+            prev_c = np.full(n_classes, -1)
+            done_c = ~current
+            open_c = dist_c.copy()
+            dist_h = np.full(n_hospitals, np.inf)
+            prev_h = np.full(n_hospitals, -1)
+
+            # Kelas bebas tanpa flow hanya terjangkau dari sumber: settle sekaligus
+            untouched = free[~flow[free].any(axis=1)]
+            if len(untouched):
+                reduced = dist_c[untouched][:, None] + cost[untouched] + pi_c[untouched][:, None] - pi_h[None, :]
+                best = reduced.argmin(axis=0)
+                dist_h = reduced[best, np.arange(n_hospitals)]
+                prev_h = untouched[best]
+                done_c[untouched] = True
+                open_c[untouched] = np.inf
+            done_h = np.zeros(n_hospitals, dtype=bool)
+            # RS tanpa pemegang slot hanya punya edge ke sink, jadi tidak perlu
+            # di-pop satu per satu; jarak sink dihitung langsung secara vektor.
+            has_holders = flow[members].any(axis=0)
+            open_h = np.where(has_holders, dist_h, np.inf)
+            sink_cost = np.where(used < capacity, pi_h - pi_t, np.inf)
+            to_sink = dist_h + sink_cost
+            prev_t = to_sink.argmin()
+            dist_t = to_sink[prev_t]
+
+            while True:
+                h = open_h.argmin()
+                c = open_c.argmin()
+                next_h, next_c = open_h[h], open_c[c]
+                if dist_t <= next_h and dist_t <= next_c:
+                    break
+                if next_h <= next_c:
+                    done_h[h] = True
+                    open_h[h] = np.inf
+                    # Edge balik rs -> kelas fase ini yang sedang ditempatkan di rs tsb
+                    holders = members[flow[members, h] > 0]
+                    if len(holders):
+                        candidate = next_h - cost[holders, h] + pi_h[h] - pi_c[holders]
+                        better = (candidate < dist_c[holders]) & ~done_c[holders]
+                        improved = holders[better]
+                        dist_c[improved] = open_c[improved] = candidate[better]
+                        prev_c[improved] = h
+                else:
+                    done_c[c] = True
+                    open_c[c] = np.inf
+                    candidate = next_c + cost[c] + pi_c[c] - pi_h
+                    better = (candidate < dist_h) & ~done_h
+                    dist_h[better] = candidate[better]
+                    open_h[better & has_holders] = candidate[better & has_holders]
+                    prev_h[better] = c
+                    to_sink = candidate + sink_cost
+                    best_sink = to_sink.argmin()
+                    if to_sink[best_sink] < dist_t and better[best_sink]:
+                        dist_t, prev_t = to_sink[best_sink], best_sink
+
+            if not np.isfinite(dist_t):
+                break
+
+            # Jumlah yang bisa digeser: dibatasi supply, slot sink, dan edge balik
+            amount = capacity[prev_t] - used[prev_t]
+            path = []
+            h = prev_t
+            while True:
+                c = prev_h[h]
+                path.append((c, h))
+                old = prev_c[c]
+                if old < 0:
+                    amount = min(amount, remaining[c])
+                    break
+                amount = min(amount, flow[c, old])
+                path.append((c, old))
+                h = old
+
+            used[prev_t] += amount
+            for i, (c, h) in enumerate(path):
+                flow[c, h] += amount if i % 2 == 0 else -amount
+
+            # Update potensial (dibatasi dist_t karena Dijkstra berhenti awal)
+            pi_c[members] += np.minimum(dist_c[members], dist_t)
+            pi_h += np.minimum(dist_h, dist_t)
+
+    return flow
+
+class BedHoldRegistry:
+    """Hold tempat tidur berumur pendek untuk alokasi yang belum dikonfirmasi"""
+
+    def __init__(self, ttl_seconds=BED_HOLD_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.RLock()
+        self._holds = {}
+
+    def _purge(self, now):
+        expired = [hold_id for hold_id, hold in self._holds.items() if hold["expires"] <= now]
+        for hold_id in expired:
+            del self._holds[hold_id]
+
+    def held_counts(self):
+        """Jumlah hold aktif per ``(hospital_id, bed_type)``"""
+        with self.lock:
+            self._purge(datetime.now())
+            counts = {}
+            for hold in self._holds.values():
+                key = (hold["hospital_id"], hold["bed_type"])
+                counts[key] = counts.get(key, 0) + 1
+            return counts
+
+    def create(self, hospital_id, bed_type):
+        with self.lock:
+            now = datetime.now()
+            hold = {
+                "hold_id": uuid.uuid4().hex,
+                "hospital_id": hospital_id,
+                "bed_type": bed_type,
+                "expires": now + timedelta(seconds=self.ttl_seconds)
+            }
+            self._holds[hold["hold_id"]] = hold
+            return hold
+
+    def release(self, hold_id):
+        """Lepas hold; None jika tidak ada atau sudah kedaluwarsa"""
+        with self.lock:
+            self._purge(datetime.now())
+            return self._holds.pop(hold_id, None)
+
+    def __len__(self):
+        with self.lock:
+            self._purge(datetime.now())
+            return len(self._holds)
@@ -0,0 +1,39 @@
+"""Benchmark min_cost_assignment untuk ratusan pasien x ratusan RS.
+
+Skenario "lokasi kejadian" menggabungkan pasien dari beberapa titik asal
+(baris biaya identik per titik, kasus umum korban massal); skenario "acak"
+memberi setiap pasien baris biaya berbeda (kasus terburuk).
+
+Jalankan dari root repo: ``python -m benchmarks.bench_allocation``
+"""
+import time
+
+import numpy as np
+
+from allocation import min_cost_assignment
+
+def scenario(rng, patients, hospitals, sites=None):
+    hospital_score = rng.integers(30, 100, hospitals).astype(float)
+    if sites:
+        site_cost = -(hospital_score[None, :] - rng.random((sites, hospitals)) * 20)
+        cost = site_cost[rng.integers(0, sites, patients)]
+    else:
+        cost = -(hospital_score[None, :] - rng.random((patients, hospitals)) * 20)
+    capacity = rng.integers(0, 6, hospitals)
+    severity = rng.integers(0, 4, patients)
+    phases = [np.flatnonzero(severity == k) for k in range(4)]
+    return cost, capacity, phases
+
+def main():
+    rng = np.random.default_rng(7)
+    print(f"{'skenario':<16} {'pasien':>7} {'rs':>5} {'slot':>6} {'dapat':>6} {'ms':>9}")
+    for name, sites in (("lokasi kejadian", 5), ("acak", None)):
+        for patients, hospitals in ((100, 100), (300, 300), (500, 500)):
+            cost, capacity, phases = scenario(rng, patients, hospitals, sites)
+            start = time.perf_counter()
+            assign = min_cost_assignment(cost, capacity, phases)
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"{name:<16} {patients:>7} {hospitals:>5} {capacity.sum():>6} {(assign >= 0).sum():>6} {elapsed:>9.1f}")
+
+if __name__ == "__main__":
+    main()
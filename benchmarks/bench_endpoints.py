@@ -0,0 +1,379 @@
+"""Benchmark seluruh route Flask pada registry sintetis N RS.
+
+Mode ``client`` memanggil app lewat Flask test client (tanpa jaringan);
+mode ``http`` menjalankan server WSGI lokal lalu mengirim request
+konkuren lewat ``http.client``. Untuk setiap endpoint dicatat latensi
+p50/p95/p99, throughput, dan puncak alokasi memori (tracemalloc, diukur
+lewat test client pada putaran terpisah agar tidak mengganggu latensi
+dan tidak tercampur alokasi sisi klien HTTP).
+
+Jalankan dari root repo, misalnya::
+
+    python -m benchmarks.bench_endpoints --hospitals 1000 --save baseline.json
+    python -m benchmarks.bench_endpoints --hospitals 1000 --compare baseline.json
+
+``/api/replay`` hanya ikut dibenchmark bila ``--state-log`` diberikan.
+``/api/profiler`` diukur lewat GET (laporan) dengan ``PROFILER_ENABLED=1``;
+profiler tidak dijalankan agar sampling tidak memengaruhi endpoint lain.
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import http.client
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from urllib.parse import quote
+
+# Ambang regresi default saat --compare (rasio terhadap baseline)
+REGRESSION_THRESHOLD = 1.2
+MEMORY_SAMPLES = 5
+
+COMPLAINTS = [
+    "nyeri dada sejak pagi dan sesak napas", "demam tinggi tiga hari", "batuk pilek ringan",
+    "kecelakaan motor, luka parah di kepala", "sakit perut hebat dan muntah terus",
+    "gatal di tangan", "pusing hebat setelah jatuh", "kontrol rutin"
+]
+
+class Case:
+    """Satu endpoint yang dibenchmark.
+
+    ``prepare(call)`` menyiapkan request (tidak diukur) dan mengembalikan
+    ``(method, path, body, headers)``; ``call`` dipakai bila persiapan
+    butuh request lain, misalnya membuat hold sebelum konfirmasi.
+    """
+
+    def __init__(self, name, prepare, stream=False):
+        self.name = name
+        self.prepare = prepare
+        self.stream = stream
+
+def build_cases(main, rng):
+    hospitals = main.HOSPITALS
+    ids = [h["id"] for h in hospitals]
+
+    def near_hospital():
+        h = rng.choice(hospitals)
+        return {"lat": h["lat"] + rng.uniform(-0.05, 0.05), "lon": h["lon"] + rng.uniform(-0.05, 0.05)}
+
+    def patient():
+        # Lokasi dibaca parse_location dari field top-level lat/lon/max_km
+        return {"complaint": rng.choice(COMPLAINTS), **near_hospital(), "max_km": 25}
+
+    def get(path, headers=None):
+        return lambda call: ("GET", path, None, headers or {})
+
+    def post_json(body_fn, path):
+        return lambda call: ("POST", path, json.dumps(body_fn()).encode(), {"Content-Type": "application/json"})
+
+    def dashboard_not_modified(call):
+        _, headers, _ = call("GET", "/api/dashboard", None, {})
+        return ("GET", "/api/dashboard", None, {"If-None-Match": headers.get("ETag", "")})
+
+    def hold(call):
+        body = json.dumps({"patients": [patient()]}).encode()
+        _, _, data = call("POST", "/api/referral/allocate", body, {"Content-Type": "application/json"})
+        allocations = [a for a in json.loads(data)["allocations"] if a.get("hold_id")]
+        return allocations[0]["hold_id"] if allocations else "tidak-ada"
+
+    def release_hold(call):
+        return ("DELETE", f"/api/referral/holds/{hold(call)}", None, {})
+
+    def confirm_hold(call):
+        return ("POST", f"/api/referral/holds/{hold(call)}/confirm", None, {})
+
+    def search_query():
+        # Token nama dan kecamatan dari registry, sebagian dipotong jadi prefix
+        h = rng.choice(hospitals)
+        words = (h["name"] + " " + h.get("address", "")).split()
+        word = rng.choice(words).strip(",.").lower()
+        return word[:max(3, len(word) // 2)] if rng.random() < 0.5 else word
+
+    def ingest_body():
+        lines = []
+        for _ in range(500):
+            h = rng.choice(ids)
+            lines.append(json.dumps({"hospital_id": h, "section": "emergency",
+                                     "values": {"waiting_patients": rng.randint(0, 40)}}))
+        return ("\n".join(lines) + "\n").encode()
+
+    patient_ids = itertools.count()
+
+    def events_body():
+        # Siklus penuh per pasien baru agar jumlah pasien aktif tidak terus bertambah
+        lines = []
+        for _ in range(100):
+            h, patient_id, ts = rng.choice(ids), f"bench-{next(patient_ids)}", time.time()
+            for offset, kind in enumerate(("arrival", "triage", "service_start", "discharge")):
+                lines.append(json.dumps({"hospital_id": h, "patient_id": patient_id, "type": kind,
+                                         "complaint": rng.choice(COMPLAINTS), "ts": ts + offset * 600}))
+        return ("\n".join(lines) + "\n").encode()
+
+    return [
+        Case("/", get("/")),
+        Case("/metrics", get("/metrics")),
+        Case("/api/hospitals", get("/api/hospitals")),
+        Case("/api/hospitals/<id>", lambda call: ("GET", f"/api/hospitals/{rng.choice(ids)}", None, {})),
+        Case("/api/hospitals/search", lambda call: ("GET", f"/api/hospitals/search?q={quote(search_query())}", None, {})),
+        Case("/api/overview", get("/api/overview")),
+        Case("/api/visualizations", get("/api/visualizations")),
+        Case("/api/beds", get("/api/beds")),
+        Case("/api/emergency", get("/api/emergency")),
+        Case("/api/queues", get("/api/queues")),
+        Case("/api/metrics", get("/api/metrics")),
+        Case("/api/staff", get("/api/staff")),
+        Case("/api/resources", get("/api/resources")),
+        Case("/api/trends", get("/api/trends")),
+        Case("/api/history", lambda call: ("GET", f"/api/history?resolution=1h&hospital_id={rng.choice(ids)}", None, {})),
+        Case("/api/cache/stats", get("/api/cache/stats")),
+        Case("/api/profiler", get("/api/profiler")),
+        Case("/api/dashboard", get("/api/dashboard")),
+        Case("/api/dashboard (304)", dashboard_not_modified),
+        *([Case("/api/replay", lambda call: ("GET", f"/api/replay?at={time.time()}", None, {}))]
+          if main.snapshot_log is not None else []),
+        Case("/api/stream (snapshot)", get("/api/stream"), stream=True),
+        Case("/api/triage/batch", post_json(lambda: {"complaints": rng.choices(COMPLAINTS, k=50)}, "/api/triage/batch")),
+        Case("/api/referral/recommend", post_json(lambda: {"complaint": rng.choice(COMPLAINTS)}, "/api/referral/recommend")),
+        Case("/api/referral/recommend (lokasi)", post_json(
+            lambda: {"complaint": rng.choice(COMPLAINTS), **near_hospital(), "limit": 5},
+            "/api/referral/recommend")),
+        Case("/api/referral/recommend/batch", post_json(
+            lambda: {"patients": [patient() for _ in range(20)], "limit": 3}, "/api/referral/recommend/batch")),
+        Case("/api/referral/allocate", post_json(
+            lambda: {"patients": [patient() for _ in range(10)]}, "/api/referral/allocate")),
+        Case("DELETE /api/referral/holds/<id>", release_hold),
+        Case("/api/referral/holds/<id>/confirm", confirm_hold),
+        Case("/api/ingest (500 baris)", lambda call: ("POST", "/api/ingest", ingest_body(),
+                                                      {"Content-Type": "application/x-ndjson"})),
+        Case("/api/events (400 baris)", lambda call: ("POST", "/api/events", events_body(),
+                                                      {"Content-Type": "application/x-ndjson"})),
+    ]
+
+# ============================
+# DRIVER
+# ============================
+def client_caller(app):
+    """``call(method, path, body, headers) -> (status, headers, body)`` via test client"""
+    client = app.test_client()
+
+    def call(method, path, body, headers, stream=False):
+        response = client.open(path, method=method, data=body, headers=headers, buffered=not stream)
+        if stream:
+            # Baca sampai event pertama (snapshot) lalu tutup koneksi
+            data = b""
+            for chunk in response.response:
+                data += chunk
+                if b"event: snapshot" in data:
+                    break
+            response.close()
+            return response.status_code, dict(response.headers), data
+        return response.status_code, dict(response.headers), response.get_data()
+    return call
+
+def http_caller(host, port):
+    local = threading.local()
+
+    def call(method, path, body, headers, stream=False):
+        connection = getattr(local, "connection", None)
+        if connection is None:
+            connection = local.connection = http.client.HTTPConnection(host, port, timeout=60)
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            if stream:
+                data = b""
+                while b"event: snapshot" not in data:
+                    line = response.fp.readline()
+                    if not line:
+                        break
+                    data += line
+                connection.close()
+                local.connection = None
+            else:
+                data = response.read()
+            if response.will_close:
+                connection.close()
+                local.connection = None
+            return response.status, dict(response.getheaders()), data
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            local.connection = None
+            raise
+    return call
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def run_case(case, make_call, requests, concurrency):
+    """Latensi per request (ms) dan throughput untuk satu endpoint"""
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker():
+        nonlocal errors
+        call = make_call()
+        for _ in counter:
+            method, path, body, headers = case.prepare(call)
+            start = time.perf_counter()
+            try:
+                status, _, _ = call(method, path, body, headers, stream=case.stream)
+            except (http.client.HTTPException, OSError):
+                status = 599
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+                if status >= 400:
+                    errors += 1
+
+    start = time.perf_counter()
+    if concurrency <= 1:
+        worker()
+    else:
+        with ThreadPoolExecutor(concurrency) as pool:
+            for future in [pool.submit(worker) for _ in range(concurrency)]:
+                future.result()
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else 0.0
+    }
+
+def peak_memory(case, call):
+    """Puncak alokasi Python (KiB) selama beberapa request endpoint ini"""
+    peak = 0
+    for _ in range(MEMORY_SAMPLES):
+        method, path, body, headers = case.prepare(call)
+        tracemalloc.start()
+        call(method, path, body, headers, stream=case.stream)
+        _, current_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak = max(peak, current_peak)
+    return round(peak / 1024, 1)
+
+def start_server(app):
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="bench-http", daemon=True).start()
+    return server
+
+# ============================
+# LAPORAN & BASELINE
+# ============================
+def print_report(results, baseline=None, threshold=REGRESSION_THRESHOLD):
+    regressions = []
+    for mode, cases in results["modes"].items():
+        print(f"\n[{mode}] {results['hospitals']} RS, concurrency {results['concurrency'][mode]}")
+        print(f"{'endpoint':<36} {'n':>5} {'err':>4} {'p50':>9} {'p95':>9} {'p99':>9} {'req/s':>9} {'peak KiB':>10}")
+        for name, r in cases.items():
+            line = (f"{name:<36} {r['requests']:>5} {r['errors']:>4} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} "
+                    f"{r['p99_ms']:>9.2f} {r['throughput_rps']:>9.1f} {r['peak_kib']:>10.1f}")
+            old = (baseline or {}).get("modes", {}).get(mode, {}).get(name)
+            if old:
+                ratio = r["p95_ms"] / old["p95_ms"] if old["p95_ms"] else 1.0
+                line += f"  p95 x{ratio:.2f}"
+                if ratio > threshold:
+                    line += "  REGRESI"
+                    regressions.append((mode, name, ratio))
+            print(line)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hospitals", type=int, default=1000, help="jumlah RS sintetis (8 - 50000)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--requests", type=int, default=200, help="request per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8, help="klien konkuren mode http")
+    parser.add_argument("--mode", choices=("client", "http", "both"), default="both")
+    parser.add_argument("--only", help="jalankan endpoint yang namanya mengandung teks ini")
+    parser.add_argument("--state-log", help="direktori log state (STATE_LOG_DIR) untuk /api/replay")
+    parser.add_argument("--save", help="simpan hasil sebagai baseline JSON")
+    parser.add_argument("--compare", help="bandingkan dengan baseline JSON")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    # Registry dan data simulasi ditentukan saat import main
+    os.environ["SCENARIO_HOSPITALS"] = str(args.hospitals)
+    os.environ["SCENARIO_SEED"] = str(args.seed)
+    os.environ.setdefault("HISTORY_RETENTION_DAYS", "7")
+    os.environ.setdefault("PROFILER_ENABLED", "1")
+    if args.state_log:
+        os.environ["STATE_LOG_DIR"] = args.state_log
+    started = time.perf_counter()
+    import main as app_module
+    startup = time.perf_counter() - started
+    if app_module.snapshot_log is not None:
+        # Thread log menulis checkpoint awal; replay butuh minimal satu checkpoint
+        app_module.snapshot_log.start()
+        while not app_module.snapshot_log.stats()["checkpoints"]:
+            time.sleep(0.05)
+
+    rng = random.Random(args.seed)
+    cases = build_cases(app_module, rng)
+    if args.only:
+        cases = [case for case in cases if args.only in case.name]
+
+    results = {
+        "hospitals": args.hospitals,
+        "seed": args.seed,
+        "requests": args.requests,
+        "startup_s": round(startup, 3),
+        "python": platform.python_version(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "concurrency": {},
+        "modes": {}
+    }
+    modes = ("client", "http") if args.mode == "both" else (args.mode,)
+    memory = {}
+    for case in cases:
+        memory[case.name] = peak_memory(case, client_caller(app_module.app))
+    for mode in modes:
+        if mode == "client":
+            make_call = lambda: client_caller(app_module.app)
+            concurrency = 1
+            server = None
+        else:
+            server = start_server(app_module.app)
+            make_call = lambda: http_caller("127.0.0.1", server.server_port)
+            concurrency = args.concurrency
+        results["concurrency"][mode] = concurrency
+        mode_results = results["modes"][mode] = {}
+        for case in cases:
+            print(f"  {mode}: {case.name}", file=sys.stderr)
+            result = run_case(case, make_call, args.requests, concurrency)
+            result["peak_kib"] = memory[case.name]
+            mode_results[case.name] = result
+        if server is not None:
+            server.shutdown()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print(f"startup (import main): {results['startup_s']} s")
+    regressions = print_report(results, baseline, args.threshold)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nbaseline disimpan ke {args.save}")
+    if regressions:
+        print(f"\n{len(regressions)} endpoint melewati ambang x{args.threshold} (p95)")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Representasi kolumnar (struct-of-arrays) untuk field numerik per RS"""
+import numpy as np
+
+# Nama kolom -> (section, path ke field di record). Record section-section
+# ini satu per RS dan berurutan sesuai registry, jadi posisi = slot RS.
+COLUMN_FIELDS = {
+    "icu_total": ("beds", ("icu", "total")),
+    "icu_occupied": ("beds", ("icu", "occupied")),
+    "regular_total": ("beds", ("regular", "total")),
+    "regular_occupied": ("beds", ("regular", "occupied")),
+    "isolation_total": ("beds", ("isolation", "total")),
+    "isolation_occupied": ("beds", ("isolation", "occupied")),
+    "er_waiting": ("emergency", ("waiting_patients",)),
+    "er_in_treatment": ("emergency", ("in_treatment",)),
+    "er_visits": ("metrics", ("metrics", "er_visits")),
+    "admissions": ("metrics", ("metrics", "total_admissions")),
+    "outpatient_visits": ("metrics", ("metrics", "outpatient_visits")),
+    "doctors_on_duty": ("staff", ("staff", "doctors", "on_duty")),
+    "doctors_total": ("staff", ("staff", "doctors", "total")),
+    "traffic": ("heatmap", ("hourly_data",))
+}
+
+# Kolom dengan running total (sum seluruh RS) yang dijaga di setiap penulisan
+TOTAL_COLUMNS = (
+    "icu_total", "icu_occupied", "regular_total", "regular_occupied",
+    "isolation_total", "isolation_occupied", "er_waiting", "er_in_treatment"
+)
+
+COLUMN_SECTIONS = frozenset(section for section, _ in COLUMN_FIELDS.values())
+
+def _field(record, path):
+    for key in path:
+        record = record[key]
+    return record
+
+def _freeze(array):
+    array.flags.writeable = False
+    return array
+
+class HospitalColumns:
+    """Satu array bertipe per field, diindeks slot RS, plus running total.
+
+    Objek ini immutable: ``with_records`` mengembalikan versi baru yang
+    hanya menyalin kolom yang tersentuh dan menyesuaikan total dengan
+    selisih nilai lama/baru, sehingga snapshot lama tetap konsisten dan
+    agregat overview cukup dibaca dari ``totals`` (O(1)).
+    """
+
+    def __init__(self, columns, totals, size):
+        self._columns = columns
+        self.totals = totals
+        self.size = size
+
+    @classmethod
+    def from_sections(cls, sections):
+        """Bangun semua kolom dari record section (reload penuh)"""
+        columns = {}
+        size = 0
+        for name, (section, path) in COLUMN_FIELDS.items():
+            records = sections[section]
+            size = len(records)
+            columns[name] = _freeze(np.array([_field(record, path) for record in records], dtype=np.int32))
+        totals = {name: int(columns[name].sum(dtype=np.int64)) for name in TOTAL_COLUMNS}
+        return cls(columns, totals, size)
+
+    @classmethod
+    def from_arrays(cls, columns):
+        """Bungkus array kolom yang sudah ada (mis. hasil mmap checkpoint); total dihitung ulang"""
+        columns = {name: _freeze(array) if array.flags.writeable else array for name, array in columns.items()}
+        totals = {name: int(columns[name].sum(dtype=np.int64)) for name in TOTAL_COLUMNS}
+        return cls(columns, totals, len(next(iter(columns.values()))))
+
+    @classmethod
+    def concat(cls, parts):
+        """Gabungkan kolom beberapa kumpulan RS berurutan (mis. shard wilayah); total = jumlah total bagian"""
+        columns = {name: _freeze(np.concatenate([part[name] for part in parts])) for name in COLUMN_FIELDS}
+        totals = {name: sum(part.totals[name] for part in parts) for name in TOTAL_COLUMNS}
+        return cls(columns, totals, sum(part.size for part in parts))
+
+    def __getitem__(self, name):
+        return self._columns[name]
+
+    def with_records(self, section, changes):
+        """Versi baru setelah record ``changes = [(slot, record)]`` diganti (slot unik)"""
+        names = [name for name, (owner, _) in COLUMN_FIELDS.items() if owner == section]
+        if not names or not changes:
+            return self
+        columns = dict(self._columns)
+        totals = dict(self.totals)
+        slots = np.fromiter((slot for slot, _ in changes), dtype=np.intp, count=len(changes))
+        for name in names:
+            path = COLUMN_FIELDS[name][1]
+            column = self._columns[name].copy()
+            values = np.array([_field(record, path) for _, record in changes], dtype=np.int32)
+            if name in totals:
+                totals[name] += int(values.sum(dtype=np.int64) - column[slots].sum(dtype=np.int64))
+            column[slots] = values
+            columns[name] = _freeze(column)
+        return HospitalColumns(columns, totals, self.size)
+
+    def beds_available(self, bed_type):
+        return self._columns[f"{bed_type}_total"] - self._columns[f"{bed_type}_occupied"]
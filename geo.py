@@ -0,0 +1,59 @@
+"""Indeks spasial grid untuk registry RS (pencarian kandidat dalam radius)"""
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+GRID_CELL_KM = 5.0
+KM_PER_DEGREE = 111.32
+
+def haversine_km(lat, lon, lats, lons):
+    """Jarak (km) dari satu titik ke array titik, tervektorisasi"""
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+class GridIndex:
+    """Grid lat/lon dengan sel berukuran tetap (km).
+
+    Query radius hanya memeriksa sel yang beririsan dengan kotak pembatas
+    lingkaran, jadi biayanya sebanding jumlah RS di sekitar titik, bukan
+    ukuran registry.
+    """
+
+    def __init__(self, points, cell_km=GRID_CELL_KM):
+        self.cell_deg = cell_km / KM_PER_DEGREE
+        self.lats = np.array([lat for lat, _ in points], dtype=float)
+        self.lons = np.array([lon for _, lon in points], dtype=float)
+        self._cells = {}
+        for i, (lat, lon) in enumerate(points):
+            self._cells.setdefault(self._cell(lat, lon), []).append(i)
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg))
+
+    def within(self, lat, lon, radius_km):
+        """Indeks titik dalam radius, beserta jaraknya (km)"""
+        dlat = radius_km / KM_PER_DEGREE
+        dlon = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+        lat_lo, lon_lo = self._cell(lat - dlat, lon - dlon)
+        lat_hi, lon_hi = self._cell(lat + dlat, lon + dlon)
+
+        candidates = []
+        if (lat_hi - lat_lo + 1) * (lon_hi - lon_lo + 1) > len(self._cells):
+            # Radius sangat besar: lebih murah menyusuri sel yang terisi saja
+            for (cell_lat, cell_lon), members in self._cells.items():
+                if lat_lo <= cell_lat <= lat_hi and lon_lo <= cell_lon <= lon_hi:
+                    candidates.extend(members)
+        else:
+            for cell_lat in range(lat_lo, lat_hi + 1):
+                for cell_lon in range(lon_lo, lon_hi + 1):
+                    candidates.extend(self._cells.get((cell_lat, cell_lon), ()))
+        if not candidates:
+            return np.array([], dtype=int), np.array([])
+
+        candidates = np.array(candidates, dtype=int)
+        distances = haversine_km(lat, lon, self.lats[candidates], self.lons[candidates])
+        inside = distances <= radius_km
+        return candidates[inside], distances[inside]
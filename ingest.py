@@ -0,0 +1,239 @@
+"""Ingest update parsial dari sistem RS (NDJSON) dalam micro-batch atomik"""
+from collections import OrderedDict
+import json
+import math
+import threading
+import time
+
+INGEST_BATCH_SIZE = 2000
+INGEST_BATCH_SECONDS = 0.05
+INGEST_IDEMPOTENCY_SIZE = 100000
+INGEST_MAX_ERRORS = 100
+INGEST_CHUNK_BYTES = 64 * 1024
+# Hitungan disimpan di kolom int32 (columnar.py)
+INGEST_INT_MAX = 2 ** 31 - 1
+
+# Field identitas dan turunan (dihitung ulang server) tidak boleh dikirim
+INGEST_READONLY = {"hospital_id", "hospital_name", "polyclinic", "last_updated", "date"}
+INGEST_DERIVED = {
+    "beds": {"available", "occupancy_rate"},
+    "emergency": {"status"}
+}
+
+class IngestError(ValueError):
+    """Satu baris update tidak valid"""
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _is_count(value):
+    return isinstance(value, int) and not isinstance(value, bool) and 0 <= value <= INGEST_INT_MAX
+
+def _reject_constant(name):
+    raise ValueError(f"{name} tidak diizinkan")
+
+def validate_values(values, template, derived, path=""):
+    """Cocokkan update parsial dengan bentuk record yang ada (key dan tipe)"""
+    if not isinstance(values, dict) or not values:
+        raise IngestError(f"{path or 'values'} harus object yang tidak kosong")
+    for key, value in values.items():
+        name = f"{path}.{key}" if path else key
+        if key in INGEST_READONLY or key in derived:
+            raise IngestError(f"Field {name} tidak boleh diubah")
+        if key not in template:
+            raise IngestError(f"Field tidak dikenal: {name}")
+        expected = template[key]
+        if isinstance(expected, dict):
+            validate_values(value, expected, derived, name)
+        elif isinstance(expected, int) and not isinstance(expected, bool):
+            # Hitungan: bilangan bulat dalam batas int32 (3.7 atau 3e9 akan berbeda dari kolom)
+            if not _is_count(value):
+                raise IngestError(f"Field {name} harus bilangan bulat 0..{INGEST_INT_MAX}")
+        elif _is_number(expected):
+            if not _is_number(value) or not math.isfinite(value) or value < 0:
+                raise IngestError(f"Field {name} harus angka >= 0")
+        elif isinstance(expected, str):
+            if not isinstance(value, str):
+                raise IngestError(f"Field {name} harus string")
+        else:
+            raise IngestError(f"Field {name} tidak boleh diubah")
+
+def merge_values(base, values):
+    """Gabungkan update parsial (nested) tanpa mengubah ``base``"""
+    merged = dict(base)
+    for key, value in values.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_values(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+def check_invariants(section, record):
+    """Aturan antar-field setelah update diterapkan ke record"""
+    if section == "beds":
+        for bed_type, info in record.items():
+            if isinstance(info, dict) and info.get("occupied", 0) > info.get("total", 0):
+                raise IngestError(f"{bed_type}.occupied melebihi total")
+
+def iter_lines(stream, chunk_size=INGEST_CHUNK_BYTES):
+    """Baris dari stream biner, dibaca per chunk (``readline`` per baris lambat)"""
+    tail = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        yield from lines
+    if tail:
+        yield tail
+
+class IngestPipeline:
+    """Validasi, dedup, dan coalescing update sebelum ``store.apply``.
+
+    Update dengan kunci record yang sama dalam satu micro-batch digabung
+    menjadi satu, lalu seluruh batch diterapkan sebagai satu versi snapshot.
+    ``idempotency_key`` yang sudah pernah diterapkan dan ``seq`` yang tidak
+    lebih besar dari ``seq`` terakhir per ``source`` dilewati. Pembaca
+    dashboard tidak ikut terkunci karena mereka hanya membaca snapshot.
+    """
+
+    def __init__(self, store, sections, idempotency_size=INGEST_IDEMPOTENCY_SIZE):
+        self.store = store
+        self.sections = sections
+        self.idempotency_size = idempotency_size
+        self._seen = OrderedDict()
+        self._last_seq = {}
+        self._lock = threading.Lock()
+
+    def _parse(self, update):
+        """Normalisasi satu update; kunci record dan field kontrolnya"""
+        if not isinstance(update, dict):
+            raise IngestError("Setiap baris harus object JSON")
+        hospital_id = update.get("hospital_id")
+        section = update.get("section")
+        if not isinstance(hospital_id, str) or not hospital_id:
+            raise IngestError("hospital_id wajib diisi")
+        if section not in self.sections:
+            raise IngestError(f"Section tidak didukung: {section}")
+        polyclinic = update.get("polyclinic")
+        if section == "queues" and not isinstance(polyclinic, str):
+            raise IngestError("polyclinic wajib diisi untuk section queues")
+
+        seq = update.get("seq")
+        if seq is not None and (not isinstance(seq, int) or isinstance(seq, bool)):
+            raise IngestError("seq harus bilangan bulat")
+        idempotency_key = update.get("idempotency_key")
+        if idempotency_key is not None and not isinstance(idempotency_key, str):
+            raise IngestError("idempotency_key harus string")
+        key = (hospital_id, polyclinic) if section == "queues" else hospital_id
+        return {
+            "section": section,
+            "key": key,
+            "hospital_id": hospital_id,
+            "polyclinic": polyclinic,
+            "values": update.get("values"),
+            "source": update.get("source") or hospital_id,
+            "seq": seq,
+            "idempotency_key": idempotency_key
+        }
+
+    def process(self, lines):
+        """Terapkan satu micro-batch ``[(nomor_baris, update)]`` secara atomik"""
+        result = {"accepted": 0, "duplicates": 0, "stale": 0, "errors": []}
+        with self._lock:
+            pending = {}
+            batch_keys, batch_seq = set(), {}
+            for line, update in lines:
+                try:
+                    item = self._parse(update)
+                    idempotency_key = item["idempotency_key"]
+                    if idempotency_key is not None and (idempotency_key in self._seen or idempotency_key in batch_keys):
+                        result["duplicates"] += 1
+                        continue
+                    source, seq = item["source"], item["seq"]
+                    if seq is not None:
+                        last = batch_seq.get(source, self._last_seq.get(source))
+                        if last is not None and seq <= last:
+                            result["stale"] += 1
+                            continue
+
+                    record_key = (item["section"], item["key"])
+                    current = self.store.record(item["section"], item["key"])
+                    if current is None:
+                        raise IngestError(f"Record tidak ditemukan: {item['section']} {item['key']}")
+                    validate_values(item["values"], current, INGEST_DERIVED.get(item["section"], ()))
+                    coalesced = pending.get(record_key)
+                    values = merge_values(coalesced["values"], item["values"]) if coalesced else item["values"]
+                    if item["section"] == "beds":
+                        check_invariants("beds", merge_values(current, values))
+                except IngestError as e:
+                    if len(result["errors"]) < INGEST_MAX_ERRORS:
+                        result["errors"].append({"line": line, "error": str(e)})
+                    continue
+
+                pending[record_key] = {
+                    "hospital_id": item["hospital_id"],
+                    "section": item["section"],
+                    "polyclinic": item["polyclinic"],
+                    "values": values
+                }
+                if idempotency_key is not None:
+                    batch_keys.add(idempotency_key)
+                if seq is not None:
+                    batch_seq[source] = seq
+                result["accepted"] += 1
+
+            if pending:
+                self.store.apply(list(pending.values()))
+            # Kunci dan seq baru dicatat setelah batch benar-benar diterapkan
+            for idempotency_key in batch_keys:
+                self._seen[idempotency_key] = True
+            while len(self._seen) > self.idempotency_size:
+                self._seen.popitem(last=False)
+            self._last_seq.update(batch_seq)
+        result["applied"] = len(pending)
+        return result
+
+    def ingest(self, stream, batch_size=INGEST_BATCH_SIZE, batch_seconds=INGEST_BATCH_SECONDS):
+        """Baca NDJSON dari iterable baris (bytes/str) dan terapkan per micro-batch"""
+        return ingest_stream(stream, self.process, batch_size, batch_seconds)
+
+def ingest_stream(stream, process, batch_size=INGEST_BATCH_SIZE, batch_seconds=INGEST_BATCH_SECONDS):
+    """Parse NDJSON per baris dan serahkan micro-batch ``[(baris, update)]`` ke ``process``.
+
+    ``process`` boleh berjalan di proses lain (mode multi-worker): parsing
+    JSON tetap dikerjakan di worker, hanya batch hasil parse yang dikirim.
+    """
+    summary = {"lines": 0, "accepted": 0, "applied": 0, "duplicates": 0, "stale": 0, "batches": 0, "errors": []}
+
+    def flush(batch):
+        result = process(batch)
+        summary["batches"] += 1
+        for field in ("accepted", "applied", "duplicates", "stale"):
+            summary[field] += result[field]
+        room = INGEST_MAX_ERRORS - len(summary["errors"])
+        summary["errors"].extend(result["errors"][:max(room, 0)])
+
+    batch = []
+    started = time.monotonic()
+    for line, raw in enumerate(stream, 1):
+        if not raw.strip():
+            continue
+        summary["lines"] += 1
+        try:
+            # NaN/Infinity bukan JSON standar dan tidak bisa disimpan sebagai hitungan
+            batch.append((line, json.loads(raw, parse_constant=_reject_constant)))
+        except ValueError:
+            if len(summary["errors"]) < INGEST_MAX_ERRORS:
+                summary["errors"].append({"line": line, "error": "JSON tidak valid"})
+            continue
+        # Flush per ukuran atau per waktu agar stream panjang tetap terlihat live
+        if len(batch) >= batch_size or time.monotonic() - started >= batch_seconds:
+            flush(batch)
+            batch = []
+            started = time.monotonic()
+    if batch:
+        flush(batch)
+    summary["rejected"] = summary["lines"] - summary["accepted"] - summary["duplicates"] - summary["stale"]
+    return summary
@@ -0,0 +1,241 @@
+"""Instrumentasi ringan: histogram/counter format Prometheus dan sampling profiler"""
+from collections import Counter as StackCounter
+from contextlib import ContextDecorator
+import bisect
+import os
+import sys
+import threading
+import time
+
+# Batas atas bucket (detik); cukup rapat di bawah 10 ms tempat sebagian besar request cache berada
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROFILER_INTERVAL_SECONDS = 0.005
+PROFILER_MAX_SECONDS = 300
+PROFILER_STACK_DEPTH = 30
+PROFILER_TOP_STACKS = 20
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Timer(ContextDecorator):
+    """``with histogram.time(...)`` atau sebagai decorator fungsi"""
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+        self._local = threading.local()
+
+    def __enter__(self):
+        starts = getattr(self._local, "starts", None)
+        if starts is None:
+            starts = self._local.starts = []
+        starts.append(time.perf_counter())
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self._local.starts.pop(), *self.labels)
+        return False
+
+class Histogram:
+    """Histogram bucket tetap per kombinasi label (count kumulatif dihitung saat render)"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._timers = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # [count per bucket..., +Inf], sum
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def time(self, *labels):
+        timer = self._timers.get(labels)
+        if timer is None:
+            timer = self._timers.setdefault(labels, _Timer(self, labels))
+        return timer
+
+    def render(self):
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        lines = []
+        for labels, counts, total in sorted(series):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labels, labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, labels)} {cumulative}")
+        return lines
+
+class Counter:
+    """Counter monoton per kombinasi label"""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            series = sorted(self._series.items())
+        return [f"{self.name}{_labels(self.labels, labels)} {_number(value)}" for labels, value in series]
+
+class MetricsRegistry:
+    """Kumpulan metrik yang dirender ke format teks Prometheus 0.0.4"""
+
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, documentation, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        metric = Counter(name, documentation, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, collect):
+        """``collect()`` -> ``[(nama, tipe, dokumentasi, nilai)]`` yang dibaca saat render"""
+        self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            for name, kind, documentation, value in collect():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+class SamplingProfiler:
+    """Sampling profiler opt-in untuk satu route.
+
+    Selama aktif, satu thread mengambil stack thread-thread yang sedang
+    melayani route target setiap ``interval`` lewat ``sys._current_frames()``.
+    Thread request hanya mendaftarkan route-nya (satu operasi dict), jadi
+    biaya saat nonaktif praktis nol dan saat aktif dibatasi laju sampling.
+    """
+
+    def __init__(self, interval=PROFILER_INTERVAL_SECONDS, depth=PROFILER_STACK_DEPTH):
+        self.interval = interval
+        self.depth = depth
+        self.route = None
+        self.enabled = False
+        self.samples = 0
+        self.started = None
+        self._deadline = None
+        self._stacks = StackCounter()
+        self._active = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def enter(self, route):
+        """Dipanggil di awal request; no-op bila profiler tidak aktif"""
+        if self.enabled:
+            self._active[threading.get_ident()] = route
+
+    def leave(self):
+        self._active.pop(threading.get_ident(), None)
+
+    def start(self, route, seconds=None):
+        """Mulai sampling ``route`` (hasil sebelumnya dibuang)"""
+        self.stop()
+        with self._lock:
+            self.route = route
+            self.samples = 0
+            self.started = time.time()
+            self._stacks = StackCounter()
+            self._deadline = time.monotonic() + min(seconds or PROFILER_MAX_SECONDS, PROFILER_MAX_SECONDS)
+            self._stop.clear()
+            self.enabled = True
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval) and time.monotonic() < self._deadline:
+            targets = [ident for ident, route in list(self._active.items()) if route == self.route and ident != own]
+            if not targets:
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for ident in targets:
+                    frame = frames.get(ident)
+                    if frame is None:
+                        continue
+                    self._stacks[self._stack(frame)] += 1
+                    self.samples += 1
+        self.enabled = False
+        self._active.clear()
+
+    def _stack(self, frame):
+        stack = []
+        while frame is not None and len(stack) < self.depth:
+            code = frame.f_code
+            stack.append(f"{os.path.basename(code.co_filename)}:{frame.f_lineno} {code.co_name}")
+            frame = frame.f_back
+        return tuple(reversed(stack))
+
+    def report(self, limit=PROFILER_TOP_STACKS):
+        """Stack terpanas (root -> leaf) beserta jumlah dan porsi sampel"""
+        with self._lock:
+            samples = self.samples
+            hottest = self._stacks.most_common(limit)
+        return {
+            "route": self.route,
+            "running": self.running,
+            "started": self.started,
+            "interval_seconds": self.interval,
+            "samples": samples,
+            "stacks": [
+                {"count": count, "fraction": round(count / samples, 4), "frames": list(frames)}
+                for frames, count in hottest
+            ]
+        }
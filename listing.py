@@ -0,0 +1,223 @@
+"""Pagination cursor, filter, projection field, dan output JSON/NDJSON bertahap"""
+import base64
+import json
+import operator
+import re
+
+import numpy as np
+
+LIST_PARAMS = ("hospital_id", "type", "district", "polyclinic", "where", "fields", "limit", "cursor", "format")
+LIST_MAX_LIMIT = 10000
+LIST_CHUNK_BYTES = 64 * 1024
+
+WHERE_OPERATORS = {
+    ">=": operator.ge,
+    "<=": operator.le,
+    "!=": operator.ne,
+    ">": operator.gt,
+    "<": operator.lt,
+    "=": operator.eq
+}
+WHERE_PATTERN = re.compile(r"^\s*([\w.]+)\s*(>=|<=|!=|>|<|=)\s*(.+?)\s*$")
+DISTRICT_PATTERN = re.compile(r"Kec\.\s*([^,]+)")
+
+def district_of(hospital):
+    """Nama kecamatan dari alamat RS (``Kec. X``); None jika tidak ada"""
+    match = DISTRICT_PATTERN.search(hospital.get("address", ""))
+    return match.group(1).strip() if match else None
+
+class RegistryIndex:
+    """Indeks sekunder registry: slot RS per id, tipe, dan kecamatan"""
+
+    def __init__(self, hospitals):
+        self.size = len(hospitals)
+        self.slots = {h["id"]: i for i, h in enumerate(hospitals)}
+        by_type, by_district = {}, {}
+        for i, hospital in enumerate(hospitals):
+            by_type.setdefault(hospital.get("type"), []).append(i)
+            by_district.setdefault(district_of(hospital), []).append(i)
+        self.by_type = {key: np.array(slots) for key, slots in by_type.items()}
+        self.by_district = {key: np.array(slots) for key, slots in by_district.items()}
+
+    def select(self, hospital_ids=None, types=None, districts=None):
+        """Mask boolean slot RS yang lolos semua filter registry; None = semua"""
+        mask = None
+        for wanted, lookup in ((hospital_ids, None), (types, self.by_type), (districts, self.by_district)):
+            if wanted is None:
+                continue
+            selected = np.zeros(self.size, dtype=bool)
+            for value in wanted:
+                if lookup is None:
+                    slot = self.slots.get(value)
+                    if slot is not None:
+                        selected[slot] = True
+                else:
+                    selected[lookup.get(value, [])] = True
+            mask = selected if mask is None else mask & selected
+        return mask
+
+def _split(raw):
+    return [part.strip() for part in raw.split(",") if part.strip()] if raw else None
+
+def _field(record, path):
+    for key in path:
+        if not isinstance(record, dict) or key not in record:
+            return None
+        record = record[key]
+    return record
+
+def parse_where(raw):
+    """``icu.occupancy_rate>85`` -> ``(path, fungsi operator, nilai)``"""
+    match = WHERE_PATTERN.match(raw)
+    if not match:
+        raise ValueError(f"Filter where tidak valid: {raw}")
+    path, op, value = match.groups()
+    try:
+        value = float(value)
+    except ValueError:
+        pass
+    return tuple(path.split(".")), WHERE_OPERATORS[op], value
+
+def encode_cursor(epoch, position):
+    return base64.urlsafe_b64encode(f"{epoch}:{position}".encode()).decode().rstrip("=")
+
+def decode_cursor(raw, epoch):
+    try:
+        padded = raw + "=" * (-len(raw) % 4)
+        cursor_epoch, _, position = base64.urlsafe_b64decode(padded).decode().partition(":")
+        position = int(position)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("cursor tidak valid")
+    if cursor_epoch != epoch or position < 0:
+        raise ValueError("cursor kedaluwarsa, mulai ulang tanpa cursor")
+    return position
+
+def project(record, paths, keep):
+    """Salinan record yang hanya berisi field ``paths`` (dot-path) + field kunci"""
+    result = {key: record[key] for key in keep if key in record}
+    for path in paths:
+        value = _field(record, path)
+        if value is None:
+            continue
+        target = result
+        for key in path[:-1]:
+            target = target.setdefault(key, {})
+        target[path[-1]] = value
+    return result
+
+class ListQuery:
+    """Parameter list endpoint yang sudah divalidasi"""
+
+    def __init__(self, args, epoch):
+        self.hospital_ids = _split(args.get("hospital_id"))
+        self.types = _split(args.get("type"))
+        self.districts = _split(args.get("district"))
+        self.polyclinics = _split(args.get("polyclinic"))
+        self.where = [parse_where(raw) for raw in args.getlist("where")]
+        fields = _split(args.get("fields"))
+        self.fields = [tuple(field.split(".")) for field in fields] if fields else None
+        self.format = args.get("format", "json")
+        if self.format not in ("json", "ndjson"):
+            raise ValueError("format harus json atau ndjson")
+        limit = args.get("limit")
+        try:
+            self.limit = int(limit) if limit else None
+        except ValueError:
+            raise ValueError("limit harus bilangan bulat")
+        if self.limit is not None and not 1 <= self.limit <= LIST_MAX_LIMIT:
+            raise ValueError(f"limit harus antara 1 dan {LIST_MAX_LIMIT}")
+        self.start = decode_cursor(args["cursor"], epoch) if args.get("cursor") else 0
+
+    @staticmethod
+    def requested(args):
+        """True jika request memakai salah satu parameter list"""
+        return any(name in args for name in LIST_PARAMS)
+
+    def positions(self, record_slots, index):
+        """Posisi record kandidat (urut) setelah filter registry"""
+        mask = index.select(self.hospital_ids, self.types, self.districts)
+        positions = np.arange(len(record_slots)) if mask is None else np.flatnonzero(mask[record_slots])
+        return positions[positions >= self.start]
+
+    def matches(self, record):
+        if self.polyclinics is not None and record.get("polyclinic") not in self.polyclinics:
+            return False
+        for path, compare, value in self.where:
+            field = _field(record, path)
+            if field is None:
+                return False
+            try:
+                if not compare(field, value):
+                    return False
+            except TypeError:
+                return False
+        return True
+
+    def iter_page(self, records, positions, keep):
+        """``(record terproyeksi, posisi)`` yang lolos filter, maksimal ``limit``"""
+        count = 0
+        for position in positions.tolist():
+            record = records[position]
+            if not self.matches(record):
+                continue
+            if self.limit is not None and count == self.limit:
+                # Masih ada record berikutnya: kembalikan posisinya sebagai cursor
+                yield None, position
+                return
+            yield (project(record, self.fields, keep) if self.fields else record), position
+            count += 1
+
+def _chunks(parts, size):
+    """Gabungkan potongan teks kecil menjadi chunk ~``size`` byte"""
+    buffer, buffered = [], 0
+    for part in parts:
+        buffer.append(part)
+        buffered += len(part)
+        if buffered >= size:
+            yield "".join(buffer).encode("utf-8")
+            buffer, buffered = [], 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+def stream_list(page, meta, epoch, fmt, chunk_size=LIST_CHUNK_BYTES):
+    """Body bertahap: JSON ``{..., "data": [...], "next_cursor"}`` atau NDJSON.
+
+    Pada NDJSON satu record per baris, dan baris terakhir berisi metadata
+    (``version``, ``timestamp``, ``next_cursor``). Encoding sama dengan
+    ``jsonify`` (ASCII, key terurut, tanpa spasi).
+    """
+    dumps = json.JSONEncoder(separators=(",", ":"), ensure_ascii=True, sort_keys=True).encode
+
+    def parts():
+        next_cursor = None
+        if fmt == "ndjson":
+            for record, position in page:
+                if record is None:
+                    next_cursor = encode_cursor(epoch, position)
+                    break
+                yield dumps(record) + "\n"
+            yield dumps({**meta, "next_cursor": next_cursor}) + "\n"
+            return
+
+        # "data" < "next_cursor": cursor diketahui setelah data selesai di-stream
+        separator = "{"
+        for key in sorted({*meta, "data", "next_cursor"}):
+            yield separator + dumps(key) + ":"
+            separator = ","
+            if key == "data":
+                yield "["
+                item_separator = ""
+                for record, position in page:
+                    if record is None:
+                        next_cursor = encode_cursor(epoch, position)
+                        break
+                    yield item_separator + dumps(record)
+                    item_separator = ","
+                yield "]"
+            elif key == "next_cursor":
+                yield dumps(next_cursor)
+            else:
+                yield dumps(meta[key])
+        yield "}"
+
+    return _chunks(parts(), chunk_size)
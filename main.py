@@ -1,76 +1,164 @@
-from flask import Flask, jsonify, render_template
+from flask import Flask, Response, g, jsonify, render_template, request, make_response
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from functools import cached_property, lru_cache
+import hashlib
+from itertools import chain
+import math
 import random
 import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from allocation import BED_TYPES, SEVERITY_BED_TYPE, SEVERITY_PRIORITY, BedHoldRegistry, min_cost_assignment
+from columnar import COLUMN_SECTIONS, TOTAL_COLUMNS, HospitalColumns
+from geo import GridIndex, haversine_km
+from instrumentation import MetricsRegistry, SamplingProfiler
+from ingest import IngestPipeline, ingest_stream, iter_lines, merge_values
+from listing import ListQuery, RegistryIndex, stream_list
+from queue_model import QueueModel
+from referral_index import CapabilityIndex, ReferralIndex, hospital_specialties
+from registry import SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT, HospitalRegistry, load_registry
+from response_cache import ENCODINGS, ResponseCache
+from scenario import SCENARIO_SEED, generate_hospitals
+from shared_state import RemoteWriter
+from sharding import SHARD_MODES, SHARD_POLL_SECONDS, group_by_region, merge_ranked, region_of, spawn_shards
+from snapshot_log import RegistryMismatch, SnapshotLog
+from stream import StreamHub
+from timeseries import HISTORY_MINUTE_RETENTION_HOURS, HISTORY_RETENTION_DAYS, RESOLUTIONS, TimeSeriesStore
+from triage import analyze_severity, analyze_severity_many
 
 app = Flask(__name__)
 CORS(app)
 
 # ============================
-# DATA DUMMY RUMAH SAKIT (KHUSUS BANDUNG)
+# INSTRUMENTASI (/metrics + PROFILER)
 # ============================
-HOSPITALS = HOSPITALS = [
-    {
-        "id": "RS001", 
-        "name": "RSUP Dr. Hasan Sadikin Bandung", 
-        "type": "Tipe A",
-        "address": "Jl. Pasteur No.38, Pasteur, Kec. Sukajadi, Kota Bandung"
-    },
-    {
-        "id": "RS002", 
-        "name": "RSUD Kota Bandung", 
-        "type": "Tipe A",
-        "address": "Jl. Rumah Sakit No.22, Cicendo, Kec. Bandung Kidul, Kota Bandung"
-    },
-    {
-        "id": "RS003", 
-        "name": "RS Advent Bandung", 
-        "type": "Tipe B",
-        "address": "Jl. Cihampelas No.161, Cipaganti, Kec. Coblong, Kota Bandung"
-    },
-    {
-        "id": "RS004", 
-        "name": "RS Santo Borromeus Bandung", 
-        "type": "Tipe B",
-        "address": "Jl. Ir. H. Juanda No.100, Lebakgede, Kec. Coblong, Kota Bandung"
-    },
-    {
-        "id": "RS005", 
-        "name": "RS Al Islam Bandung", 
-        "type": "Tipe B",
-        "address": "Jl. Soekarno Hatta No.644, Cipagalo, Kec. Bojongsoang, Kab. Bandung"
-    },
-    {
-        "id": "RS006", 
-        "name": "RSUD Ujung Berung", 
-        "type": "Tipe C",
-        "address": "Jl. AH Nasution No.50, Ujungberung, Kec. Ujung Berung, Kota Bandung"
-    },
-    {
-        "id": "RS007", 
-        "name": "RSIA Limijati Bandung", 
-        "type": "Tipe C",
-        "address": "Jl. Soekarno Hatta No.467, Sekejati, Kec. Buahbatu, Kota Bandung"
-    },
-    {
-        "id": "RS008", 
-        "name": "RS Khusus Paru Rotinsulu Bandung", 
-        "type": "Tipe C",
-        "address": "Jl. Buah Batu No.29, Turangga, Kec. Lengkong, Kota Bandung"
-    },
-]
-
-def generate_bed_capacity():
-    """Generate data kapasitas tempat tidur untuk semua RS"""
+metrics_registry = MetricsRegistry()
+request_seconds = metrics_registry.histogram(
+    "http_request_duration_seconds", "Durasi request sampai respons dibuat (body streaming tidak termasuk)",
+    ("route", "method", "status"))
+request_exceptions = metrics_registry.counter(
+    "http_request_exceptions_total", "Request yang berakhir dengan exception tak tertangani", ("route",))
+stage_seconds = metrics_registry.histogram(
+    "stage_duration_seconds", "Durasi tahap pemrosesan: generator, baca/tulis state, skoring, serialisasi",
+    ("stage",))
+profiler = SamplingProfiler()
+# Profiler membuka stack internal dan menambah beban sampling: hanya aktif bila PROFILER_ENABLED=1
+PROFILER_ENABLED = os.environ.get("PROFILER_ENABLED") == "1"
+
+def timed(stage):
+    """Context manager/decorator yang mencatat durasi ``stage``"""
+    return stage_seconds.time(stage)
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Provider JSON bawaan Flask + waktu serialisasi setiap jsonify"""
+
+    def dumps(self, obj, **kwargs):
+        with timed("serialize"):
+            return super().dumps(obj, **kwargs)
+
+app.json = TimedJSONProvider(app)
+
+def route_label():
+    """Pola route (bukan path mentah) agar kardinalitas label tetap kecil"""
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    profiler.enter(route_label())
+
+@app.after_request
+def record_request_timer(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        request_seconds.observe(time.perf_counter() - started, route_label(), request.method, str(response.status_code))
+    return response
+
+@app.teardown_request
+def finish_request(exc):
+    profiler.leave()
+    if exc is not None:
+        request_exceptions.inc(route_label())
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Histogram dan counter dalam format teks Prometheus"""
+    return Response(metrics_registry.render(), mimetype=metrics_registry.content_type)
+
+@app.route('/api/profiler', methods=['GET', 'POST', 'DELETE'])
+def sampling_profiler():
+    """POST {"route": "/api/referral/recommend", "seconds": 30} untuk mulai,
+    GET untuk stack terpanas, DELETE untuk berhenti (butuh PROFILER_ENABLED=1)"""
+    if not PROFILER_ENABLED:
+        return jsonify({"error": "Profiler tidak aktif (set PROFILER_ENABLED=1)"}), 404
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        route = data.get('route')
+        if route not in {rule.rule for rule in app.url_map.iter_rules()}:
+            return jsonify({"error": f"Route tidak dikenal: {route}"}), 400
+        seconds = data.get('seconds')
+        if seconds is not None and (not isinstance(seconds, (int, float)) or seconds <= 0):
+            return jsonify({"error": "seconds harus bilangan positif"}), 400
+        profiler.start(route, seconds)
+    elif request.method == 'DELETE':
+        profiler.stop()
+    limit = request.args.get('limit', type=int) or None
+    report = profiler.report(limit) if limit else profiler.report()
+    return jsonify({**report, "timestamp": datetime.now().isoformat()})
+
+# ============================
+# REGISTRY RUMAH SAKIT (FILE DATA)
+# ============================
+# HOSPITALS_FILE=<path .json/.csv> mengganti registry default (RS Bandung);
+# indeks pencarian di-cache sebagai <file>.idx dan dibangun ulang bila isi file berubah
+HOSPITALS_FILE = os.environ.get(
+    "HOSPITALS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "hospitals.json"))
+
+# Uji skala: SCENARIO_HOSPITALS=<N> mengganti registry dengan N RS sintetis.
+# SCENARIO_SEED membuat registry dan seluruh data simulasi deterministik.
+if os.environ.get("SCENARIO_HOSPITALS"):
+    hospital_registry = HospitalRegistry(generate_hospitals(int(os.environ["SCENARIO_HOSPITALS"]),
+                                                            int(os.environ.get("SCENARIO_SEED", SCENARIO_SEED))))
+else:
+    hospital_registry = load_registry(HOSPITALS_FILE, os.environ.get("REGISTRY_CACHE_DIR"))
+HOSPITALS = hospital_registry.records
+
+# STATE_SHARDS=inprocess|subprocess memecah state per wilayah (kota/kabupaten):
+# slot RS dikelompokkan per wilayah agar setiap shard menempati rentang kontigu.
+# SHARD_REGION diisi otomatis untuk proses shard (shard_worker.py).
+STATE_SHARDS = os.environ.get("STATE_SHARDS") or None
+SHARD_REGION = os.environ.get("SHARD_REGION") or None
+if STATE_SHARDS is not None and STATE_SHARDS not in SHARD_MODES:
+    raise ValueError(f"STATE_SHARDS harus salah satu dari {', '.join(SHARD_MODES)}")
+# Kosakata spesialisasi seluruh registry, agar kunci ranking rujukan sama di setiap shard
+REGISTRY_SPECIALTIES = frozenset().union(*map(hospital_specialties, HOSPITALS))
+SHARD_RANGES = None
+if STATE_SHARDS or SHARD_REGION:
+    HOSPITALS, SHARD_RANGES = group_by_region(HOSPITALS)
+    if SHARD_REGION:
+        HOSPITALS = [hospital for hospital in HOSPITALS if region_of(hospital) == SHARD_REGION]
+
+# Sumber acak data simulasi; tanpa seed hasilnya berbeda setiap proses
+sim_random = random.Random(int(os.environ["SCENARIO_SEED"])) if os.environ.get("SCENARIO_SEED") else random.Random()
+
+def generate_bed_capacity(hospitals):
+    """Generate data kapasitas tempat tidur untuk ``hospitals``"""
     data = []
-    for hospital in HOSPITALS:
-        icu_total = random.randint(20, 50)
-        icu_occupied = random.randint(10, icu_total)
-        regular_total = random.randint(100, 300)
-        regular_occupied = random.randint(50, regular_total)
-        isolation_total = random.randint(15, 40)
-        isolation_occupied = random.randint(5, isolation_total)
+    for hospital in hospitals:
+        icu_total = sim_random.randint(20, 50)
+        icu_occupied = sim_random.randint(10, icu_total)
+        regular_total = sim_random.randint(100, 300)
+        regular_occupied = sim_random.randint(50, regular_total)
+        isolation_total = sim_random.randint(15, 40)
+        isolation_occupied = sim_random.randint(5, isolation_total)
 
         data.append({
             "hospital_id": hospital["id"],
@@ -97,39 +185,39 @@ def generate_bed_capacity():
         })
     return data
 
-def generate_er_status():
+def generate_er_status(hospitals):
     """Generate data status IGD"""
     data = []
-    for hospital in HOSPITALS:
-        waiting = random.randint(5, 30)
-        in_treatment = random.randint(10, 25)
+    for hospital in hospitals:
+        waiting = sim_random.randint(5, 30)
+        in_treatment = sim_random.randint(10, 25)
 
         data.append({
             "hospital_id": hospital["id"],
             "hospital_name": hospital["name"],
             "waiting_patients": waiting,
             "in_treatment": in_treatment,
-            "avg_waiting_time": random.randint(15, 90),
+            "avg_waiting_time": sim_random.randint(15, 90),
             "severity_distribution": {
-                "critical": random.randint(1, 5),
-                "urgent": random.randint(3, 10),
-                "semi_urgent": random.randint(5, 15),
-                "non_urgent": random.randint(2, 8)
+                "critical": sim_random.randint(1, 5),
+                "urgent": sim_random.randint(3, 10),
+                "semi_urgent": sim_random.randint(5, 15),
+                "non_urgent": sim_random.randint(2, 8)
             },
             "status": "normal" if waiting < 20 else "crowded",
             "last_updated": datetime.now().isoformat()
         })
     return data
 
-def generate_queue_data():
+def generate_queue_data(hospitals):
     """Generate data antrian poliklinik"""
     polyclinics = ["Poli Umum", "Poli Anak", "Poli Gigi", "Poli Jantung", "Poli Paru"]
     data = []
 
-    for hospital in HOSPITALS:
+    for hospital in hospitals:
         for poly in polyclinics:
-            current_queue = random.randint(0, 15)
-            served_today = random.randint(20, 80)
+            current_queue = sim_random.randint(0, 15)
+            served_today = sim_random.randint(20, 80)
 
             data.append({
                 "hospital_id": hospital["id"],
@@ -137,59 +225,59 @@ def generate_queue_data():
                 "polyclinic": poly,
                 "current_queue": current_queue,
                 "served_today": served_today,
-                "avg_service_time": random.randint(10, 25),
-                "estimated_wait": current_queue * random.randint(10, 20),
+                "avg_service_time": sim_random.randint(10, 25),
+                "estimated_wait": current_queue * sim_random.randint(10, 20),
                 "last_updated": datetime.now().isoformat()
             })
     return data
 
-def generate_operational_metrics():
+def generate_operational_metrics(hospitals):
     """Generate KPI operasional harian"""
     data = []
-    for hospital in HOSPITALS:
+    for hospital in hospitals:
         data.append({
             "hospital_id": hospital["id"],
             "hospital_name": hospital["name"],
             "date": datetime.now().date().isoformat(),
             "metrics": {
-                "total_admissions": random.randint(50, 150),
-                "total_discharges": random.randint(40, 140),
-                "er_visits": random.randint(80, 200),
-                "outpatient_visits": random.randint(200, 500),
-                "surgeries_completed": random.randint(5, 20),
-                "lab_tests": random.randint(150, 400),
-                "radiology_exams": random.randint(50, 150),
-                "bed_turnover_rate": round(random.uniform(1.2, 2.5), 2),
-                "avg_length_of_stay": round(random.uniform(3.5, 7.2), 1)
+                "total_admissions": sim_random.randint(50, 150),
+                "total_discharges": sim_random.randint(40, 140),
+                "er_visits": sim_random.randint(80, 200),
+                "outpatient_visits": sim_random.randint(200, 500),
+                "surgeries_completed": sim_random.randint(5, 20),
+                "lab_tests": sim_random.randint(150, 400),
+                "radiology_exams": sim_random.randint(50, 150),
+                "bed_turnover_rate": round(sim_random.uniform(1.2, 2.5), 2),
+                "avg_length_of_stay": round(sim_random.uniform(3.5, 7.2), 1)
             },
             "last_updated": datetime.now().isoformat()
         })
     return data
 
-def generate_staff_availability():
+def generate_staff_availability(hospitals):
     """Generate data ketersediaan tenaga medis"""
     data = []
-    for hospital in HOSPITALS:
+    for hospital in hospitals:
         data.append({
             "hospital_id": hospital["id"],
             "hospital_name": hospital["name"],
             "staff": {
                 "doctors": {
-                    "on_duty": random.randint(15, 40),
-                    "total": random.randint(50, 100),
-                    "specialists_available": random.randint(8, 20)
+                    "on_duty": sim_random.randint(15, 40),
+                    "total": sim_random.randint(50, 100),
+                    "specialists_available": sim_random.randint(8, 20)
                 },
                 "nurses": {
-                    "on_duty": random.randint(50, 120),
-                    "total": random.randint(150, 300)
+                    "on_duty": sim_random.randint(50, 120),
+                    "total": sim_random.randint(150, 300)
                 },
                 "pharmacists": {
-                    "on_duty": random.randint(5, 15),
-                    "total": random.randint(15, 30)
+                    "on_duty": sim_random.randint(5, 15),
+                    "total": sim_random.randint(15, 30)
                 },
                 "lab_technicians": {
-                    "on_duty": random.randint(8, 20),
-                    "total": random.randint(20, 40)
+                    "on_duty": sim_random.randint(8, 20),
+                    "total": sim_random.randint(20, 40)
                 }
             },
             "shift": "pagi" if datetime.now().hour < 15 else "sore",
@@ -197,70 +285,60 @@ def generate_staff_availability():
         })
     return data
 
-def generate_resource_status():
+def generate_resource_status(hospitals):
     """Generate status ketersediaan sumber daya"""
     data = []
-    for hospital in HOSPITALS:
+    for hospital in hospitals:
         data.append({
             "hospital_id": hospital["id"],
             "hospital_name": hospital["name"],
             "resources": {
                 "oxygen": {
-                    "status": random.choice(["sufficient", "low", "critical"]),
-                    "percentage": random.randint(40, 100)
+                    "status": sim_random.choice(["sufficient", "low", "critical"]),
+                    "percentage": sim_random.randint(40, 100)
                 },
                 "blood_bank": {
-                    "A": random.randint(10, 50),
-                    "B": random.randint(10, 50),
-                    "AB": random.randint(5, 30),
-                    "O": random.randint(15, 60)
+                    "A": sim_random.randint(10, 50),
+                    "B": sim_random.randint(10, 50),
+                    "AB": sim_random.randint(5, 30),
+                    "O": sim_random.randint(15, 60)
                 },
                 "medical_supplies": {
-                    "status": random.choice(["sufficient", "adequate", "low"]),
-                    "critical_items": random.randint(0, 5)
+                    "status": sim_random.choice(["sufficient", "adequate", "low"]),
+                    "critical_items": sim_random.randint(0, 5)
                 },
                 "equipment": {
-                    "ventilators_available": random.randint(5, 15),
-                    "ventilators_total": random.randint(15, 25),
-                    "ambulances_available": random.randint(3, 8),
-                    "ambulances_total": random.randint(8, 12)
+                    "ventilators_available": sim_random.randint(5, 15),
+                    "ventilators_total": sim_random.randint(15, 25),
+                    "ambulances_available": sim_random.randint(3, 8),
+                    "ambulances_total": sim_random.randint(8, 12)
                 }
             },
             "last_updated": datetime.now().isoformat()
         })
     return data
 
-def generate_trend_data():
-    """Generate data trend 7 hari terakhir"""
-    dates = [(datetime.now() - timedelta(days=i)).date().isoformat() for i in range(6, -1, -1)]
-    return {
-        "dates": dates,
-        "occupancy_trend": [random.randint(60, 90) for _ in range(7)],
-        "er_visits_trend": [random.randint(100, 200) for _ in range(7)],
-        "admissions_trend": [random.randint(50, 120) for _ in range(7)]
-    }
-
 @app.route('/')
 def index():
     return render_template('index.html')
 
-def generate_heatmap_data():
+def generate_heatmap_data(hospitals):
     """Generate data heatmap jam sibuk IGD per RS"""
     hours = list(range(24))  # 0-23 jam
     data = []
     
-    for hospital in HOSPITALS:
+    for hospital in hospitals:
         hourly_patients = []
         for hour in hours:
             # Simulasi pola: sibuk di pagi (7-11) dan sore (15-20)
             if 7 <= hour <= 11:
-                base = random.randint(15, 35)
+                base = sim_random.randint(15, 35)
             elif 15 <= hour <= 20:
-                base = random.randint(20, 40)
+                base = sim_random.randint(20, 40)
             elif 0 <= hour <= 5:
-                base = random.randint(5, 15)
+                base = sim_random.randint(5, 15)
             else:
-                base = random.randint(10, 25)
+                base = sim_random.randint(10, 25)
             
             hourly_patients.append(base)
         
@@ -272,272 +350,1602 @@ def generate_heatmap_data():
     
     return data
 
-@app.route('/api/visualizations')
-def visualizations():
-    """Endpoint untuk data visualisasi tambahan"""
-    bed_data = generate_bed_capacity()
-    metrics_data = generate_operational_metrics()
-    
+# ============================
+# STATE STORE (SNAPSHOT BERVERSI)
+# ============================
+# STATE_TICK_SECONDS=0 mematikan simulasi (state hanya berubah lewat ingest/alokasi)
+STATE_TICK_SECONDS = float(os.environ.get("STATE_TICK_SECONDS", 30))
+
+STATE_SECTIONS = ("beds", "emergency", "queues", "metrics", "staff", "resources", "heatmap")
+
+def build_overview(columns):
+    """Ringkasan seluruh RS dari running total kolom (O(1))"""
+    return overview_from_totals(columns.totals, columns.size)
+
+def overview_from_totals(totals, size):
+    """Ringkasan dari running total (satu store, atau jumlah total semua shard)"""
+    total_beds = totals["regular_total"] + totals["icu_total"] + totals["isolation_total"]
+    occupied_beds = totals["regular_occupied"] + totals["icu_occupied"] + totals["isolation_occupied"]
+    total_er_patients = totals["er_waiting"] + totals["er_in_treatment"]
+
+    return {
+        "total_hospitals": size,
+        "total_beds": total_beds,
+        "occupied_beds": occupied_beds,
+        "available_beds": total_beds - occupied_beds,
+        "occupancy_rate": round((occupied_beds / total_beds) * 100, 1) if total_beds else 0.0,
+        "total_er_patients": total_er_patients
+    }
+
+def build_visualizations(columns, heatmap_data, names):
+    """Susun data visualisasi (diagram batang, lingkaran, heatmap); ``names`` = nama RS per slot"""
     # Data untuk diagram batang - perbandingan kunjungan per RS
-    visits_comparison = []
-    for metric in metrics_data:
-        visits_comparison.append({
-            "hospital": metric["hospital_name"],
-            "er_visits": metric["metrics"]["er_visits"],
-            "outpatient": metric["metrics"]["outpatient_visits"],
-            "admissions": metric["metrics"]["total_admissions"]
-        })
-    
+    visits_comparison = [
+        {"hospital": name, "er_visits": er_visits, "outpatient": outpatient, "admissions": admissions}
+        for name, er_visits, outpatient, admissions in zip(
+            names, columns["er_visits"].tolist(), columns["outpatient_visits"].tolist(),
+            columns["admissions"].tolist())
+    ]
+
     # Data untuk diagram lingkaran - distribusi tipe tempat tidur
-    total_icu = sum(h["icu"]["total"] for h in bed_data)
-    total_regular = sum(h["regular"]["total"] for h in bed_data)
-    total_isolation = sum(h["isolation"]["total"] for h in bed_data)
-    
+    totals = columns.totals
     bed_distribution = {
-        "ICU": total_icu,
-        "Reguler": total_regular,
-        "Isolasi": total_isolation
+        "ICU": totals["icu_total"],
+        "Reguler": totals["regular_total"],
+        "Isolasi": totals["isolation_total"]
     }
-    
+
     # Data untuk diagram lingkaran - okupansi per RS
-    occupancy_by_hospital = []
-    heatmap_data = generate_heatmap_data()
-    for h in bed_data:
-        total = h["icu"]["total"] + h["regular"]["total"] + h["isolation"]["total"]
-        occupied = h["icu"]["occupied"] + h["regular"]["occupied"] + h["isolation"]["occupied"]
-        occupancy_by_hospital.append({
-            "hospital": h["hospital_name"],
-            "occupancy_rate": round((occupied / total) * 100, 1)
-        })
-    
-    return jsonify({
+    total = columns["icu_total"] + columns["regular_total"] + columns["isolation_total"]
+    occupied = columns["icu_occupied"] + columns["regular_occupied"] + columns["isolation_occupied"]
+    # RS tanpa tempat tidur (total 0 lewat ingest) = okupansi 0, bukan NaN yang tidak valid di JSON
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rates = np.where(total > 0, occupied / total * 100, 0.0)
+    occupancy_by_hospital = [
+        {"hospital": name, "occupancy_rate": round(rate, 1)}
+        for name, rate in zip(names, rates.tolist())
+    ]
+
+    return {
         "visits_comparison": visits_comparison,
         "bed_distribution": bed_distribution,
         "occupancy_by_hospital": occupancy_by_hospital,
-         "heatmap_data": heatmap_data,
-        "timestamp": datetime.now().isoformat()
+        "heatmap_data": list(heatmap_data)
+    }
+
+def _record_key(section, record):
+    """Kunci unik record dalam satu section (antrian per RS + poliklinik)"""
+    if section == "queues":
+        return (record["hospital_id"], record["polyclinic"])
+    return record["hospital_id"]
+
+def _recompute_derived(section, record):
+    """Hitung ulang field turunan setelah record diubah"""
+    if section == "beds":
+        for bed_type in ("icu", "regular", "isolation"):
+            info = record[bed_type]
+            info["available"] = info["total"] - info["occupied"]
+            info["occupancy_rate"] = round((info["occupied"] / info["total"]) * 100, 1) if info["total"] else 0.0
+    elif section == "emergency":
+        record["status"] = "normal" if record["waiting_patients"] < 20 else "crowded"
+    return record
+
+SECTION_GENERATORS = (
+    ("beds", generate_bed_capacity),
+    ("emergency", generate_er_status),
+    ("queues", generate_queue_data),
+    ("metrics", generate_operational_metrics),
+    ("staff", generate_staff_availability),
+    ("resources", generate_resource_status),
+    ("heatmap", generate_heatmap_data)
+)
+
+@dataclass(frozen=True, eq=False)
+class StateSnapshot:
+    """Snapshot immutable seluruh state RS pada satu versi data.
+
+    Record di dalamnya tidak boleh diubah; setiap penulisan menghasilkan
+    snapshot baru dengan versi yang lebih tinggi.
+    """
+    version: int
+    timestamp: str
+    beds: tuple
+    emergency: tuple
+    queues: tuple
+    metrics: tuple
+    staff: tuple
+    resources: tuple
+    heatmap: tuple
+    trends: dict
+    overview: dict
+    columns: HospitalColumns
+
+    def section(self, name):
+        return getattr(self, name)
+
+    @cached_property
+    def visualizations(self):
+        """Data visualisasi, dihitung saat pertama diminta untuk versi ini"""
+        return build_visualizations(self.columns, self.heatmap, [record["hospital_name"] for record in self.beds])
+
+class HospitalStateStore:
+    """State RS in-process yang dipublikasikan sebagai snapshot berversi.
+
+    Pembaca cukup memanggil ``snapshot()`` (satu lookup referensi), sehingga
+    semua endpoint dalam satu refresh dashboard melihat versi yang sama.
+    Penulisan (tick latar belakang atau ``apply``) dilakukan copy-on-write
+    di bawah satu lock penulis.
+    """
+
+    def __init__(self, hospitals, tick_interval=STATE_TICK_SECONDS, history=None, restore=None, version=0):
+        self.hospitals = hospitals
+        self.tick_interval = tick_interval
+        # TimeSeriesStore opsional; diisi dari snapshot yang dipublikasikan (maks. satu per HISTORY_SAMPLE_SECONDS)
+        self.history = history
+        self._history_sampled = float("-inf")
+        # Penanda instance; versi dimulai ulang dari 1 setiap proses baru
+        self.epoch = os.urandom(4).hex()
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        # Versi berlanjut dari log state (bila ada) agar tidak pernah berulang
+        self._version = version
+        self._sections = {}
+        self._index = {}
+        # (section, kunci) yang pernah ditulis lewat apply; tidak ditimpa simulasi
+        self._external = set()
+        self._columns = None
+        self._snapshot = None
+        self._listeners = []
+        if restore is not None:
+            self._restore(restore)
+        else:
+            self.refresh()
+
+    def snapshot(self):
+        """Snapshot terbaru (immutable)"""
+        return self._snapshot
+
+    @property
+    def version(self):
+        return self._snapshot.version
+
+    def record(self, section, key):
+        """Record terbaru untuk ``_record_key``; None jika tidak ada"""
+        position = self._index.get(section, {}).get(key)
+        return None if position is None else self._sections[section][position]
+
+    def is_external(self, section, key):
+        return (section, key) in self._external
+
+    def external_keys(self):
+        with self._write_lock:
+            return set(self._external)
+
+    def add_listener(self, listener):
+        """Daftarkan ``listener(previous, snapshot)`` yang dipanggil tiap publish"""
+        self._listeners.append(listener)
+
+    def _reindex(self):
+        self._index = {
+            name: {_record_key(name, record): i for i, record in enumerate(records)}
+            for name, records in self._sections.items()
+        }
+
+    def _restore(self, restored):
+        """Pakai state dari log (checkpoint + ekor log) sebagai state awal"""
+        with self._write_lock:
+            self._version = max(self._version, restored.version)
+            self._sections = {name: tuple(records) for name, records in restored.sections.items()}
+            self._columns = restored.columns
+            self._external = set(restored.external)
+            self._reindex()
+            return self._publish()
+
+    def refresh(self):
+        """Ambil data baru dari sumber data (simulasi) untuk semua section"""
+        sections = {}
+        for name, generate in SECTION_GENERATORS:
+            with timed(generate.__name__):
+                sections[name] = generate(self.hospitals)
+        with self._write_lock:
+            if self._external:
+                for name, records in sections.items():
+                    for i, record in enumerate(records):
+                        if (name, _record_key(name, record)) in self._external:
+                            records[i] = self._sections[name][i]
+            self._sections = {name: tuple(records) for name, records in sections.items()}
+            self._columns = HospitalColumns.from_sections(self._sections)
+            self._reindex()
+            return self._publish()
+
+    def update(self, hospital_id, section, values, polyclinic=None):
+        """Update parsial satu record lalu publikasikan versi baru"""
+        return self.apply([{
+            "hospital_id": hospital_id,
+            "section": section,
+            "polyclinic": polyclinic,
+            "values": values
+        }])
+
+    @timed("state_apply")
+    def apply(self, updates):
+        """Terapkan sekumpulan update secara atomik sebagai satu versi baru.
+
+        Setiap update berbentuk ``{"hospital_id", "section", "values"}``
+        (ditambah ``"polyclinic"`` untuk section ``queues``).
+        """
+        with self._write_lock:
+            changed = {}
+            touched = {}
+            external = set()
+            for update in updates:
+                section = update["section"]
+                if section not in STATE_SECTIONS:
+                    raise ValueError(f"Section tidak dikenal: {section}")
+                if section == "queues":
+                    key = (update["hospital_id"], update.get("polyclinic"))
+                else:
+                    key = update["hospital_id"]
+                position = self._index[section].get(key)
+                if position is None:
+                    raise KeyError(f"Record tidak ditemukan: {section} {key}")
+
+                records = changed.get(section)
+                if records is None:
+                    records = changed[section] = list(self._sections[section])
+                record = merge_values(records[position], update["values"])
+                record["last_updated"] = datetime.now().isoformat()
+                records[position] = _recompute_derived(section, record)
+                touched.setdefault(section, set()).add(position)
+                external.add((section, key))
+
+            if not changed:
+                return self._snapshot
+            # Section dan kolom baru disusun dulu; bila ada yang gagal state lama tetap utuh
+            sections = dict(self._sections)
+            columns = self._columns
+            for section, records in changed.items():
+                sections[section] = tuple(records)
+                if section in COLUMN_SECTIONS:
+                    # Posisi record di section kolumnar = slot RS
+                    columns = columns.with_records(
+                        section, [(position, records[position]) for position in touched[section]])
+            self._sections, self._columns = sections, columns
+            self._external |= external
+            return self._publish()
+
+    @timed("state_publish")
+    def _publish(self):
+        """Bangun snapshot baru dari state saat ini (dipanggil dengan lock)"""
+        self._version += 1
+        previous = self._snapshot
+        sections = self._sections
+        now = datetime.now()
+        trends = previous.trends if previous is not None else {}
+        if self.history is not None and now.timestamp() - self._history_sampled >= HISTORY_SAMPLE_SECONDS:
+            self._history_sampled = now.timestamp()
+            self.history.record(now.timestamp(), history_sample(self._columns))
+            trends = build_trends(self.history, now)
+        snapshot = StateSnapshot(
+            version=self._version,
+            timestamp=now.isoformat(),
+            trends=trends,
+            overview=build_overview(self._columns),
+            columns=self._columns,
+            **sections
+        )
+        self._snapshot = snapshot
+        for listener in self._listeners:
+            listener(previous, snapshot)
+        return snapshot
+
+    def start(self):
+        """Jalankan tick latar belakang (idempoten)"""
+        if self.tick_interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="state-tick", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.tick_interval):
+            self.refresh()
+
+# ============================
+# RIWAYAT (TIME-SERIES)
+# ============================
+HISTORY_METRICS = ("occupancy_rate", "er_visits", "admissions")
+HISTORY_SEED_DAYS = 7
+HISTORY_MAX_POINTS = 10000
+# Publish bisa ratusan kali per detik saat ingest; riwayat cukup satu sampel per bucket terkecil
+HISTORY_SAMPLE_SECONDS = RESOLUTIONS["1m"]
+TREND_DAYS = 7
+
+def history_sample(columns):
+    """Nilai metrik riwayat per RS (urutan HOSPITALS) dari kolom state"""
+    total = columns["icu_total"] + columns["regular_total"] + columns["isolation_total"]
+    occupied = columns["icu_occupied"] + columns["regular_occupied"] + columns["isolation_occupied"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        occupancy = np.where(total > 0, occupied / total * 100, np.nan)
+    return {
+        "occupancy_rate": occupancy,
+        "er_visits": columns["er_visits"].astype(float),
+        "admissions": columns["admissions"].astype(float)
+    }
+
+def seed_history(history, days=HISTORY_SEED_DAYS):
+    """Isi riwayat awal per jam (simulasi) agar trend tidak kosong saat start"""
+    start = datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(days=days)
+    for hour in range(days * 24):
+        history.record((start + timedelta(hours=hour)).timestamp(), {
+            "occupancy_rate": np.array([sim_random.uniform(60, 90) for _ in HOSPITALS]),
+            "er_visits": np.array([sim_random.randint(80, 200) for _ in HOSPITALS], dtype=float),
+            "admissions": np.array([sim_random.randint(50, 150) for _ in HOSPITALS], dtype=float)
+        })
+
+def _json_values(values, digits=1):
+    """Array -> list JSON (``nan`` menjadi ``null``)"""
+    return [None if np.isnan(v) else round(float(v), digits) for v in values]
+
+def build_trends(history, now):
+    """Trend harian gabungan seluruh RS untuk TREND_DAYS hari terakhir"""
+    end = now.timestamp()
+    start = end - (TREND_DAYS - 1) * 86400
+    days, _, occupancy = history.query("occupancy_rate", start, end, "1d", "avg")
+    _, _, er_visits = history.query("er_visits", start, end, "1d", "last")
+    _, _, admissions = history.query("admissions", start, end, "1d", "last")
+
+    counts = (~np.isnan(occupancy)).sum(axis=0)
+    occupancy_trend = np.where(counts > 0, np.nansum(occupancy, axis=0) / np.maximum(counts, 1), np.nan)
+
+    def total(matrix):
+        present = ~np.isnan(matrix).all(axis=0)
+        return [int(v) if ok else None for v, ok in zip(np.nansum(matrix, axis=0), present)]
+
+    return {
+        "dates": [datetime.fromtimestamp(day).date().isoformat() for day in days],
+        "occupancy_trend": _json_values(occupancy_trend),
+        "er_visits_trend": total(er_visits),
+        "admissions_trend": total(admissions)
+    }
+
+# ============================
+# SHARD WILAYAH (SCATTER-GATHER)
+# ============================
+class RegionShard:
+    """Satu wilayah: store sendiri (lock penulis + tick sendiri) dan agregat parsial per versi.
+
+    Method publik yang sama dipanggil lewat RPC untuk shard subprocess
+    (``shard_worker.py``), jadi nilai kembaliannya hanya data biasa.
+    """
+
+    def __init__(self, region, store, context=None):
+        self.region = region
+        self.store = store
+        self.slots = {hospital["id"]: i for i, hospital in enumerate(store.hospitals)}
+        self._context = context
+
+    @cached_property
+    def context(self):
+        return self._context or ReferralContext(self.store.hospitals, REGISTRY_SPECIALTIES)
+
+    def _version(self, snapshot):
+        # Versi shard = (epoch store, versi): versi mulai ulang saat shard di-restart, epoch tidak pernah sama
+        return self.store.epoch, snapshot.version
+
+    def state(self):
+        """``((epoch, versi), timestamp, sections, columns)`` snapshot terbaru shard"""
+        snapshot = self.store.snapshot()
+        return (self._version(snapshot), snapshot.timestamp,
+                {name: snapshot.section(name) for name in STATE_SECTIONS}, snapshot.columns)
+
+    def state_since(self, version):
+        """``state()`` bila shard sudah berubah sejak ``(epoch, versi)``; None bila belum"""
+        return None if self._version(self.store.snapshot()) == version else self.state()
+
+    def overview(self):
+        """Running total shard (parsial overview)"""
+        snapshot = self.store.snapshot()
+        return self._version(snapshot), snapshot.timestamp, snapshot.columns.totals, snapshot.columns.size
+
+    def visualizations(self):
+        """Data visualisasi shard (dihitung sekali per versi shard)"""
+        snapshot = self.store.snapshot()
+        return self._version(snapshot), snapshot.timestamp, snapshot.visualizations
+
+    def top_k(self, patients, limit=None):
+        """Ranking rujukan di shard ini: per pasien list ``(slot shard, rekomendasi)``"""
+        snapshot = self.store.snapshot()
+        results = rank_referrals(snapshot, patients, limit, self.context)
+        return self._version(snapshot), [
+            [(self.slots[recommendation["hospital_id"]], recommendation) for recommendation in result["recommendations"]]
+            for result in results
+        ]
+
+    def record(self, section, key):
+        return self.store.record(section, key)
+
+    def is_external(self, section, key):
+        return self.store.is_external(section, key)
+
+    def external_keys(self):
+        return self.store.external_keys()
+
+    def apply(self, updates):
+        return self.store.apply(updates).version
+
+    def refresh(self):
+        return self.store.refresh().version
+
+    def start(self):
+        self.store.start()
+
+    def stop(self):
+        self.store.stop()
+
+class ShardedStateStore:
+    """Shard wilayah di balik antarmuka ``HospitalStateStore``.
+
+    Setiap shard punya lock penulis dan tick sendiri, jadi tulis di satu
+    wilayah tidak menahan pembaca atau penulis wilayah lain. Update
+    dirutekan ke shard pemilik RS (atomik per shard). ``snapshot()``
+    menyusun snapshot gabungan (urutan slot = ``HOSPITALS``) hanya bila
+    versi salah satu shard berubah. Versi shard dibandingkan per elemen
+    (version vector): state shard yang lebih lama dari yang sudah dipakai
+    tidak menggantikannya, dan shard yang di-restart (epoch baru, versi
+    mulai dari awal) mendapat basis di atas versi terakhirnya. Versi
+    gabungan (dan ETag) = jumlah vector efektif, yang naik setiap kali
+    satu elemennya naik. Ringkasan lintas wilayah tidak memerlukan
+    snapshot gabungan: ``scatter()`` mengambil parsial setiap shard.
+    """
+
+    def __init__(self, hospitals, ranges, shards, history=None):
+        self.hospitals = hospitals
+        self.shards = shards
+        self.offsets = [start for _, start, _ in ranges]
+        self.history = history
+        self._history_sampled = float("-inf")
+        self.epoch = os.urandom(4).hex()
+        self._shard_of = {
+            hospital["id"]: shard for shard, (_, start, end) in zip(shards, ranges) for hospital in hospitals[start:end]
+        }
+        # Shard lokal dipanggil berurutan; shard subprocess paralel agar latensi RPC tidak menumpuk
+        self._pool = None
+        if not all(isinstance(shard, RegionShard) for shard in shards):
+            self._pool = ThreadPoolExecutor(len(shards), thread_name_prefix="shard-scatter")
+        self._lock = threading.Lock()
+        self._snapshot = None
+        # Per shard: epoch yang sedang berjalan, basis versi efektif, versi efektif tertinggi
+        self._epochs = [None] * len(shards)
+        self._bases = [0] * len(shards)
+        self._seen = [0] * len(shards)
+        self._retired = set()
+        # (epoch, versi) mentah, versi efektif dan state per shard di snapshot gabungan terakhir
+        self._published = None
+        self._vector = None
+        self._states = None
+        self._listeners = []
+        self._stop = threading.Event()
+        self._thread = None
+        self.snapshot()
+
+    def scatter(self, method, *args):
+        """Hasil ``method(*args)`` dari setiap shard, berurutan sesuai shard"""
+        if self._pool is None:
+            return [getattr(shard, method)(*args) for shard in self.shards]
+        return list(self._pool.map(lambda shard: getattr(shard, method)(*args), self.shards))
+
+    def _effective(self, versions):
+        """Versi efektif per shard dari ``(epoch, versi)``; None = state dari epoch yang sudah diganti.
+
+        Dipanggil dengan ``_lock``.
+        """
+        effective = []
+        for i, (epoch, version) in enumerate(versions):
+            if epoch != self._epochs[i]:
+                if epoch in self._retired:
+                    effective.append(None)
+                    continue
+                if self._epochs[i] is not None:
+                    # Shard di-restart: versinya mulai lagi dari awal, lanjutkan di atas versi terakhir
+                    self._retired.add(self._epochs[i])
+                    self._bases[i] = self._seen[i] + 1
+                self._epochs[i] = epoch
+            value = self._bases[i] + version
+            self._seen[i] = max(self._seen[i], value)
+            effective.append(value)
+        return effective
+
+    def combined_version(self, versions):
+        """Versi gabungan untuk parsial ``scatter()`` (``(epoch, versi)`` per shard)"""
+        with self._lock:
+            effective = self._effective(versions)
+            return sum(self._seen[i] if value is None else value for i, value in enumerate(effective))
+
+    def snapshot(self):
+        """Snapshot gabungan terbaru; disusun ulang hanya bila ada shard yang berubah"""
+        states = self.scatter("state")
+        versions = [state[0] for state in states]
+        if versions == self._published:
+            return self._snapshot
+        with self._lock:
+            effective = self._effective(versions)
+            if self._vector is None:
+                return self._publish(states, versions, effective)
+            # Per elemen: state shard yang tidak lebih baru dari yang sudah dipakai tidak menggantikannya
+            merged, raw, vector = [], [], []
+            for i, (state, value) in enumerate(zip(states, effective)):
+                if value is None or value <= self._vector[i]:
+                    merged.append(self._states[i])
+                    raw.append(self._published[i])
+                    vector.append(self._vector[i])
+                else:
+                    merged.append(state)
+                    raw.append(versions[i])
+                    vector.append(value)
+            if vector == self._vector:
+                return self._snapshot
+            return self._publish(merged, raw, vector)
+
+    @timed("shard_gather")
+    def _publish(self, states, versions, vector):
+        previous = self._snapshot
+        sections = {name: tuple(chain.from_iterable(state[2][name] for state in states)) for name in STATE_SECTIONS}
+        columns = HospitalColumns.concat([state[3] for state in states])
+        now = datetime.now()
+        trends = previous.trends if previous is not None else {}
+        if self.history is not None and now.timestamp() - self._history_sampled >= HISTORY_SAMPLE_SECONDS:
+            self._history_sampled = now.timestamp()
+            self.history.record(now.timestamp(), history_sample(columns))
+            trends = build_trends(self.history, now)
+        snapshot = StateSnapshot(
+            version=sum(vector),
+            timestamp=max(state[1] for state in states),
+            trends=trends,
+            overview=build_overview(columns),
+            columns=columns,
+            **sections
+        )
+        self._states, self._published, self._vector = states, versions, vector
+        self._snapshot = snapshot
+        for listener in self._listeners:
+            listener(previous, snapshot)
+        return snapshot
+
+    @property
+    def version(self):
+        return self.snapshot().version
+
+    def _shard(self, key):
+        return self._shard_of.get(key[0] if isinstance(key, tuple) else key)
+
+    def record(self, section, key):
+        shard = self._shard(key)
+        return None if shard is None else shard.record(section, key)
+
+    def is_external(self, section, key):
+        shard = self._shard(key)
+        return shard is not None and shard.is_external(section, key)
+
+    def external_keys(self):
+        return set().union(*self.scatter("external_keys"))
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def refresh(self):
+        self.scatter("refresh")
+        return self.snapshot()
+
+    def update(self, hospital_id, section, values, polyclinic=None):
+        self.apply([{"hospital_id": hospital_id, "section": section, "polyclinic": polyclinic, "values": values}])
+        return self.snapshot()
+
+    def apply(self, updates):
+        """Terapkan update per shard pemilik RS.
+
+        Snapshot gabungan tidak dibangun di sini (pembaca berikutnya yang
+        menyusunnya), jadi ingest berlaju tinggi hanya membayar biaya shard.
+        """
+        grouped = {}
+        for update in updates:
+            shard = self._shard_of.get(update["hospital_id"])
+            if shard is None:
+                raise KeyError(f"Record tidak ditemukan: {update['section']} {update['hospital_id']}")
+            grouped.setdefault(shard, []).append(update)
+        for shard, shard_updates in grouped.items():
+            shard.apply(shard_updates)
+
+    def start(self):
+        """Mulai tick setiap shard dan thread yang menyebarkan versi gabungan ke listener"""
+        for shard in self.shards:
+            shard.start()
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="shard-gather", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        for shard in self.shards:
+            shard.stop()
+
+    def _run(self):
+        while not self._stop.wait(SHARD_POLL_SECONDS):
+            self.snapshot()
+
+def merge_visualizations(parts):
+    """Gabungkan data visualisasi per shard (urutan RS = urutan shard)"""
+    return {
+        "visits_comparison": [row for part in parts for row in part["visits_comparison"]],
+        "bed_distribution": {key: sum(part["bed_distribution"][key] for part in parts)
+                             for key in parts[0]["bed_distribution"]},
+        "occupancy_by_hospital": [row for part in parts for row in part["occupancy_by_hospital"]],
+        "heatmap_data": [row for part in parts for row in part["heatmap_data"]]
+    }
+
+def gather_overview():
+    """``(versi, timestamp, ringkasan)`` dari running total semua shard"""
+    parts = state_shards.scatter("overview")
+    totals = {name: sum(part[2][name] for part in parts) for name in TOTAL_COLUMNS}
+    return (state_shards.combined_version([part[0] for part in parts]), max(part[1] for part in parts),
+            overview_from_totals(totals, sum(part[3] for part in parts)))
+
+def gather_referrals(patients, limit=None):
+    """``(hasil ranking, versi)``: top-k per shard digabung menjadi top-k lintas wilayah"""
+    parts = state_shards.scatter("top_k", patients, limit)
+    results = []
+    for row, patient in enumerate(patients):
+        ranked = [[(offset + slot, recommendation) for slot, recommendation in part[1][row]]
+                  for offset, part in zip(state_shards.offsets, parts)]
+        results.append({"patient": patient, "recommendations": merge_ranked(ranked, limit)})
+    return results, state_shards.combined_version([part[0] for part in parts])
+
+# ============================
+# LOG STATE (WARM RESTART + REPLAY)
+# ============================
+# STATE_LOG_DIR=<direktori> mengaktifkan log delta + checkpoint di disk;
+# tanpa itu state hanya ada di memori seperti sebelumnya.
+STATE_LOG_DIR = os.environ.get("STATE_LOG_DIR")
+# Checkpoint hanya dipulihkan untuk registry RS yang sama (urutan slot sama)
+REGISTRY_FINGERPRINT = hashlib.sha1("\n".join(h["id"] for h in HOSPITALS).encode("utf-8")).hexdigest()
+RETENTION_DAYS = int(os.environ.get("HISTORY_RETENTION_DAYS", HISTORY_RETENTION_DAYS))
+MINUTE_RETENTION_HOURS = int(os.environ.get("HISTORY_MINUTE_RETENTION_HOURS", HISTORY_MINUTE_RETENTION_HOURS))
+# Bucket riwayat mengikuti zona waktu server (WIB = UTC+7), sama dengan label
+# tanggal/jam di respons yang memakai datetime.fromtimestamp (waktu lokal)
+LOCAL_UTC_OFFSET = int(datetime.now().astimezone().utcoffset().total_seconds())
+
+# Riwayat disalin ke STATE_LOG_DIR/history tiap checkpoint; seed hanya saat belum ada salinan.
+# Proses shard tidak menyimpan riwayat: riwayat dicatat store gabungan di proses induk.
+history_store = None
+if not SHARD_REGION:
+    history_store = TimeSeriesStore([hospital["id"] for hospital in HOSPITALS], HISTORY_METRICS, RETENTION_DAYS,
+                                    directory=os.path.join(STATE_LOG_DIR, "history") if STATE_LOG_DIR else None,
+                                    minute_retention_hours=MINUTE_RETENTION_HOURS, utc_offset=LOCAL_UTC_OFFSET)
+    if not history_store.restored:
+        seed_history(history_store)
+
+snapshot_log = None
+restored_state = None
+if STATE_LOG_DIR:
+    if STATE_SHARDS:
+        raise ValueError("STATE_LOG_DIR belum didukung bersama STATE_SHARDS")
+    snapshot_log = SnapshotLog(STATE_LOG_DIR, STATE_SECTIONS, _record_key, RETENTION_DAYS, history=history_store)
+    restored_state = snapshot_log.restore(REGISTRY_FINGERPRINT)
+
+# Store gabungan shard wilayah; None pada mode satu store
+state_shards = None
+if STATE_SHARDS == "inprocess":
+    state_shards = ShardedStateStore(HOSPITALS, SHARD_RANGES, [
+        RegionShard(region, HospitalStateStore(HOSPITALS[start:end])) for region, start, end in SHARD_RANGES
+    ], history=history_store)
+elif STATE_SHARDS == "subprocess":
+    state_shards = ShardedStateStore(HOSPITALS, SHARD_RANGES, spawn_shards(
+        [region for region, _, _ in SHARD_RANGES],
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "shard_worker.py"), _record_key
+    ), history=history_store)
+
+if state_shards is not None:
+    state_store = state_shards
+else:
+    # Tanpa state yang cocok versi tetap dilanjutkan dari log agar ETag/cursor lama tidak bentrok
+    state_store = HospitalStateStore(HOSPITALS, history=history_store, restore=restored_state,
+                                     version=snapshot_log.latest_version() if snapshot_log and restored_state is None else 0)
+if snapshot_log is not None:
+    snapshot_log.attach(state_store, REGISTRY_FINGERPRINT)
+    metrics_registry.collector(lambda: [
+        ("state_log_errors_total", "counter", "Jumlah gagal tulis log state", snapshot_log.errors),
+        ("state_log_failing", "gauge", "1 bila log state sedang gagal ditulis", int(snapshot_log.failing))
+    ])
+
+def start_background():
+    """Mulai thread latar belakang proses penulis (tick simulasi, log state, diff stream)"""
+    state_store.start()
+    stream_hub.start()
+    if snapshot_log is not None:
+        snapshot_log.start()
+
+def current_snapshot():
+    """Snapshot terbaru untuk request; di worker termasuk memuat versi baru dari shared memory"""
+    with timed("state_read"):
+        return state_store.snapshot()
+
+# ============================
+# CACHE RESPONS (PER VERSI DATA)
+# ============================
+response_cache = ResponseCache()
+metrics_registry.collector(lambda: [
+    (f"response_cache_{name}_total", "counter", f"Jumlah {name} cache respons", value)
+    for name, value in response_cache.stats().items() if name in ("hits", "misses", "coalesced", "evictions")
+] + [("response_cache_bytes", "gauge", "Ukuran body di cache respons", response_cache.stats()["bytes"])])
+
+def negotiate_encoding():
+    """Encoding terbaik dari ``Accept-Encoding`` yang didukung server"""
+    return request.accept_encodings.best_match(ENCODINGS) or "identity"
+
+def cached_json(key, build_payload):
+    """Respons JSON dari cache; ``build_payload()`` hanya dipanggil saat miss.
+
+    ``key`` harus memuat versi snapshot agar body tidak pernah basi.
+    """
+    body, encoding = response_cache.encoded(
+        key, lambda: app.json.response(build_payload()).get_data(), negotiate_encoding())
+    response = app.response_class(body, mimetype=app.json.mimetype)
+    response.vary.add("Accept-Encoding")
+    if encoding != "identity":
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+@app.route('/api/cache/stats')
+def cache_stats():
+    return jsonify({**response_cache.stats(), "timestamp": datetime.now().isoformat()})
+
+@app.route('/api/visualizations')
+def visualizations():
+    """Endpoint untuk data visualisasi tambahan"""
+    if state_shards is not None:
+        parts = state_shards.scatter("visualizations")
+        version = state_shards.combined_version([part[0] for part in parts])
+        timestamp = max(part[1] for part in parts)
+        return cached_json(("visualizations", version), lambda: {
+            **merge_visualizations([part[2] for part in parts]),
+            "version": version,
+            "timestamp": timestamp
+        })
+    snapshot = current_snapshot()
+    return cached_json(("visualizations", snapshot.version), lambda: {
+        **snapshot.visualizations,
+        "version": snapshot.version,
+        "timestamp": snapshot.timestamp
     })
 
 @app.route('/api/overview')
 def overview():
-    bed_data = generate_bed_capacity()
-    er_data = generate_er_status()
+    if state_shards is not None:
+        version, timestamp, summary = gather_overview()
+        return cached_json(("overview", version), lambda: {
+            "summary": summary,
+            "version": version,
+            "timestamp": timestamp
+        })
+    snapshot = current_snapshot()
+    return cached_json(("overview", snapshot.version), lambda: {
+        "summary": snapshot.overview,
+        "version": snapshot.version,
+        "timestamp": snapshot.timestamp
+    })
 
-    total_beds = sum(
-        h["regular"]["total"] + h["icu"]["total"] + h["isolation"]["total"]
-        for h in bed_data
-    )
-    occupied_beds = sum(
-        h["regular"]["occupied"] + h["icu"]["occupied"] + h["isolation"]["occupied"]
-        for h in bed_data
-    )
-    total_er_patients = sum(h["waiting_patients"] + h["in_treatment"] for h in er_data)
+def section_payload(snapshot, name):
+    """Body standar ``{"data", "version", "timestamp"}`` untuk satu section"""
+    return {"data": snapshot.section(name), "version": snapshot.version, "timestamp": snapshot.timestamp}
 
-    return jsonify({
-        "summary": {
-            "total_hospitals": len(HOSPITALS),
-            "total_beds": total_beds,
-            "occupied_beds": occupied_beds,
-            "available_beds": total_beds - occupied_beds,
-            "occupancy_rate": round((occupied_beds / total_beds) * 100, 1),
-            "total_er_patients": total_er_patients
-        },
-        "timestamp": datetime.now().isoformat()
-    })
+# Field yang selalu ikut saat projection ``fields=`` agar record tetap bisa dikenali
+LIST_KEY_FIELDS = ("id", "hospital_id", "polyclinic")
+
+registry_index = RegistryIndex(HOSPITALS)
+_record_slots = {}
+
+def record_slots(name, records):
+    """Slot RS untuk setiap posisi record section (urutan record tetap)"""
+    slots = _record_slots.get(name)
+    if slots is None or len(slots) != len(records):
+        slots = _record_slots[name] = np.array(
+            [registry_index.slots[record.get("hospital_id", record.get("id"))] for record in records], dtype=np.intp)
+    return slots
+
+def list_response(name, records, meta):
+    """List ter-filter/terproyeksi/ber-cursor yang di-stream per chunk"""
+    try:
+        query = ListQuery(request.args, state_store.epoch)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    positions = query.positions(record_slots(name, records), registry_index)
+    page = query.iter_page(records, positions, LIST_KEY_FIELDS)
+    mimetype = "application/x-ndjson" if query.format == "ndjson" else "application/json"
+    return Response(stream_list(page, meta, state_store.epoch, query.format), mimetype=mimetype)
+
+def section_response(name):
+    snapshot = current_snapshot()
+    if ListQuery.requested(request.args):
+        if isinstance(snapshot.section(name), dict):
+            return jsonify({"error": f"Parameter list tidak didukung untuk section {name}"}), 400
+        return list_response(name, snapshot.section(name),
+                             {"version": snapshot.version, "timestamp": snapshot.timestamp})
+    return cached_json(("section", name, snapshot.version), lambda: section_payload(snapshot, name))
 
 @app.route('/api/beds')
 def beds():
-    return jsonify({"data": generate_bed_capacity(), "timestamp": datetime.now().isoformat()})
+    return section_response("beds")
 
 @app.route('/api/emergency')
 def emergency():
-    return jsonify({"data": generate_er_status(), "timestamp": datetime.now().isoformat()})
+    return section_response("emergency")
 
 @app.route('/api/queues')
 def queues():
-    return jsonify({"data": generate_queue_data(), "timestamp": datetime.now().isoformat()})
+    return section_response("queues")
 
 @app.route('/api/metrics')
 def metrics():
-    return jsonify({"data": generate_operational_metrics(), "timestamp": datetime.now().isoformat()})
+    return section_response("metrics")
 
 @app.route('/api/staff')
 def staff():
-    return jsonify({"data": generate_staff_availability(), "timestamp": datetime.now().isoformat()})
+    return section_response("staff")
 
 @app.route('/api/resources')
 def resources():
-    return jsonify({"data": generate_resource_status(), "timestamp": datetime.now().isoformat()})
+    return section_response("resources")
 
 @app.route('/api/trends')
 def trends():
-    return jsonify({"data": generate_trend_data(), "timestamp": datetime.now().isoformat()})
+    return section_response("trends")
+
+def parse_time(raw, default):
+    """Waktu ISO 8601 atau epoch detik dari query string.
+
+    Nilai yang tidak bisa dipetakan ke ``datetime`` lokal (nan/inf, 1e12,
+    1e300) ditolak dengan ValueError agar route menjawab 400, bukan 500.
+    """
+    if not raw:
+        value = default
+    else:
+        try:
+            value = float(raw)
+        except ValueError:
+            try:
+                value = datetime.fromisoformat(raw).timestamp()
+            except (ValueError, OverflowError):
+                raise ValueError(f"Format waktu tidak valid: {raw}")
+    if value is None:
+        return None
+    try:
+        datetime.fromtimestamp(value)
+    except (ValueError, OverflowError, OSError):
+        raise ValueError(f"Waktu di luar jangkauan: {raw or value}")
+    return value
+
+@app.route('/api/history')
+def history():
+    """Riwayat satu metrik per RS: ?metric=&start=&end=&resolution=&agg=&hospital_id="""
+    snapshot = current_snapshot()
+    metric = request.args.get('metric', 'occupancy_rate')
+    resolution = request.args.get('resolution', '1h')
+    # Tier 1m hanya menyimpan nilai terakhir per menit
+    agg = request.args.get('agg', 'last' if resolution == '1m' else 'avg')
+    raw_ids = request.args.get('hospital_id')
+    hospital_ids = [h.strip() for h in raw_ids.split(',') if h.strip()] if raw_ids else None
+    try:
+        end = parse_time(request.args.get('end'), datetime.now().timestamp())
+        start = parse_time(request.args.get('start'), end - 86400)
+        if start > end:
+            raise ValueError("start harus sebelum end")
+        step = RESOLUTIONS.get(resolution)
+        if step and (end - start) / step > HISTORY_MAX_POINTS:
+            raise ValueError(f"Rentang terlalu besar untuk resolusi {resolution} (maks {HISTORY_MAX_POINTS} titik)")
+        timestamps, series_ids, values = writer.history(metric, start, end, resolution, agg, hospital_ids)
+    except (ValueError, KeyError, OverflowError) as e:
+        return jsonify({"error": str(e).strip("'")}), 400
+
+    return jsonify({
+        "metric": metric,
+        "resolution": resolution,
+        "agg": agg,
+        "timestamps": [datetime.fromtimestamp(ts).isoformat() for ts in timestamps],
+        "series": [
+            {"hospital_id": hospital_id, "values": _json_values(row, 2)}
+            for hospital_id, row in zip(series_ids, values)
+        ],
+        "version": snapshot.version,
+        "timestamp": snapshot.timestamp
+    })
 
 @app.route('/api/hospitals')
 def hospitals():
-    return jsonify({"data": HOSPITALS, "timestamp": datetime.now().isoformat()})
+    snapshot = current_snapshot()
+    if ListQuery.requested(request.args):
+        return list_response("hospitals", HOSPITALS, {"timestamp": snapshot.timestamp})
+    return cached_json(("hospitals", snapshot.version), lambda: {"data": HOSPITALS, "timestamp": snapshot.timestamp})
 
-def analyze_severity(complaint):
-    """Analisis tingkat kegawatan berdasarkan keluhan"""
-    complaint_lower = complaint.lower()
-    
-    # Keywords untuk critical
-    critical_keywords = [
-        'sesak', 'napas', 'dada sakit', 'nyeri dada', 'pingsan', 
-        'tidak sadar', 'kejang', 'darah muntah', 'stroke', 
-        'jantung', 'serangan jantung', 'kecelakaan', 'luka parah',
-        'pendarahan hebat', 'trauma kepala', 'koma'
-    ]
-    
-    # Keywords untuk urgent
-    urgent_keywords = [
-        'demam tinggi', 'muntah terus', 'diare parah', 'nyeri perut',
-        'sakit perut hebat', 'luka bakar', 'patah tulang', 'cedera',
-        'alergi parah', 'sesak ringan', 'pusing hebat', 'keracunan'
-    ]
-    
-    # Keywords untuk semi-urgent
-    semi_urgent_keywords = [
-        'demam', 'batuk', 'flu', 'sakit kepala', 'mual', 'muntah',
-        'diare', 'nyeri', 'bengkak', 'luka', 'infeksi', 'gatal'
+@app.route('/api/hospitals/search')
+def search_hospitals():
+    """Cari RS per token/prefix nama, kecamatan, dan alamat (``q=borromeus coblong``)"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Parameter q wajib diisi"}), 400
+    try:
+        limit = int(request.args.get('limit', SEARCH_DEFAULT_LIMIT))
+    except ValueError:
+        return jsonify({"error": "limit harus bilangan bulat"}), 400
+    if not 1 <= limit <= SEARCH_MAX_LIMIT:
+        return jsonify({"error": f"limit harus antara 1 dan {SEARCH_MAX_LIMIT}"}), 400
+
+    total, records = hospital_registry.search(query, limit)
+    return jsonify({"query": query, "total": total, "data": records, "timestamp": datetime.now().isoformat()})
+
+@app.route('/api/hospitals/<hospital_id>')
+def hospital_detail(hospital_id):
+    hospital = hospital_registry.get(hospital_id)
+    if hospital is None:
+        return jsonify({"error": f"RS tidak ditemukan: {hospital_id}"}), 404
+    return jsonify({"data": hospital, "timestamp": datetime.now().isoformat()})
+
+# ============================
+# DASHBOARD BUNDLE (ETAG / 304)
+# ============================
+DASHBOARD_SECTIONS = ("overview", "beds", "emergency", "queues", "trends", "staff", "resources", "visualizations")
+
+def dashboard_payload(snapshot, sections):
+    """Gabungkan beberapa section dalam satu payload dengan bentuk yang sama
+    seperti endpoint masing-masing"""
+    payload = {"version": snapshot.version, "timestamp": snapshot.timestamp}
+    for name in sections:
+        if name == "overview":
+            payload[name] = {"summary": snapshot.overview, "version": snapshot.version, "timestamp": snapshot.timestamp}
+        elif name == "visualizations":
+            payload[name] = {**snapshot.visualizations, "version": snapshot.version, "timestamp": snapshot.timestamp}
+        else:
+            payload[name] = section_payload(snapshot, name)
+    return payload
+
+def dashboard_etag(snapshot, sections, encoding):
+    """ETag kuat yang terikat pada versi data, daftar section dan content-coding"""
+    etag = f"{state_store.epoch}-{snapshot.version}-{'.'.join(sections)}"
+    return etag if encoding == "identity" else f"{etag}-{encoding}"
+
+def parse_sections(raw, allowed):
+    """Parse parameter ``sections=a,b`` (urutan mengikuti ``allowed``)"""
+    if not raw:
+        return allowed
+    requested = {name.strip() for name in raw.split(",") if name.strip()}
+    unknown = requested - set(allowed)
+    if unknown:
+        raise ValueError(f"Section tidak dikenal: {', '.join(sorted(unknown))}")
+    return tuple(name for name in allowed if name in requested)
+
+@app.route('/api/dashboard')
+def dashboard():
+    """Semua data dashboard dalam satu request, dengan dukungan If-None-Match"""
+    try:
+        sections = parse_sections(request.args.get("sections"), DASHBOARD_SECTIONS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    snapshot = current_snapshot()
+    # Body gzip/br berbeda byte dengan identity, jadi tag-nya juga harus berbeda
+    etag = dashboard_etag(snapshot, sections, negotiate_encoding())
+    if request.if_none_match.contains_weak(etag):
+        response = make_response("", 304)
+    else:
+        response = cached_json(("dashboard", sections, snapshot.version),
+                               lambda: dashboard_payload(snapshot, sections))
+    response.set_etag(etag)
+    # ETag bergantung encoding: 304 juga harus membawa Vary agar cache perantara tidak salah pasang
+    response.vary.add("Accept-Encoding")
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+# ============================
+# REPLAY STATE DARI LOG
+# ============================
+def replay_payload(at, sections):
+    """Payload bentuk ``/api/dashboard`` untuk state yang tercatat pada waktu ``at``"""
+    if snapshot_log is None:
+        raise LookupError("Log state tidak aktif (set STATE_LOG_DIR)")
+    state = snapshot_log.state_at(at, REGISTRY_FINGERPRINT)
+    if state is None:
+        raise LookupError("Tidak ada checkpoint sebelum waktu tersebut (di luar retensi log)")
+    recorded = datetime.fromtimestamp(state.timestamp)
+    snapshot = StateSnapshot(
+        version=state.version,
+        timestamp=recorded.isoformat(),
+        trends=build_trends(history_store, recorded),
+        overview=build_overview(state.columns),
+        columns=state.columns,
+        **{name: tuple(records) for name, records in state.sections.items()}
+    )
+    return {
+        **dashboard_payload(snapshot, sections),
+        "at": datetime.fromtimestamp(at).isoformat(),
+        # False: penulisan log sedang gagal, state setelah kegagalan belum tercatat
+        "log_healthy": not snapshot_log.failing
+    }
+
+@app.route('/api/replay')
+def replay():
+    """State dashboard sebagaimana tercatat pada ?at= (ISO 8601 atau epoch detik)"""
+    if not request.args.get('at'):
+        return jsonify({"error": "Parameter at wajib diisi"}), 400
+    try:
+        at = parse_time(request.args['at'], None)
+        sections = parse_sections(request.args.get("sections"), DASHBOARD_SECTIONS)
+        payload = writer.replay(at, sections)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except RegistryMismatch as e:
+        return jsonify({"error": str(e)}), 409
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    return jsonify(payload)
+
+# ============================
+# PUSH STREAM (SSE)
+# ============================
+stream_hub = StreamHub(
+    epoch=state_store.epoch,
+    sections=STATE_SECTIONS,
+    record_key=_record_key,
+    snapshot_payload=lambda snapshot: dashboard_payload(snapshot, DASHBOARD_SECTIONS),
+    cache=response_cache
+)
+state_store.add_listener(stream_hub.on_publish)
+metrics_registry.collector(lambda: [
+    ("state_version", "gauge", "Versi snapshot yang sedang dilayani", state_store.version),
+    ("stream_clients", "gauge", "Klien SSE yang terhubung", stream_hub.client_count)
+])
+
+@app.route('/api/stream')
+def stream():
+    """Server-Sent Events: snapshot awal lalu delta per RS dan section"""
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    response = Response(
+        stream_hub.stream(current_snapshot, last_event_id),
+        mimetype="text/event-stream"
+    )
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+# ============================
+# INGEST UPDATE DARI SISTEM RS
+# ============================
+INGEST_SECTIONS = ("beds", "emergency", "queues", "staff", "resources")
+
+ingest_pipeline = IngestPipeline(state_store, INGEST_SECTIONS)
+
+@app.route('/api/ingest', methods=['POST'])
+def ingest():
+    """Update parsial dalam format NDJSON: satu object per baris.
+
+    Contoh baris: ``{"hospital_id": "RS001", "section": "beds",
+    "values": {"icu": {"occupied": 30}}, "source": "simrs-rs001", "seq": 42,
+    "idempotency_key": "..."}``
+    """
+    summary = writer.ingest(iter_lines(request.stream))
+    snapshot = current_snapshot()
+    status = 400 if summary["errors"] and not summary["accepted"] else 200
+    return jsonify({**summary, "version": snapshot.version, "timestamp": snapshot.timestamp}), status
+
+# ============================
+# EVENT PASIEN (MODEL ANTRIAN IGD + POLIKLINIK)
+# ============================
+# Dengan STATE_LOG_DIR pasien aktif dan counter antrian ikut bertahan saat restart
+queue_model = QueueModel(state_store, directory=os.path.join(STATE_LOG_DIR, "queues") if STATE_LOG_DIR else None)
+metrics_registry.collector(lambda: [
+    ("queue_events_total", "counter", "Jumlah event pasien yang diterapkan", queue_model.events),
+    ("queue_active_patients", "gauge", "Pasien aktif yang dilacak model antrian", queue_model.stats()["active_patients"])
+])
+
+@app.route('/api/events', methods=['POST'])
+def queue_events():
+    """Event pasien dalam format NDJSON; IGD bila ``polyclinic`` tidak diisi.
+
+    Contoh baris: ``{"hospital_id": "RS001", "patient_id": "p-17",
+    "type": "arrival" | "triage" | "service_start" | "discharge",
+    "polyclinic": "Poli Anak", "severity": "urgent", "ts": 1767225600}``
+    """
+    summary = writer.events(iter_lines(request.stream))
+    snapshot = current_snapshot()
+    status = 400 if summary["errors"] and not summary["accepted"] else 200
+    return jsonify({**summary, "version": snapshot.version, "timestamp": snapshot.timestamp}), status
+
+@app.route('/api/triage/batch', methods=['POST'])
+def triage_batch():
+    """Triage banyak keluhan sekaligus (mis. dari kios pendaftaran)"""
+    data = request.get_json(silent=True) or {}
+    complaints = data.get('complaints')
+    if not isinstance(complaints, list) or not all(isinstance(c, str) for c in complaints):
+        return jsonify({"error": "complaints harus berupa list string"}), 400
+
+    return jsonify({
+        "results": analyze_severity_many(complaints),
+        "timestamp": datetime.now().isoformat()
+    })
+
+# ============================
+# REKOMENDASI RUJUKAN
+# ============================
+DISTANCE_POINTS = np.array([0, -5, -10])  # <=5 km, <=15 km, >15 km
+# Penyesuaian pasien paling banyak menurunkan skor sebesar ini
+DISTANCE_SLACK = int(-DISTANCE_POINTS.min())
+
+class ReferralContext:
+    """Indeks spasial, kapabilitas dan ranking rujukan untuk satu kumpulan RS.
+
+    Mode satu store memakai satu konteks untuk seluruh registry; setiap
+    shard wilayah punya konteksnya sendiri (slot = posisi RS di shard).
+    """
+
+    def __init__(self, hospitals, specialties=()):
+        self.hospitals = hospitals
+        self.hospital_index = GridIndex([(h['lat'], h['lon']) for h in hospitals])
+        self.capability_index = CapabilityIndex(hospitals, specialties)
+        self._latest_index = None
+        self._index_lock = threading.Lock()
+        self.index = timed("referral_index")(lru_cache(maxsize=8)(self._index))
+
+    def _index(self, snapshot, hour):
+        """Indeks ranking untuk snapshot dan jam ini, diturunkan dari indeks terakhir
+        sehingga hanya RS yang berubah yang dihitung ulang"""
+        with self._index_lock:
+            latest = self._latest_index
+            if latest is None:
+                index = ReferralIndex.build(snapshot.columns, hour, self.capability_index)
+            else:
+                index = latest.updated(snapshot.columns, hour)
+            self._latest_index = index
+            return index
+
+    def key(self, patient):
+        """Kunci ranking pasien: ``(jenis tempat tidur, spesialisasi)``"""
+        bed_type = patient.get("bed_type") or SEVERITY_BED_TYPE[patient["severity_code"]]
+        return bed_type, self.capability_index.key(patient.get("specialty"))
+
+referral_context = ReferralContext(HOSPITALS, REGISTRY_SPECIALTIES)
+
+@timed("score_referrals")
+def score_referrals(context, index, patients, columns=None):
+    """Skor semua pasangan pasien x RS dalam satu operasi vektor.
+
+    Skor sisi RS dibaca dari ``index`` (per kunci pasien), lalu ditambah
+    penyesuaian khusus pasien. ``columns`` membatasi RS yang diskor
+    (indeks registry); None = semua. Mengembalikan matriks skor
+    ``(pasien, kolom)`` (``-inf`` = di luar ``max_km`` pasien), tier tiap
+    komponen untuk menyusun alasan, dan matriks jarak (``nan`` bila pasien
+    tidak mengirim lokasi).
+    """
+    slots = slice(None) if columns is None else columns
+    tiers = {name: values[slots] for name, values in index.tiers.items()}
+    lats, lons = context.hospital_index.lats[slots], context.hospital_index.lons[slots]
+    n_columns = len(lats)
+
+    hospital_scores = np.empty((len(patients), n_columns))
+    for row, patient in enumerate(patients):
+        hospital_scores[row] = index.ranking(context.key(patient))[0][slots]
+
+    # Komponen khusus pasien: jarak tempuh (hanya bila lokasi dikirim)
+    patient_adjustments = np.zeros((len(patients), n_columns))
+    distances = np.full((len(patients), n_columns), np.nan)
+    for row, patient in enumerate(patients):
+        location = patient.get("location")
+        if location is None:
+            continue
+        distance = haversine_km(location["lat"], location["lon"], lats, lons)
+        distances[row] = distance
+        patient_adjustments[row] = DISTANCE_POINTS[np.select([distance <= 5, distance <= 15], [0, 1], 2)]
+        if location.get("max_km") is not None:
+            patient_adjustments[row, distance > location["max_km"]] = -np.inf
+    return hospital_scores + patient_adjustments, tiers, distances
+
+def referral_candidates(context, index, patients, limit=None):
+    """Indeks RS yang perlu diskor; None = semua RS.
+
+    Pasien dengan ``max_km`` cukup diskor terhadap RS di sekitarnya
+    (indeks spasial). Pasien tanpa ``max_km`` hanya mendapat penyesuaian
+    jarak (turun paling banyak ``DISTANCE_SLACK``), jadi bila ``limit``
+    diberikan cukup prefiks ranking indeks untuk kuncinya. Biaya scoring
+    pun mengikuti jumlah kandidat, bukan ukuran registry.
+    """
+    if not patients:
+        return None
+    candidates = []
+    for patient in patients:
+        location = patient.get("location") or {}
+        if location.get("max_km") is not None:
+            nearby, _ = context.hospital_index.within(location["lat"], location["lon"], location["max_km"])
+            candidates.append(nearby)
+        elif limit is not None:
+            candidates.append(index.top_slots(context.key(patient), limit, DISTANCE_SLACK if location else 0))
+        else:
+            return None
+    candidates = np.unique(np.concatenate(candidates)).astype(int)
+    return None if len(candidates) == index.size else candidates
+
+def referral_reasons(context, i, j, features, tiers, distance, key):
+    """Alasan rekomendasi untuk RS ke-i (kolom ke-j)"""
+    beds_available = int(features["beds_available"][j])
+    doctors_on_duty = int(features["doctors_on_duty"][j])
+    reasons = [
+        (f"Tempat tidur tersedia: {beds_available}",
+         f"Tempat tidur cukup: {beds_available}",
+         f"Tempat tidur terbatas: {beds_available}")[tiers["beds"][j]],
+        ("IGD tidak padat", "IGD sedang padat")[tiers["er"][j]],
+        (f"Dokter tersedia: {doctors_on_duty} orang",
+         f"Dokter cukup: {doctors_on_duty} orang",
+         f"Dokter terbatas: {doctors_on_duty} orang")[tiers["doctors"][j]],
+        ("Jam sepi", "Jam cukup sepi", "Jam ramai")[tiers["traffic"][j]]
     ]
-    
-    # Check severity
-    for keyword in critical_keywords:
-        if keyword in complaint_lower:
-            return 'critical', 'Critical'
-    
-    for keyword in urgent_keywords:
-        if keyword in complaint_lower:
-            return 'urgent', 'Urgent'
-    
-    for keyword in semi_urgent_keywords:
-        if keyword in complaint_lower:
-            return 'semi_urgent', 'Semi-Urgent'
-    
-    return 'non_urgent', 'Non-Urgent'
+    if tiers["high_occupancy"][j]:
+        reasons.append("⚠️ Okupansi tinggi")
+    bed_type, specialty = key
+    if features[f"{bed_type}_available"][j] <= 0:
+        reasons.append(f"⚠️ Tempat tidur {bed_type.upper()} penuh")
+    supported = context.capability_index.supports(specialty)
+    if supported is not None and not supported[i]:
+        reasons.append(f"⚠️ Tidak ada layanan {specialty}")
+    if not np.isnan(distance):
+        reasons.append(("Jarak dekat", "Jarak sedang", "Jarak jauh")[
+            0 if distance <= 5 else 1 if distance <= 15 else 2] + f": {distance:.1f} km")
+    return reasons
+
+def build_recommendation(context, snapshot, i, j, score, features, tiers, distance, key):
+    """Satu entri rekomendasi untuk RS ke-i (kolom ke-j pada matriks skor)"""
+    hospital = context.hospitals[i]
+    er_info = snapshot.emergency[i]
+    staff_info = snapshot.staff[i]
+    score = int(score)
+    details = {
+        "beds_available": int(features["beds_available"][j]),
+        "er_waiting": er_info['waiting_patients'],
+        "doctors_on_duty": staff_info['staff']['doctors']['on_duty'],
+        "specialists_available": staff_info['staff']['doctors']['specialists_available'],
+        "occupancy_rate": round(float(features["occupancy_rate"][j]), 1),
+        "current_traffic": int(features["traffic"][j]),
+        "estimated_wait_time": er_info['avg_waiting_time']
+    }
+    if not np.isnan(distance):
+        details["distance_km"] = round(float(distance), 1)
+    return {
+        "hospital_id": hospital['id'],
+        "hospital_name": hospital['name'],
+        "hospital_type": hospital['type'],
+        "address": hospital['address'],
+        "score": score,
+        "priority": "Sangat Direkomendasikan" if score >= 80 else "Direkomendasikan" if score >= 60 else "Alternatif",
+        "reasons": referral_reasons(context, i, j, features, tiers, distance, key),
+        "details": details
+    }
+
+def parse_location(data):
+    """Lokasi pasien opsional (``lat``, ``lon``, ``max_km``); ValueError bila tidak valid"""
+    if data.get('lat') is None and data.get('lon') is None:
+        if data.get('max_km') is not None:
+            raise ValueError("max_km membutuhkan lat dan lon")
+        return None
+    try:
+        location = {"lat": float(data['lat']), "lon": float(data['lon'])}
+        if data.get('max_km') is not None:
+            location["max_km"] = float(data['max_km'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("lat, lon dan max_km harus berupa angka")
+    # float("inf")/float("nan") lolos konversi; max_km=inf membuat radius pencarian grid overflow
+    if not all(math.isfinite(value) for value in location.values()):
+        raise ValueError("lat, lon dan max_km harus bilangan berhingga")
+    if not (-90 <= location["lat"] <= 90 and -180 <= location["lon"] <= 180):
+        raise ValueError("lat/lon di luar jangkauan")
+    if location.get("max_km", 0) < 0:
+        raise ValueError("max_km tidak boleh negatif")
+    return location
+
+def patient_info(data):
+    """Data pasien dari request beserta hasil analisis kegawatan"""
+    complaint = data.get('complaint', '')
+    # Analisis kegawatan otomatis dari keluhan
+    severity_code, severity_text = analyze_severity(complaint)
+    info = {
+        "name": data.get('name', ''),
+        "age": data.get('age', 0),
+        "complaint": complaint,
+        "specialty": data.get('specialty', 'Umum'),
+        "severity_code": severity_code,
+        "severity_text": severity_text
+    }
+    location = parse_location(data)
+    if location is not None:
+        info["location"] = location
+    return info
+
+def top_k_columns(scores, limit):
+    """Indeks kolom top-k per baris, urut skor menurun lalu indeks menaik.
+
+    Memakai seleksi parsial (``argpartition``) sehingga tidak perlu sort
+    penuh; hasilnya sama dengan ``list.sort(reverse=True)`` yang stabil.
+    """
+    n_columns = scores.shape[1]
+    # Kunci unik: skor bulat, seri dipecah dengan indeks (lebih kecil = lebih dulu)
+    keys = np.where(np.isfinite(scores), scores * (n_columns + 1) - np.arange(n_columns), -np.inf)
+    if limit is not None and limit < n_columns:
+        part = np.argpartition(-keys, limit - 1, axis=1)[:, :limit]
+        order = np.take_along_axis(part, np.argsort(-np.take_along_axis(keys, part, axis=1), axis=1), axis=1)
+    else:
+        order = np.argsort(-keys, axis=1, kind='stable')
+    return order
+
+@timed("rank_referrals")
+def rank_referrals(snapshot, patients, limit=None, context=None):
+    """Ranking RS untuk sekumpulan pasien dengan satu snapshot yang sama.
+
+    ``context`` default ``referral_context`` (seluruh registry); shard
+    wilayah memberikan konteksnya sendiri bersama snapshot shard.
+    """
+    context = context or referral_context
+    index = context.index(snapshot, datetime.now().hour)
+    columns = referral_candidates(context, index, patients, limit)
+    scores, tiers, distances = score_referrals(context, index, patients, columns)
+    features = index.features
+    if columns is not None:
+        features = {name: values[columns] for name, values in features.items()}
+    order = top_k_columns(scores, limit)
+
+    cache = {}
+    results = []
+    for row, patient in enumerate(patients):
+        key = context.key(patient)
+        recommendations = []
+        for j in order[row]:
+            if not np.isfinite(scores[row, j]):
+                continue
+            i = int(columns[j]) if columns is not None else int(j)
+            distance = distances[row, j]
+            entry = (i, int(scores[row, j]), None if np.isnan(distance) else float(distance), key)
+            if entry not in cache:
+                cache[entry] = build_recommendation(context, snapshot, i, int(j), scores[row, j], features, tiers,
+                                                    distance, key)
+            recommendations.append(cache[entry])
+        results.append({"patient": patient, "recommendations": recommendations})
+    return results
+
+def referral_results(patients, limit=None):
+    """``(hasil ranking, versi)``; dengan shard wilayah lewat scatter-gather top-k"""
+    if state_shards is not None:
+        return gather_referrals(patients, limit)
+    snapshot = current_snapshot()
+    return rank_referrals(snapshot, patients, limit), snapshot.version
 
 @app.route('/api/referral/recommend', methods=['POST'])
 def recommend_referral():
     """Endpoint untuk rekomendasi rujukan berdasarkan kondisi pasien"""
-    from flask import request
-    
     data = request.get_json()
-    patient_name = data.get('name', '')
-    patient_age = data.get('age', 0)
-    complaint = data.get('complaint', '')
-    specialty_needed = data.get('specialty', 'Umum')
-    
-    # Analisis kegawatan otomatis dari keluhan
-    severity_code, severity_text = analyze_severity(complaint)
-    
-    # Get current data
-    bed_data = generate_bed_capacity()
-    er_data = generate_er_status()
-    staff_data = generate_staff_availability()
-    heatmap_data = generate_heatmap_data()
-    
-    current_hour = datetime.now().hour
-    
-    # Scoring system untuk rekomendasi
-    recommendations = []
-    
-    for i, hospital in enumerate(HOSPITALS):
-        bed_info = bed_data[i]
-        er_info = er_data[i]
-        staff_info = staff_data[i]
-        hourly_traffic = heatmap_data[i]['hourly_data'][current_hour]
-        
-        # Calculate score (0-100)
-        score = 0
-        reasons = []
-        
-        # 1. Bed availability (30 points)
-        bed_availability = bed_info['regular']['available'] + bed_info['icu']['available']
-        if bed_availability > 50:
-            score += 30
-            reasons.append(f"Tempat tidur tersedia: {bed_availability}")
-        elif bed_availability > 20:
-            score += 20
-            reasons.append(f"Tempat tidur cukup: {bed_availability}")
-        else:
-            score += 10
-            reasons.append(f"Tempat tidur terbatas: {bed_availability}")
-        
-        # 2. ER status (25 points)
-        if er_info['status'] == 'normal':
-            score += 25
-            reasons.append("IGD tidak padat")
-        else:
-            score += 10
-            reasons.append("IGD sedang padat")
-        
-        # 3. Staff availability (25 points)
-        doctor_ratio = staff_info['staff']['doctors']['on_duty'] / staff_info['staff']['doctors']['total']
-        if doctor_ratio > 0.5:
-            score += 25
-            reasons.append(f"Dokter tersedia: {staff_info['staff']['doctors']['on_duty']} orang")
-        elif doctor_ratio > 0.3:
-            score += 15
-            reasons.append(f"Dokter cukup: {staff_info['staff']['doctors']['on_duty']} orang")
-        else:
-            score += 5
-            reasons.append(f"Dokter terbatas: {staff_info['staff']['doctors']['on_duty']} orang")
-        
-        # 4. Traffic hour (20 points)
-        if hourly_traffic < 15:
-            score += 20
-            reasons.append("Jam sepi")
-        elif hourly_traffic < 25:
-            score += 10
-            reasons.append("Jam cukup sepi")
-        else:
-            score += 0  # Tidak dapat poin jika ramai
-            reasons.append("Jam ramai")
-        
-        # Penalty for high occupancy
-        total_beds = bed_info['regular']['total'] + bed_info['icu']['total']
-        total_occupied = bed_info['regular']['occupied'] + bed_info['icu']['occupied']
-        occupancy_rate = (total_occupied / total_beds) * 100
-        
-        if occupancy_rate > 85:
-            score -= 10
-            reasons.append("⚠️ Okupansi tinggi")
-        
-        recommendations.append({
-            "hospital_id": hospital['id'],
-            "hospital_name": hospital['name'],
-            "hospital_type": hospital['type'],
-            "address": hospital['address'],
-            "score": round(score, 1),
-            "priority": "Sangat Direkomendasikan" if score >= 80 else "Direkomendasikan" if score >= 60 else "Alternatif",
-            "reasons": reasons,
-            "details": {
-                "beds_available": bed_availability,
-                "er_waiting": er_info['waiting_patients'],
-                "doctors_on_duty": staff_info['staff']['doctors']['on_duty'],
-                "specialists_available": staff_info['staff']['doctors']['specialists_available'],
-                "occupancy_rate": round(occupancy_rate, 1),
-                "current_traffic": hourly_traffic,
-                "estimated_wait_time": er_info['avg_waiting_time']
-            }
-        })
-    
-    # Sort by score
-    recommendations.sort(key=lambda x: x['score'], reverse=True)
-    
+    limit = data.get('limit')
+    if limit is not None and (not isinstance(limit, int) or limit < 1):
+        return jsonify({"error": "limit harus bilangan bulat positif"}), 400
+    try:
+        patient = patient_info(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Get current data (satu snapshot konsisten per store/shard)
+    results, version = referral_results([patient], limit)
+    result = results[0]
+
+    return jsonify({
+        "patient": result["patient"],
+        "recommendations": result["recommendations"],
+        "version": version,
+        "timestamp": datetime.now().isoformat()
+    })
+
+@app.route('/api/referral/recommend/batch', methods=['POST'])
+def recommend_referral_batch():
+    """Rekomendasi rujukan untuk banyak pasien sekaligus (mis. korban massal)"""
+    data = request.get_json(silent=True) or {}
+    patients = data.get('patients')
+    if not isinstance(patients, list) or not all(isinstance(p, dict) for p in patients):
+        return jsonify({"error": "patients harus berupa list objek pasien"}), 400
+    limit = data.get('limit')
+    if limit is not None and (not isinstance(limit, int) or limit < 1):
+        return jsonify({"error": "limit harus bilangan bulat positif"}), 400
+
+    try:
+        infos = [patient_info(p) for p in patients]
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    results, version = referral_results(infos, limit)
     return jsonify({
-        "patient": {
-            "name": patient_name,
-            "age": patient_age,
-            "complaint": complaint,
-            "specialty": specialty_needed,
-            "severity_code": severity_code,
-            "severity_text": severity_text
-        },
-        "recommendations": recommendations,
+        "results": results,
+        "version": version,
         "timestamp": datetime.now().isoformat()
     })
 
+# ============================
+# ALOKASI BATCH + HOLD TEMPAT TIDUR
+# ============================
+bed_holds = BedHoldRegistry()
+
+@timed("allocate_patients")
+def allocate_patients(snapshot, patients):
+    """Tempatkan sekumpulan pasien sekaligus dengan memperhatikan sisa tempat tidur.
+
+    Kapasitas = ``available`` pada snapshot dikurangi hold aktif. Pasien
+    dilayani per tingkat kegawatan (critical lebih dulu) dan dalam tiap
+    tingkat total skor rujukan dimaksimalkan. Setiap penempatan langsung
+    mendapat hold agar tidak dijanjikan ke pasien lain.
+    """
+    index = referral_context.index(snapshot, datetime.now().hour)
+    scores, _, _ = score_referrals(referral_context, index, patients)
+    allocations = [None] * len(patients)
+
+    with bed_holds.lock:
+        held = bed_holds.held_counts()
+        for bed_type in BED_TYPES:
+            indices = [i for i, p in enumerate(patients) if p["bed_type"] == bed_type]
+            if not indices:
+                continue
+            held_beds = np.array([held.get((h['id'], bed_type), 0) for h in HOSPITALS])
+            capacity = np.maximum(snapshot.columns.beds_available(bed_type) - held_beds, 0)
+            phases = [
+                [k for k, i in enumerate(indices) if patients[i]["severity_code"] == severity]
+                for severity in SEVERITY_PRIORITY
+            ]
+            assign = min_cost_assignment(-scores[indices], capacity, phases)
+
+            for k, i in enumerate(indices):
+                h = int(assign[k])
+                if h < 0:
+                    allocations[i] = {"patient": patients[i], "bed_type": bed_type, "status": "unassigned"}
+                    continue
+                hospital = HOSPITALS[h]
+                hold = bed_holds.create(hospital['id'], bed_type)
+                allocations[i] = {
+                    "patient": patients[i],
+                    "bed_type": bed_type,
+                    "status": "held",
+                    "hospital_id": hospital['id'],
+                    "hospital_name": hospital['name'],
+                    "score": int(scores[i, h]),
+                    "hold_id": hold["hold_id"],
+                    "hold_expires": hold["expires"].isoformat()
+                }
+    return allocations
+
+@app.route('/api/referral/allocate', methods=['POST'])
+def allocate_referral():
+    """Alokasi rujukan banyak pasien sekaligus dengan hold tempat tidur.
+
+    Penempatan optimal (min-cost flow) dipakai selama jumlah kelas pasien
+    x RS berslot per jenis tempat tidur <= ``ASSIGNMENT_EXACT_CELLS``
+    (40.000, sekitar 100 ms); batch yang lebih besar ditempatkan greedy
+    (prioritas kegawatan dan kapasitas tetap dipatuhi, skor total bisa
+    sedikit di bawah optimal).
+    """
+    data = request.get_json(silent=True) or {}
+    patients = data.get('patients')
+    if not isinstance(patients, list) or not all(isinstance(p, dict) for p in patients):
+        return jsonify({"error": "patients harus berupa list objek pasien"}), 400
+
+    infos = []
+    for p in patients:
+        try:
+            info = patient_info(p)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        info["bed_type"] = p.get('bed_type') or SEVERITY_BED_TYPE[info["severity_code"]]
+        if info["bed_type"] not in BED_TYPES:
+            return jsonify({"error": f"bed_type tidak dikenal: {info['bed_type']}"}), 400
+        infos.append(info)
+
+    allocations, version = writer.allocate(infos)
+    assigned = sum(1 for a in allocations if a["status"] == "held")
+    return jsonify({
+        "allocations": allocations,
+        "summary": {"assigned": assigned, "unassigned": len(allocations) - assigned},
+        "hold_seconds": bed_holds.ttl_seconds,
+        "version": version,
+        "timestamp": datetime.now().isoformat()
+    })
+
+@app.route('/api/referral/holds/<hold_id>', methods=['DELETE'])
+def release_hold(hold_id):
+    """Batalkan hold tempat tidur"""
+    if writer.release_hold(hold_id) is None:
+        return jsonify({"error": "Hold tidak ditemukan atau sudah kedaluwarsa"}), 404
+    return jsonify({"hold_id": hold_id, "status": "released"})
+
+@app.route('/api/referral/holds/<hold_id>/confirm', methods=['POST'])
+def confirm_hold(hold_id):
+    """Konfirmasi hold: pasien tiba, tempat tidur ditandai terisi"""
+    version = writer.confirm_hold(hold_id)
+    if version is None:
+        return jsonify({"error": "Hold tidak ditemukan atau sudah kedaluwarsa"}), 404
+    return jsonify({"hold_id": hold_id, "status": "confirmed", "version": version})
+
+# ============================
+# PENULIS STATE (SATU PROSES)
+# ============================
+class StateWriter:
+    """Semua operasi yang mengubah state atau membaca state milik penulis.
+
+    Route tidak menyentuh ``state_store``/``bed_holds``/``history_store``
+    secara langsung untuk operasi tulis, sehingga pada mode multi-worker
+    (``serve.py``) objek ini cukup diganti dengan proxy RPC ke proses penulis.
+    """
+
+    def ingest(self, lines):
+        return ingest_stream(lines, self.ingest_batch)
+
+    def ingest_batch(self, batch):
+        return ingest_pipeline.process(batch)
+
+    def events(self, lines):
+        return ingest_stream(lines, self.event_batch)
+
+    def event_batch(self, batch):
+        return queue_model.process(batch)
+
+    def allocate(self, patients):
+        snapshot = current_snapshot()
+        return allocate_patients(snapshot, patients), snapshot.version
+
+    def release_hold(self, hold_id):
+        return bed_holds.release(hold_id)
+
+    def confirm_hold(self, hold_id):
+        """Tandai tempat tidur terisi; versi snapshot baru atau None jika hold tidak ada"""
+        hold = bed_holds.release(hold_id)
+        if hold is None:
+            return None
+        index = registry_index.slots[hold['hospital_id']]
+        bed_info = state_store.snapshot().beds[index][hold['bed_type']]
+        snapshot = state_store.update(hold['hospital_id'], "beds", {
+            hold['bed_type']: {"occupied": min(bed_info['total'], bed_info['occupied'] + 1)}
+        })
+        return snapshot.version
+
+    @timed("replay")
+    def replay(self, at, sections):
+        return replay_payload(at, sections)
+
+    @timed("history_query")
+    def history(self, metric, start, end, resolution, agg, hospital_ids):
+        return history_store.query(metric, start, end, resolution, agg, hospital_ids)
+
+class RemoteStateWriter(RemoteWriter):
+    """Proxy ``StateWriter`` di worker; parsing NDJSON tetap di worker"""
+
+    def ingest(self, lines):
+        return ingest_stream(lines, lambda batch: self.call("ingest_batch", batch))
+
+    def events(self, lines):
+        return ingest_stream(lines, lambda batch: self.call("event_batch", batch))
+
+writer = StateWriter()
+
+def use_shared_state(reader, remote_writer):
+    """Alihkan proses worker ke state bersama (dipanggil serve.py setelah fork)"""
+    global state_store, state_shards, writer
+    reader.add_listener(stream_hub.on_publish)
+    stream_hub.start()
+    state_store = reader
+    # Worker membaca snapshot gabungan dari shared memory, bukan shard langsung
+    state_shards = None
+    writer = remote_writer
+
 if __name__ == '__main__':
+    start_background()
     app.run(debug=True, host='0.0.0.0', port=5000)
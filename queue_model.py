@@ -0,0 +1,373 @@
+"""Model antrian IGD/poliklinik dari event pasien dengan estimator streaming O(1) per event"""
+from collections import OrderedDict
+from datetime import date, datetime
+import json
+import os
+import threading
+import time
+
+from ingest import INGEST_MAX_ERRORS, IngestError
+from triage import analyze_severity
+
+EVENT_TYPES = ("arrival", "triage", "service_start", "discharge")
+SEVERITY_CODES = ("critical", "urgent", "semi_urgent", "non_urgent")
+# Unit tanpa ``polyclinic`` = IGD
+ER_UNIT = None
+QUEUE_EWMA_ALPHA = 0.1
+# Pasien aktif yang dilacak; bila penuh pasien tertua dilepas (tanpa discharge)
+QUEUE_MAX_PATIENTS = 200000
+HOUR_SECONDS = 3600
+# Journal event dipadatkan menjadi file state baru setelah sebesar ini
+QUEUE_JOURNAL_BYTES = 16 * 1024 * 1024
+
+# Tahap pasien
+WAITING, IN_SERVICE = "waiting", "in_service"
+
+def ewma(current, sample, alpha=QUEUE_EWMA_ALPHA):
+    """Rata-rata bergerak eksponensial; sampel pertama langsung jadi estimasi"""
+    return sample if current is None else current + alpha * (sample - current)
+
+def _epoch(value):
+    if value is None:
+        return time.time()
+    try:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            ts = float(value)
+        elif isinstance(value, str):
+            ts = datetime.fromisoformat(value).timestamp()
+        else:
+            ts = None
+        # ts harus bisa dipetakan ke jam lokal (bucket heatmap, hari layanan); nan/inf/1e20 tidak
+        if ts is not None:
+            datetime.fromtimestamp(ts)
+            return ts
+    except (ValueError, OverflowError, OSError):
+        pass
+    raise IngestError("ts harus epoch detik atau waktu ISO 8601")
+
+class UnitEstimator:
+    """Counter live satu unit (IGD atau satu poliklinik) di satu RS"""
+
+    __slots__ = ("waiting", "in_service", "served", "served_day", "wait_minutes", "service_minutes", "severity")
+
+    def __init__(self):
+        self.waiting = 0
+        self.in_service = 0
+        self.served = 0
+        self.served_day = None
+        self.wait_minutes = None
+        self.service_minutes = None
+        self.severity = dict.fromkeys(SEVERITY_CODES, 0)
+
+    def served_today(self, now):
+        return self.served if self.served_day == datetime.fromtimestamp(now).date() else 0
+
+    def discharge(self, ts):
+        day = datetime.fromtimestamp(ts).date()
+        if day != self.served_day:
+            self.served_day, self.served = day, 0
+        self.served += 1
+
+class HourlyArrivals:
+    """Kedatangan per jam-dalam-hari selama 24 jam terakhir (ring 24 bucket bercap waktu)"""
+
+    __slots__ = ("counts", "stamps")
+
+    def __init__(self):
+        self.counts = [0] * 24
+        self.stamps = [-1] * 24
+
+    def add(self, ts):
+        bucket = int(ts // HOUR_SECONDS)
+        hour = datetime.fromtimestamp(ts).hour
+        if self.stamps[hour] != bucket:
+            if self.stamps[hour] > bucket:
+                return
+            self.stamps[hour], self.counts[hour] = bucket, 0
+        self.counts[hour] += 1
+
+    def values(self, now):
+        current = int(now // HOUR_SECONDS)
+        return [count if current - stamp < 24 else 0 for count, stamp in zip(self.counts, self.stamps)]
+
+class QueueModel:
+    """Event ``arrival`` -> ``triage`` -> ``service_start`` -> ``discharge`` per pasien.
+
+    Setiap event hanya memperbarui counter unitnya (jumlah menunggu/dilayani,
+    EWMA waktu tunggu dan waktu layanan, distribusi kegawatan, kedatangan per
+    jam); satu micro-batch lalu diterapkan ke ``store`` sebagai satu versi
+    dengan record ``emergency``/``queues``/``heatmap`` yang tersentuh saja.
+    Endpoint tetap membaca snapshot, tidak pernah memindai event mentah.
+
+    Dengan ``directory`` state model (counter, pasien aktif) bertahan saat
+    restart: ``queue-state-<gen>.json`` berisi state lengkap dan
+    ``queue-events-<gen>.log`` event yang diterima sesudahnya. Saat start
+    state dibaca lalu journal diputar ulang; journal yang melewati
+    ``QUEUE_JOURNAL_BYTES`` dipadatkan menjadi generasi baru.
+    """
+
+    def __init__(self, store, max_patients=QUEUE_MAX_PATIENTS, directory=None):
+        self.store = store
+        self.max_patients = max_patients
+        self.directory = directory
+        # (hospital_id, unit) -> UnitEstimator; hospital_id -> HourlyArrivals (kedatangan IGD)
+        self._units = {}
+        self._arrivals = {}
+        # (hospital_id, patient_id) -> [unit, tahap, waktu datang, waktu mulai layanan, kegawatan]
+        self._patients = OrderedDict()
+        self._hour = None
+        self._lock = threading.Lock()
+        self.events = 0
+        self.evicted = 0
+        self._generation = 0
+        self._journal = None
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self._load()
+            self._compact()
+
+    def _known(self, hospital_id, unit):
+        if unit is ER_UNIT:
+            return self.store.record("emergency", hospital_id) is not None
+        return isinstance(unit, str) and self.store.record("queues", (hospital_id, unit)) is not None
+
+    def _parse(self, event):
+        if not isinstance(event, dict):
+            raise IngestError("Setiap baris harus object JSON")
+        hospital_id = event.get("hospital_id")
+        patient_id = event.get("patient_id")
+        kind = event.get("type")
+        if not isinstance(hospital_id, str) or not hospital_id:
+            raise IngestError("hospital_id wajib diisi")
+        if not isinstance(patient_id, (str, int)) or isinstance(patient_id, bool) or patient_id == "":
+            raise IngestError("patient_id wajib diisi")
+        if kind not in EVENT_TYPES:
+            raise IngestError(f"type harus salah satu dari {', '.join(EVENT_TYPES)}")
+        unit = event.get("polyclinic", ER_UNIT)
+        if not self._known(hospital_id, unit):
+            if unit is ER_UNIT:
+                raise IngestError(f"RS tidak dikenal: {hospital_id}")
+            raise IngestError(f"Poliklinik tidak dikenal: {hospital_id} {unit}")
+
+        severity = event.get("severity")
+        if severity is None and isinstance(event.get("complaint"), str):
+            severity = analyze_severity(event["complaint"])[0]
+        if severity is not None and severity not in SEVERITY_CODES:
+            raise IngestError(f"severity harus salah satu dari {', '.join(SEVERITY_CODES)}")
+        if kind == "triage" and severity is None:
+            raise IngestError("triage membutuhkan severity atau complaint")
+        return hospital_id, unit, (hospital_id, patient_id), kind, _epoch(event.get("ts")), severity
+
+    def _unit(self, hospital_id, unit):
+        estimator = self._units.get((hospital_id, unit))
+        if estimator is None:
+            estimator = self._units[(hospital_id, unit)] = UnitEstimator()
+        return estimator
+
+    def _leave(self, estimator, patient):
+        """Keluarkan pasien dari counter tahap dan kegawatan unitnya"""
+        if patient[1] == WAITING:
+            estimator.waiting -= 1
+        else:
+            estimator.in_service -= 1
+        if patient[4] is not None:
+            estimator.severity[patient[4]] -= 1
+
+    def _apply(self, hospital_id, unit, key, kind, ts, severity):
+        estimator = self._unit(hospital_id, unit)
+        patient = self._patients.get(key)
+        if kind == "arrival":
+            if patient is not None:
+                raise IngestError(f"Pasien {key[1]} sudah tercatat datang")
+            self._patients[key] = [unit, WAITING, ts, None, severity]
+            estimator.waiting += 1
+            if severity is not None:
+                estimator.severity[severity] += 1
+            if unit is ER_UNIT:
+                arrivals = self._arrivals.get(hospital_id)
+                if arrivals is None:
+                    arrivals = self._arrivals[hospital_id] = HourlyArrivals()
+                arrivals.add(ts)
+            while len(self._patients) > self.max_patients:
+                (old_hospital, _), old = self._patients.popitem(last=False)
+                self._leave(self._units[(old_hospital, old[0])], old)
+                self.evicted += 1
+            return
+        if patient is None or patient[0] != unit:
+            raise IngestError(f"Pasien {key[1]} belum tercatat datang di unit ini")
+
+        if kind == "triage":
+            if patient[4] is not None:
+                estimator.severity[patient[4]] -= 1
+            patient[4] = severity
+            estimator.severity[severity] += 1
+        elif kind == "service_start":
+            if patient[1] != WAITING:
+                raise IngestError(f"Pasien {key[1]} sudah dilayani")
+            patient[1], patient[3] = IN_SERVICE, ts
+            estimator.waiting -= 1
+            estimator.in_service += 1
+            estimator.wait_minutes = ewma(estimator.wait_minutes, max(ts - patient[2], 0) / 60)
+        else:
+            self._leave(estimator, patient)
+            del self._patients[key]
+            if patient[3] is not None:
+                estimator.service_minutes = ewma(estimator.service_minutes, max(ts - patient[3], 0) / 60)
+                estimator.discharge(ts)
+
+    def _updates(self, touched, hospitals, now):
+        updates = []
+        for hospital_id, unit in touched:
+            estimator = self._units[(hospital_id, unit)]
+            if unit is ER_UNIT:
+                values = {
+                    "waiting_patients": estimator.waiting,
+                    "in_treatment": estimator.in_service,
+                    "severity_distribution": dict(estimator.severity)
+                }
+                if estimator.wait_minutes is not None:
+                    values["avg_waiting_time"] = round(estimator.wait_minutes)
+                updates.append({"hospital_id": hospital_id, "section": "emergency", "values": values})
+            else:
+                values = {"current_queue": estimator.waiting, "served_today": estimator.served_today(now)}
+                # Tanpa sampel layanan, estimasi lama (sumber lain) dibiarkan
+                if estimator.service_minutes is not None:
+                    values["avg_service_time"] = round(estimator.service_minutes)
+                    values["estimated_wait"] = round(estimator.waiting * estimator.service_minutes)
+                updates.append({"hospital_id": hospital_id, "section": "queues", "polyclinic": unit, "values": values})
+        for hospital_id in hospitals:
+            updates.append({"hospital_id": hospital_id, "section": "heatmap",
+                            "values": {"hourly_data": self._arrivals[hospital_id].values(now)}})
+        return updates
+
+    def process(self, lines):
+        """Terapkan satu micro-batch ``[(nomor_baris, event)]`` sebagai satu versi snapshot"""
+        result = {"accepted": 0, "duplicates": 0, "stale": 0, "errors": []}
+        with self._lock:
+            touched, hospitals, journal = set(), set(), []
+            for line, event in lines:
+                try:
+                    parsed = self._parse(event)
+                    self._apply(*parsed)
+                except IngestError as e:
+                    if len(result["errors"]) < INGEST_MAX_ERRORS:
+                        result["errors"].append({"line": line, "error": str(e)})
+                    continue
+                if self._journal is not None:
+                    hospital_id, unit, (_, patient_id), kind, ts, severity = parsed
+                    journal.append(json.dumps([hospital_id, unit, patient_id, kind, ts, severity]))
+                hospital_id, unit, _, kind = parsed[:4]
+                touched.add((hospital_id, unit))
+                if kind == "arrival" and unit is ER_UNIT:
+                    hospitals.add(hospital_id)
+                result["accepted"] += 1
+
+            now = time.time()
+            # Jam berganti: bucket berumur > 24 jam di semua heatmap berbasis event ikut kedaluwarsa
+            hour = int(now // HOUR_SECONDS)
+            if hour != self._hour:
+                self._hour = hour
+                hospitals.update(self._arrivals)
+            updates = self._updates(touched, hospitals, now)
+            if updates:
+                self.store.apply(updates)
+            self.events += result["accepted"]
+            if journal:
+                self._journal.write("\n".join(journal) + "\n")
+                self._journal.flush()
+                if self._journal.tell() >= QUEUE_JOURNAL_BYTES:
+                    self._compact()
+        result["applied"] = len(updates)
+        return result
+
+    # --------------------------- persistensi ---------------------------
+
+    def _path(self, kind, generation):
+        suffix = "json" if kind == "state" else "log"
+        return os.path.join(self.directory, f"queue-{kind}-{generation:012d}.{suffix}")
+
+    def _load(self):
+        """State generasi terbaru + putar ulang journal-nya (tanpa menulis ke store).
+
+        Unit yang tidak ada lagi di registry dilewati, jadi perubahan
+        registry tidak membuat batch berikutnya gagal.
+        """
+        generations = sorted(int(name[12:-5]) for name in os.listdir(self.directory)
+                             if name.startswith("queue-state-") and name.endswith(".json"))
+        if not generations:
+            return
+        self._generation = generations[-1]
+        with open(self._path("state", self._generation)) as f:
+            state = json.load(f)
+        self.events, self.evicted = state["events"], state["evicted"]
+        for hospital_id, unit, values in state["units"]:
+            if not self._known(hospital_id, unit):
+                continue
+            estimator = self._unit(hospital_id, unit)
+            (estimator.waiting, estimator.in_service, estimator.served, served_day,
+             estimator.wait_minutes, estimator.service_minutes, estimator.severity) = values
+            estimator.served_day = date.fromisoformat(served_day) if served_day else None
+        for hospital_id, (counts, stamps) in state["arrivals"].items():
+            if self._known(hospital_id, ER_UNIT):
+                arrivals = self._arrivals[hospital_id] = HourlyArrivals()
+                arrivals.counts, arrivals.stamps = counts, stamps
+        for hospital_id, patient_id, patient in state["patients"]:
+            if (hospital_id, patient[0]) in self._units:
+                self._patients[(hospital_id, patient_id)] = patient
+
+        try:
+            with open(self._path("events", self._generation)) as f:
+                for raw in f:
+                    try:
+                        hospital_id, unit, patient_id, kind, ts, severity = json.loads(raw)
+                    except ValueError:
+                        break  # baris terakhir terpotong saat proses mati
+                    if not self._known(hospital_id, unit):
+                        continue
+                    try:
+                        self._apply(hospital_id, unit, (hospital_id, patient_id), kind, ts, severity)
+                    except IngestError:
+                        continue
+                    self.events += 1
+        except FileNotFoundError:
+            pass
+
+    def _compact(self):
+        """Tulis state lengkap sebagai generasi baru (atomik), lalu hapus generasi lama"""
+        state = {
+            "events": self.events,
+            "evicted": self.evicted,
+            "units": [
+                [hospital_id, unit, [e.waiting, e.in_service, e.served,
+                                     e.served_day.isoformat() if e.served_day else None,
+                                     e.wait_minutes, e.service_minutes, e.severity]]
+                for (hospital_id, unit), e in self._units.items()
+            ],
+            "arrivals": {hospital_id: [a.counts, a.stamps] for hospital_id, a in self._arrivals.items()},
+            "patients": [[hospital_id, patient_id, patient]
+                         for (hospital_id, patient_id), patient in self._patients.items()]
+        }
+        generation = self._generation + 1
+        path = self._path("state", generation)
+        with open(path + ".tmp", "w") as f:
+            json.dump(state, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        # State baru sudah lengkap; journal generasi ini dimulai kosong
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = open(self._path("events", generation), "a")
+        self._generation = generation
+        keep = {os.path.basename(self._path(kind, generation)) for kind in ("state", "events")}
+        for name in os.listdir(self.directory):
+            if name.startswith("queue-") and name not in keep:
+                os.remove(os.path.join(self.directory, name))
+
+    def stats(self):
+        return {
+            "events": self.events,
+            "active_patients": len(self._patients),
+            "units": len(self._units),
+            "evicted": self.evicted
+        }
@@ -0,0 +1,217 @@
+"""Indeks ranking rujukan per (jenis tempat tidur, spesialisasi) yang diperbarui inkremental"""
+import numpy as np
+
+# Poin per tier (indeks tier 0 = kondisi terbaik)
+BED_POINTS = np.array([30, 20, 10])
+ER_POINTS = np.array([25, 10])
+DOCTOR_POINTS = np.array([25, 15, 5])
+TRAFFIC_POINTS = np.array([20, 10, 0])
+HIGH_OCCUPANCY_PENALTY = 10
+# RS tanpa layanan spesialisasi yang dibutuhkan / tanpa sisa tempat tidur jenis yang dibutuhkan
+SPECIALTY_MISSING_PENALTY = 30
+BED_FULL_PENALTY = 20
+
+SPECIALTIES = ("Umum", "Jantung", "Paru", "Anak", "Bedah", "Saraf", "Orthopedi")
+# Layanan spesialis default per kelas RS bila registry tidak mencantumkan ``specialties``
+TYPE_SPECIALTIES = {
+    "Tipe A": SPECIALTIES,
+    "Tipe B": ("Umum", "Jantung", "Paru", "Anak", "Bedah", "Orthopedi"),
+    "Tipe C": ("Umum", "Anak", "Bedah"),
+    "Tipe D": ("Umum",)
+}
+# Kata pada nama RS khusus -> spesialisasi yang pasti dilayani
+SPECIALTY_NAME_HINTS = (("Paru", "Paru"), ("Jantung", "Jantung"), ("RSIA", "Anak"), ("Anak", "Anak"))
+
+# Kolom HospitalColumns yang memengaruhi skor sisi RS
+REFERRAL_COLUMNS = (
+    "regular_total", "regular_occupied", "icu_total", "icu_occupied",
+    "isolation_total", "isolation_occupied", "er_waiting", "doctors_on_duty", "doctors_total"
+)
+# Bila lebih dari porsi ini RS berubah, sort ulang penuh lebih murah daripada sisip per RS
+INDEX_REBUILD_FRACTION = 0.125
+
+def hospital_specialties(hospital):
+    """Spesialisasi yang dilayani RS: ``specialties`` di registry, atau turunan kelas + nama"""
+    if hospital.get("specialties") is not None:
+        return frozenset(hospital["specialties"])
+    specialties = set(TYPE_SPECIALTIES.get(hospital.get("type"), ("Umum",)))
+    name = hospital.get("name", "")
+    specialties.update(specialty for hint, specialty in SPECIALTY_NAME_HINTS if hint in name)
+    return frozenset(specialties)
+
+class CapabilityIndex:
+    """Spesialisasi -> mask boolean RS yang melayaninya (slot registry)"""
+
+    def __init__(self, hospitals, specialties=()):
+        offered = [hospital_specialties(hospital) for hospital in hospitals]
+        # ``specialties`` tambahan: kosakata registry penuh saat hanya sebagian RS diindeks (shard)
+        names = sorted(set(SPECIALTIES).union(specialties, *offered))
+        self.masks = {name: np.array([name in s for s in offered], dtype=bool) for name in names}
+
+    def key(self, specialty):
+        """Spesialisasi tak dikenal -> None, agar jumlah ranking yang dipelihara tetap terbatas"""
+        return specialty if specialty in self.masks else None
+
+    def supports(self, specialty):
+        """Mask RS yang melayani ``specialty``; None = spesialisasi tidak dikenal (tanpa syarat)"""
+        return self.masks.get(specialty)
+
+def hospital_features(columns, hour, slots=slice(None)):
+    """Fitur sisi RS untuk ``slots`` (default semua) dari kolom snapshot"""
+    def column(name):
+        return columns[name][slots]
+
+    available = {
+        bed_type: column(f"{bed_type}_total") - column(f"{bed_type}_occupied")
+        for bed_type in ("icu", "regular", "isolation")
+    }
+    total_beds = column("regular_total") + column("icu_total")
+    total_occupied = column("regular_occupied") + column("icu_occupied")
+    doctors_on_duty = column("doctors_on_duty")
+    doctors_total = column("doctors_total")
+    # Total 0 (mis. hasil ingest) tidak boleh menghasilkan NaN/inf di fitur maupun respons JSON
+    with np.errstate(invalid="ignore", divide="ignore"):
+        doctor_ratio = np.where(doctors_total > 0, doctors_on_duty / doctors_total, 0.0)
+        occupancy_rate = np.where(total_beds > 0, total_occupied / total_beds * 100, 0.0)
+    return {
+        "beds_available": available["regular"] + available["icu"],
+        "icu_available": available["icu"],
+        "regular_available": available["regular"],
+        "isolation_available": available["isolation"],
+        "er_normal": column("er_waiting") < 20,
+        "doctors_on_duty": doctors_on_duty,
+        "doctor_ratio": doctor_ratio,
+        "traffic": columns["traffic"][slots, hour],
+        "occupancy_rate": occupancy_rate
+    }
+
+def hospital_points(features):
+    """Tier tiap komponen dan total poin sisi RS (tanpa komponen pasien)"""
+    tiers = {
+        "beds": np.select([features["beds_available"] > 50, features["beds_available"] > 20], [0, 1], 2),
+        "er": np.where(features["er_normal"], 0, 1),
+        "doctors": np.select([features["doctor_ratio"] > 0.5, features["doctor_ratio"] > 0.3], [0, 1], 2),
+        "traffic": np.select([features["traffic"] < 15, features["traffic"] < 25], [0, 1], 2),
+        "high_occupancy": features["occupancy_rate"] > 85
+    }
+    points = (
+        BED_POINTS[tiers["beds"]]
+        + ER_POINTS[tiers["er"]]
+        + DOCTOR_POINTS[tiers["doctors"]]
+        + TRAFFIC_POINTS[tiers["traffic"]]
+        - HIGH_OCCUPANCY_PENALTY * tiers["high_occupancy"]
+    )
+    return tiers, points
+
+class ReferralIndex:
+    """Skor sisi RS dan urutan ranking per ``(jenis tempat tidur, spesialisasi)``.
+
+    Immutable seperti snapshot: ``updated()`` mengembalikan indeks baru
+    yang hanya menghitung ulang fitur RS yang berubah lalu memindahkan
+    posisinya di setiap ranking (hapus + sisip lewat ``searchsorted``),
+    tanpa sort ulang seluruh RS. Ranking dibuat saat kunci pertama kali
+    diminta dan sejak itu ikut dipelihara.
+    """
+
+    def __init__(self, columns, hour, capability, features, tiers, points, rankings):
+        self.columns = columns
+        self.hour = hour
+        self.capability = capability
+        self.features = features
+        self.tiers = tiers
+        self.points = points
+        self.size = len(points)
+        # kunci -> (skor per slot, slot urut skor menurun lalu slot menaik, -skor terurut menaik)
+        self._rankings = rankings
+
+    @classmethod
+    def build(cls, columns, hour, capability, keys=()):
+        features = hospital_features(columns, hour)
+        tiers, points = hospital_points(features)
+        index = cls(columns, hour, capability, features, tiers, points, {})
+        for key in keys:
+            index.ranking(key)
+        return index
+
+    def key_scores(self, key, slots=slice(None)):
+        """Skor sisi RS untuk kunci ``(bed_type, specialty)``"""
+        bed_type, specialty = key
+        scores = self.points[slots] - BED_FULL_PENALTY * (self.features[f"{bed_type}_available"][slots] <= 0)
+        supported = self.capability.supports(specialty)
+        if supported is not None:
+            scores = scores - SPECIALTY_MISSING_PENALTY * ~supported[slots]
+        return scores
+
+    def _sort_keys(self, scores, slots):
+        # Satu kunci int64 menaik = skor menurun, seri dipecah slot menaik
+        return -scores.astype(np.int64) * (self.size + 1) + slots
+
+    def ranking(self, key):
+        ranking = self._rankings.get(key)
+        if ranking is None:
+            scores = self.key_scores(key)
+            order = np.argsort(self._sort_keys(scores, np.arange(self.size)), kind="stable")
+            ranking = self._rankings[key] = (scores, order, -scores[order])
+        return ranking
+
+    def changed_slots(self, columns, hour):
+        """Slot RS yang nilai kolom referralnya berbeda dari indeks ini; None = semua"""
+        if hour != self.hour or columns.size != self.size:
+            return None
+        changed = np.zeros(self.size, dtype=bool)
+        for name in REFERRAL_COLUMNS:
+            if columns[name] is not self.columns[name]:
+                changed |= columns[name] != self.columns[name]
+        if columns["traffic"] is not self.columns["traffic"]:
+            changed |= columns["traffic"][:, hour] != self.columns["traffic"][:, hour]
+        return np.flatnonzero(changed)
+
+    def updated(self, columns, hour):
+        """Indeks untuk kolom/jam baru, dihitung inkremental bila memungkinkan"""
+        slots = self.changed_slots(columns, hour)
+        if slots is None or len(slots) > self.size * INDEX_REBUILD_FRACTION:
+            return ReferralIndex.build(columns, hour, self.capability, list(self._rankings))
+        if len(slots) == 0:
+            return ReferralIndex(columns, hour, self.capability, self.features, self.tiers, self.points,
+                                 self._rankings)
+
+        changed = hospital_features(columns, hour, slots)
+        features = {}
+        for name, values in self.features.items():
+            values = values.copy()
+            values[slots] = changed[name]
+            features[name] = values
+        changed_tiers, changed_points = hospital_points(changed)
+        tiers = {}
+        for name, values in self.tiers.items():
+            values = values.copy()
+            values[slots] = changed_tiers[name]
+            tiers[name] = values
+        points = self.points.copy()
+        points[slots] = changed_points
+        index = ReferralIndex(columns, hour, self.capability, features, tiers, points, {})
+
+        moved = np.zeros(self.size, dtype=bool)
+        moved[slots] = True
+        for key, (old_scores, old_order, _) in self._rankings.items():
+            scores = old_scores.copy()
+            scores[slots] = index.key_scores(key, slots)
+            kept = old_order[~moved[old_order]]
+            inserted = slots[np.argsort(index._sort_keys(scores[slots], slots), kind="stable")]
+            positions = np.searchsorted(index._sort_keys(scores[kept], kept), index._sort_keys(scores[inserted], inserted))
+            order = np.insert(kept, positions, inserted)
+            index._rankings[key] = (scores, order, -scores[order])
+        return index
+
+    def top_slots(self, key, limit, slack=0):
+        """Slot yang mungkin masuk top-``limit`` bila skor pasien turun paling banyak ``slack``.
+
+        Skor akhir = skor RS + penyesuaian pasien dalam ``[-slack, 0]``, jadi
+        RS dengan skor RS di bawah ``skor ke-limit - slack`` tidak mungkin
+        menyalip; cukup prefiks ranking yang dikembalikan.
+        """
+        _, order, negated = self.ranking(key)
+        if limit >= self.size:
+            return order
+        # negated[i] <= -(skor ke-limit - slack)  <=>  skor >= ambang
+        return order[:np.searchsorted(negated, negated[limit - 1] + slack, side="right")]
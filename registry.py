@@ -0,0 +1,184 @@
+"""Registry RS dari file data (JSON/CSV) dengan cache indeks biner dan pencarian token/prefix"""
+import bisect
+import csv
+import hashlib
+import io
+import json
+import math
+import os
+import pickle
+import re
+import unicodedata
+
+import numpy as np
+
+from listing import district_of
+
+# magic + sha1 isi file sumber, lalu pickle indeks (magic dinaikkan bila format/validasi berubah)
+REGISTRY_CACHE_MAGIC = b"RSX2"
+REGISTRY_CACHE_SUFFIX = ".idx"
+REGISTRY_REQUIRED = ("id", "name", "type", "address", "lat", "lon")
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+TOKEN_PATTERN = re.compile(r"[0-9a-z]+")
+# Lebih besar dari semua karakter token: batas atas rentang prefix di vocabulary
+PREFIX_END = "\x7f"
+
+class RegistryError(ValueError):
+    """File registry tidak valid"""
+
+def tokenize(text):
+    """Token huruf kecil tanpa diakritik (``"Kec. Coblong"`` -> ``["kec", "coblong"]``)"""
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return TOKEN_PATTERN.findall(text.lower())
+
+def parse_registry(data, path):
+    """Record RS dari isi file ``.json`` (list object) atau ``.csv`` (header = nama field)"""
+    if path.lower().endswith(".csv"):
+        records = []
+        for row in csv.DictReader(io.StringIO(data.decode("utf-8-sig"))):
+            record = {key: value.strip() for key, value in row.items() if key and value is not None}
+            try:
+                record["lat"], record["lon"] = float(record["lat"]), float(record["lon"])
+            except (KeyError, ValueError):
+                raise RegistryError(f"lat/lon tidak valid untuk RS {record.get('id')}")
+            # ``specialties`` dipisah titik koma; kosong = turunan dari kelas RS
+            if record.get("specialties"):
+                record["specialties"] = [s.strip() for s in record["specialties"].split(";") if s.strip()]
+            else:
+                record.pop("specialties", None)
+            records.append(record)
+    else:
+        try:
+            records = json.loads(data)
+        except ValueError as e:
+            raise RegistryError(f"JSON registry tidak valid: {e}")
+        if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+            raise RegistryError("Registry JSON harus berupa list object")
+
+    seen = set()
+    for record in records:
+        missing = [field for field in REGISTRY_REQUIRED if record.get(field) in (None, "")]
+        if missing:
+            raise RegistryError(f"Field wajib kosong untuk RS {record.get('id')}: {', '.join(missing)}")
+        if record["id"] in seen:
+            raise RegistryError(f"id RS duplikat: {record['id']}")
+        seen.add(record["id"])
+        if not _valid_location(record["lat"], record["lon"]):
+            raise RegistryError(f"lat/lon tidak valid untuk RS {record['id']}")
+    return records
+
+def _valid_location(lat, lon):
+    # JSON menerima NaN/Infinity dan string; grid spasial dan haversine butuh angka berhingga
+    for value in (lat, lon):
+        if not isinstance(value, (int, float)) or isinstance(value, bool) or not math.isfinite(value):
+            return False
+    return -90 <= lat <= 90 and -180 <= lon <= 180
+
+class TokenIndex:
+    """Inverted index token -> slot RS dalam bentuk CSR.
+
+    ``vocabulary`` terurut, jadi semua token dengan prefix yang sama
+    berdampingan dan posting-nya membentuk satu potongan kontigu
+    ``postings[offsets[lo]:offsets[hi]]``.
+    """
+
+    def __init__(self, vocabulary, offsets, postings):
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.postings = postings
+
+    @classmethod
+    def build(cls, texts):
+        slots_by_token = {}
+        for slot, text in enumerate(texts):
+            for token in set(tokenize(text)):
+                slots_by_token.setdefault(token, []).append(slot)
+        vocabulary = sorted(slots_by_token)
+        lengths = np.fromiter((len(slots_by_token[token]) for token in vocabulary), dtype=np.int64,
+                              count=len(vocabulary))
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        postings = np.fromiter((slot for token in vocabulary for slot in slots_by_token[token]),
+                               dtype=np.int32, count=int(offsets[-1]))
+        return cls(vocabulary, offsets, postings)
+
+    def prefix(self, prefix):
+        """Slot terurut yang punya token berawalan ``prefix``"""
+        lo = bisect.bisect_left(self.vocabulary, prefix)
+        hi = bisect.bisect_left(self.vocabulary, prefix + PREFIX_END, lo)
+        slots = self.postings[self.offsets[lo]:self.offsets[hi]]
+        return np.unique(slots) if hi - lo > 1 else slots
+
+    def match(self, tokens):
+        """Slot yang cocok dengan semua token query (masing-masing sebagai prefix)"""
+        matched = None
+        for token in tokens:
+            slots = self.prefix(token)
+            matched = slots if matched is None else np.intersect1d(matched, slots, assume_unique=True)
+            if not len(matched):
+                break
+        return matched
+
+class HospitalRegistry:
+    """Record RS + lookup id dan indeks pencarian nama/kecamatan/alamat"""
+
+    def __init__(self, records, search_index=None, name_index=None):
+        self.records = records
+        self.by_id = {record["id"]: record for record in records}
+        if search_index is None:
+            search_index = TokenIndex.build(
+                f"{record['name']} {district_of(record) or ''} {record['address']}" for record in records)
+            name_index = TokenIndex.build(record["name"] for record in records)
+        self.search_index = search_index
+        self.name_index = name_index
+
+    def __len__(self):
+        return len(self.records)
+
+    def get(self, hospital_id):
+        return self.by_id.get(hospital_id)
+
+    def search(self, query, limit=SEARCH_DEFAULT_LIMIT):
+        """``(total, record teratas)``; RS yang namanya memuat semua token didahulukan"""
+        tokens = tokenize(query)
+        if not tokens:
+            return 0, []
+        matched = self.search_index.match(tokens)
+        if not len(matched):
+            return 0, []
+        in_name = np.isin(matched, self.name_index.match(tokens), assume_unique=True)
+        ranked = np.concatenate([matched[in_name], matched[~in_name]])[:limit]
+        return len(matched), [self.records[slot] for slot in ranked.tolist()]
+
+def _cache_path(path, cache_dir):
+    if cache_dir is None:
+        return path + REGISTRY_CACHE_SUFFIX
+    return os.path.join(cache_dir, os.path.basename(path) + REGISTRY_CACHE_SUFFIX)
+
+def load_registry(path, cache_dir=None):
+    """Muat registry dari ``path``; indeks biner dipakai ulang selama isi file tidak berubah"""
+    with open(path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha1(data).digest()
+    header = REGISTRY_CACHE_MAGIC + digest
+    cache_path = _cache_path(path, cache_dir)
+    try:
+        with open(cache_path, "rb") as f:
+            if f.read(len(header)) == header:
+                records, search_index, name_index = pickle.load(f)
+                return HospitalRegistry(records, search_index, name_index)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        pass
+
+    registry = HospitalRegistry(parse_registry(data, path))
+    try:
+        with open(cache_path + ".tmp", "wb") as f:
+            f.write(header)
+            pickle.dump((registry.records, registry.search_index, registry.name_index), f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(cache_path + ".tmp", cache_path)
+    except OSError:
+        # Direktori data hanya-baca: registry tetap dipakai, indeks dibangun ulang tiap start
+        pass
+    return registry
@@ -0,0 +1,129 @@
+"""Cache body respons (JSON ter-encode dan varian terkompresi) per versi data"""
+from collections import OrderedDict
+import gzip
+import threading
+
+try:
+    import brotli
+except ImportError:  # brotli opsional; tanpa paket ini hanya gzip yang ditawarkan
+    brotli = None
+
+RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# Body kecil tidak sebanding dengan biaya kompresi dan header tambahan
+RESPONSE_COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+def compress(body, encoding):
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    raise ValueError(f"Encoding tidak didukung: {encoding}")
+
+class _Flight:
+    """Build yang sedang berjalan; miss lain untuk kunci yang sama menunggu di sini"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+class ResponseCache:
+    """LRU berbatas ukuran (byte) berisi body siap kirim.
+
+    Kunci biasanya memuat versi snapshot, jadi entri tidak pernah basi:
+    versi baru menghasilkan kunci baru dan entri lama tergeser LRU.
+    Miss bersamaan untuk kunci yang sama hanya memicu satu build
+    (single-flight); sisanya menunggu hasil build tersebut.
+    """
+
+    def __init__(self, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get(self, key, build):
+        """Body untuk ``key``; ``build()`` -> bytes dipanggil sekali saat miss"""
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return body
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            body = build()
+        except Exception as e:
+            flight.error = e
+            raise
+        else:
+            flight.value = body
+            self._store(key, body)
+            return body
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def _store(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            self._entries[key] = body
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def encoded(self, key, build, encoding="identity"):
+        """Body dalam ``encoding``; varian terkompresi dibangun dari body identity"""
+        if encoding != "identity":
+            with self._lock:
+                body = self._entries.get((key, encoding))
+                if body is not None:
+                    self._entries.move_to_end((key, encoding))
+                    self.hits += 1
+                    return body, encoding
+        body = self.get((key, "identity"), build)
+        if encoding == "identity" or len(body) < RESPONSE_COMPRESS_MIN_BYTES:
+            return body, "identity"
+        return self.get((key, encoding), lambda: compress(body, encoding)), encoding
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "encodings": list(ENCODINGS)
+            }
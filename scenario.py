@@ -0,0 +1,66 @@
+"""Generator registry RS sintetis (deterministik per seed) untuk uji skala"""
+import random
+
+SCENARIO_SEED = 42
+
+# (kota, lat, lon, bobot) - sebaran RS mengikuti kepadatan kota besar
+SCENARIO_CITIES = [
+    ("Jakarta", -6.2088, 106.8456, 18),
+    ("Surabaya", -7.2575, 112.7521, 9),
+    ("Bandung", -6.9175, 107.6191, 8),
+    ("Medan", 3.5952, 98.6722, 7),
+    ("Semarang", -6.9667, 110.4167, 5),
+    ("Makassar", -5.1477, 119.4327, 5),
+    ("Palembang", -2.9761, 104.7754, 4),
+    ("Tangerang", -6.1783, 106.6319, 4),
+    ("Depok", -6.4025, 106.7942, 3),
+    ("Bekasi", -6.2383, 106.9756, 4),
+    ("Yogyakarta", -7.7956, 110.3695, 4),
+    ("Malang", -7.9666, 112.6326, 3),
+    ("Denpasar", -8.6705, 115.2126, 3),
+    ("Balikpapan", -1.2379, 116.8529, 2),
+    ("Pekanbaru", 0.5071, 101.4478, 3),
+    ("Padang", -0.9471, 100.4172, 2),
+    ("Manado", 1.4748, 124.8421, 2),
+    ("Pontianak", -0.0263, 109.3425, 2),
+    ("Banjarmasin", -3.3194, 114.5908, 2),
+    ("Jayapura", -2.5337, 140.7181, 1),
+]
+
+# Proporsi kelas RS (kelas C/D paling banyak)
+SCENARIO_TYPES = [("Tipe A", 3), ("Tipe B", 17), ("Tipe C", 50), ("Tipe D", 30)]
+
+SCENARIO_PREFIXES = ["RSUD", "RS", "RS Islam", "RSIA", "RS Bhayangkara", "RS Mitra", "RS Siloam", "RS Hermina"]
+
+SCENARIO_STREETS = ["Jl. Merdeka", "Jl. Sudirman", "Jl. Diponegoro", "Jl. Gatot Subroto",
+                    "Jl. Ahmad Yani", "Jl. Pahlawan", "Jl. Veteran", "Jl. Imam Bonjol"]
+
+# Simpangan (derajat) lokasi RS dari pusat kota
+SCENARIO_CITY_SPREAD = 0.08
+SCENARIO_DISTRICTS_PER_CITY = 20
+
+def generate_hospitals(n, seed=SCENARIO_SEED):
+    """Registry ``n`` RS dengan bentuk record yang sama seperti ``HOSPITALS``"""
+    rng = random.Random(seed)
+    cities = [city for city, *_ in SCENARIO_CITIES]
+    city_weights = [weight for *_, weight in SCENARIO_CITIES]
+    centers = {city: (lat, lon) for city, lat, lon, _ in SCENARIO_CITIES}
+    types = [name for name, _ in SCENARIO_TYPES]
+    type_weights = [weight for _, weight in SCENARIO_TYPES]
+    width = max(3, len(str(n)))
+
+    hospitals = []
+    for i in range(1, n + 1):
+        city = rng.choices(cities, city_weights)[0]
+        lat, lon = centers[city]
+        district = rng.randint(1, SCENARIO_DISTRICTS_PER_CITY)
+        hospitals.append({
+            "id": f"RS{i:0{width}d}",
+            "name": f"{rng.choice(SCENARIO_PREFIXES)} {city} {i}",
+            "type": rng.choices(types, type_weights)[0],
+            "address": f"{rng.choice(SCENARIO_STREETS)} No.{rng.randint(1, 300)}, "
+                       f"Kec. {city} {district}, Kota {city}",
+            "lat": round(rng.gauss(lat, SCENARIO_CITY_SPREAD), 4),
+            "lon": round(rng.gauss(lon, SCENARIO_CITY_SPREAD), 4)
+        })
+    return hospitals
@@ -0,0 +1,84 @@
+"""Mode produksi multi-proses: satu proses penulis + N worker WSGI.
+
+    python serve.py --workers 4 --port 5000
+
+Proses induk memegang satu-satunya ``HospitalStateStore`` (tick simulasi,
+ingest, hold, riwayat) dan mempublikasikan snapshot ke shared memory.
+Worker di-fork sebelum thread apa pun dimulai, berbagi satu socket listen,
+melayani semua GET dari snapshot bersama, dan meneruskan operasi tulis ke
+induk lewat RPC.
+"""
+import argparse
+import os
+import pickle
+import signal
+import socket
+
+from werkzeug.serving import make_server
+
+from shared_state import SharedStateBuffer, SharedStatePublisher, SharedStateReader, WriterServer
+
+SERVE_BACKLOG = 1024
+
+def run_worker(app_module, sock, buffer, address, authkey):
+    reader = SharedStateReader(buffer, epoch=app_module.state_store.epoch)
+    app_module.use_shared_state(reader, app_module.RemoteStateWriter(address, authkey))
+    reader.start()
+    host, port = sock.getsockname()[:2]
+    server = make_server(host, port, app_module.app, threaded=True, fd=sock.fileno())
+    signal.signal(signal.SIGTERM, lambda *_: os._exit(0))
+    server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+
+    import main as app_module
+
+    # Slot disesuaikan ukuran snapshot (registry besar bisa melebihi SHARED_SLOT_MIN_BYTES)
+    initial = pickle.dumps(app_module.state_store.snapshot(), protocol=pickle.HIGHEST_PROTOCOL)
+    buffer = SharedStateBuffer.create(SharedStateBuffer.slot_bytes_for(len(initial)))
+    publisher = SharedStatePublisher(buffer, app_module.state_store)
+    publisher.flush()
+    authkey = os.urandom(32)
+    rpc = WriterServer(app_module.writer, publisher, authkey)
+
+    sock = socket.create_server((args.host, args.port), backlog=SERVE_BACKLOG)
+    sock.set_inheritable(True)
+
+    # Fork dulu, baru mulai thread: anak hasil fork hanya mewarisi thread pemanggil
+    workers = []
+    for _ in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(app_module, sock, buffer, rpc.address, authkey)
+            finally:
+                os._exit(1)
+        workers.append(pid)
+    sock.close()
+
+    def shutdown(*_):
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in workers:
+            os.waitpid(pid, 0)
+        buffer.close(unlink=True)
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    publisher.start()
+    app_module.start_background()
+    print(f"Penulis pid {os.getpid()}, {len(workers)} worker di http://{args.host}:{args.port}")
+    rpc.serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+"""Proses shard wilayah: state RS satu kota/kabupaten di proses sendiri.
+
+    SHARD_REGION="Kota Bandung" python shard_worker.py <alamat socket>
+
+Dijalankan oleh ``main`` saat ``STATE_SHARDS=subprocess``. Modul ``main``
+di-import dengan registry yang dibatasi ke ``SHARD_REGION`` sehingga shard
+memakai store, tick simulasi dan indeks rujukan yang sama seperti mode satu
+store. authkey RPC dibaca dari stdin; ``ready`` ditulis ke stdout setelah
+socket siap. Proses berhenti saat stdin ditutup (proses induk mati).
+"""
+import os
+import sys
+import threading
+
+from shared_state import WriterServer
+
+def main():
+    address = sys.argv[1]
+    authkey = bytes.fromhex(sys.stdin.readline().strip())
+    threading.Thread(target=lambda: (sys.stdin.read(), os._exit(0)), name="shard-parent", daemon=True).start()
+
+    import main as app_module
+
+    shard = app_module.RegionShard(app_module.SHARD_REGION, app_module.state_store, app_module.referral_context)
+    rpc = WriterServer(shard, None, authkey, address=address)
+    app_module.start_background()
+
+    print("ready", flush=True)
+    # stdout tidak dibaca lagi oleh induk: output berikutnya ke stderr agar pipe tidak penuh
+    os.dup2(2, 1)
+    rpc.serve_forever()
+
+if __name__ == '__main__':
+    main()
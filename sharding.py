@@ -0,0 +1,140 @@
+"""Partisi RS per wilayah (kota/kabupaten), proxy shard subprocess, dan penggabungan top-k"""
+import heapq
+from itertools import islice
+from multiprocessing.connection import arbitrary_address
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+from shared_state import RemoteWriter
+
+# inprocess: satu store per wilayah di proses ini; subprocess: satu proses per wilayah
+SHARD_MODES = ("inprocess", "subprocess")
+# Umur maksimum state shard subprocess yang di-cache sebelum ditanya ulang
+SHARD_POLL_SECONDS = 0.05
+REGION_PATTERN = re.compile(r"((?:Kota|Kab\.|Kabupaten)\s+[^,]+?)\s*$")
+REGION_UNKNOWN = "Lainnya"
+
+def region_of(hospital):
+    """Wilayah RS: field ``region`` di registry, atau ``Kota X``/``Kab. X`` di akhir alamat"""
+    if hospital.get("region"):
+        return hospital["region"]
+    match = REGION_PATTERN.search(hospital.get("address", ""))
+    return match.group(1) if match else REGION_UNKNOWN
+
+def group_by_region(hospitals):
+    """RS diurutkan per wilayah (urutan kemunculan wilayah, urutan registry di dalamnya).
+
+    Mengembalikan ``(hospitals, [(wilayah, slot_awal, slot_akhir)])``;
+    setiap wilayah menempati rentang slot yang kontigu.
+    """
+    groups = {}
+    for hospital in hospitals:
+        groups.setdefault(region_of(hospital), []).append(hospital)
+    ordered, ranges = [], []
+    for region, members in groups.items():
+        ranges.append((region, len(ordered), len(ordered) + len(members)))
+        ordered.extend(members)
+    return ordered, ranges
+
+def merge_ranked(ranked, limit=None):
+    """Gabungkan list ``(slot global, rekomendasi)`` per shard.
+
+    Setiap list sudah urut skor menurun lalu slot menaik, jadi hasilnya
+    sama dengan ranking satu store atas semua RS.
+    """
+    merged = heapq.merge(*ranked, key=lambda item: (-item[1]["score"], item[0]))
+    return [recommendation for _, recommendation in islice(merged, limit)]
+
+class RemoteShard(RemoteWriter):
+    """Shard wilayah di proses lain (``shard_worker.py``) dengan antarmuka yang sama seperti shard lokal.
+
+    ``state()`` di-cache paling lama ``SHARD_POLL_SECONDS`` (langsung
+    diperbarui setelah tulis dari proses ini); ``record()`` dibaca dari
+    state cache tersebut agar validasi ingest tidak butuh RPC per baris.
+    """
+
+    def __init__(self, region, process, address, authkey, record_key):
+        super().__init__(address, authkey)
+        self.region = region
+        self.process = process
+        self.record_key = record_key
+        self._state = None
+        self._positions = None
+        self._fetched = 0.0
+        self._dirty = True
+        # state() dipanggil paralel (scatter, validasi ingest); satu refresh sekaligus agar
+        # state tidak mundur ke hasil RPC yang lebih lama dan tanda dirty tidak hilang
+        self._lock = threading.Lock()
+
+    def state(self):
+        """``((epoch, versi), timestamp, sections, columns)`` terbaru shard"""
+        with self._lock:
+            now = time.monotonic()
+            if self._dirty or now - self._fetched >= SHARD_POLL_SECONDS:
+                self._dirty = False
+                fresh = self.call("state_since", self._state[0] if self._state else None)
+                if fresh is not None:
+                    self._state = fresh
+                self._fetched = now
+            return self._state
+
+    def record(self, section, key):
+        sections = self.state()[2]
+        with self._lock:
+            if self._positions is None:
+                # Posisi record tidak pernah berubah (urutan generator = urutan registry)
+                self._positions = {
+                    name: {self.record_key(name, record): i for i, record in enumerate(records)}
+                    for name, records in sections.items()
+                }
+            positions = self._positions
+        position = positions.get(section, {}).get(key)
+        return None if position is None else sections[section][position]
+
+    def _invalidate(self):
+        with self._lock:
+            self._dirty = True
+
+    def apply(self, updates):
+        version = self.call("apply", updates)
+        self._invalidate()
+        return version
+
+    def refresh(self):
+        version = self.call("refresh")
+        self._invalidate()
+        return version
+
+    def start(self):
+        """Tick shard sudah berjalan di prosesnya sendiri"""
+
+    def stop(self):
+        self.process.terminate()
+
+def spawn_shards(regions, script, record_key):
+    """Jalankan satu ``script`` per wilayah dan tunggu sampai semua siap menerima RPC"""
+    authkey = os.urandom(32)
+    env = {key: value for key, value in os.environ.items() if key not in ("STATE_SHARDS", "STATE_LOG_DIR")}
+    pending = []
+    for region in regions:
+        address = arbitrary_address("AF_UNIX")
+        process = subprocess.Popen([sys.executable, script, address], env={**env, "SHARD_REGION": region},
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        # authkey lewat stdin (tidak terlihat di argv/env); stdin tetap terbuka sebagai tanda induk hidup
+        process.stdin.write(authkey.hex().encode("ascii") + b"\n")
+        process.stdin.flush()
+        pending.append((region, process, address))
+
+    shards = []
+    for region, process, address in pending:
+        # Proses yang gagal saat import langsung menutup stdout (baris kosong)
+        if process.stdout.readline().strip() != b"ready":
+            for _, other, _ in pending:
+                other.kill()
+            raise RuntimeError(f"Shard {region} gagal dijalankan (exit {process.poll()})")
+        shards.append(RemoteShard(region, process, address, authkey, record_key))
+    return shards
@@ -0,0 +1,255 @@
+"""State RS bersama antar proses: shared memory (double buffer + seqlock) dan RPC penulis"""
+from multiprocessing import shared_memory
+from multiprocessing.connection import Client, Listener
+import logging
+import pickle
+import struct
+import threading
+import time
+
+# Header: seq, lalu (versi, slot aktif, panjang slot 0, panjang slot 1).
+# seq ditulis terpisah dari field lain agar urutan tulis/baca bisa dijaga,
+# dan selalu lewat view "Q" native (satu load/store 8 byte): struct.pack_into
+# mengosongkan field dulu sehingga pembaca bisa melihat seq = 0 di tengah tulis.
+SHARED_SEQ = struct.Struct("=Q")
+SHARED_FIELDS = struct.Struct("<QQQQ")
+SHARED_HEADER_BYTES = SHARED_SEQ.size + SHARED_FIELDS.size
+SHARED_SLOT_MIN_BYTES = 64 * 1024 * 1024
+# Slot = ukuran snapshot awal x faktor ini (ruang untuk record yang memanjang)
+SHARED_SLOT_HEADROOM = 2
+SHARED_PUBLISH_SECONDS = 0.1
+SHARED_POLL_SECONDS = 0.05
+
+logger = logging.getLogger(__name__)
+
+class SharedStateBuffer:
+    """Segmen shared memory berisi dua slot snapshot ter-pickle.
+
+    Penulis (satu proses) membuat ``seq`` ganjil, menulis ke slot yang
+    tidak aktif, memperbarui field header, lalu membuat ``seq`` genap lagi
+    (seqlock). Pembaca membaca field header dan memastikan ``seq`` tidak
+    berubah, lalu menyalin slot aktif dan mengulang bila selama itu ``seq``
+    sudah melewati ``seq + 2``: publish berikutnya (``seq + 3``, ganjil)
+    adalah yang pertama menulis ke slot yang sedang dibaca. Pembaca tidak
+    pernah mengambil lock.
+    """
+
+    def __init__(self, shm, slot_bytes):
+        self.shm = shm
+        self.slot_bytes = slot_bytes
+        self._seq = shm.buf[:SHARED_SEQ.size].cast("Q")
+        self._write_lock = threading.Lock()
+
+    @staticmethod
+    def slot_bytes_for(size):
+        """Ukuran slot untuk snapshot ter-pickle sebesar ``size`` byte"""
+        return max(SHARED_SLOT_MIN_BYTES, size * SHARED_SLOT_HEADROOM)
+
+    @classmethod
+    def create(cls, slot_bytes=SHARED_SLOT_MIN_BYTES):
+        shm = shared_memory.SharedMemory(create=True, size=SHARED_HEADER_BYTES + 2 * slot_bytes)
+        SHARED_SEQ.pack_into(shm.buf, 0, 0)
+        SHARED_FIELDS.pack_into(shm.buf, SHARED_SEQ.size, 0, 0, 0, 0)
+        return cls(shm, slot_bytes)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def _slot_offset(self, slot):
+        return SHARED_HEADER_BYTES + slot * self.slot_bytes
+
+    def version(self):
+        """Versi snapshot terakhir yang dipublikasikan (tanpa menyalin data; hanya petunjuk)"""
+        return SHARED_FIELDS.unpack_from(self.shm.buf, SHARED_SEQ.size)[0]
+
+    def write(self, version, payload):
+        size = len(payload)
+        if size > self.slot_bytes:
+            raise ValueError(f"Snapshot {size} byte melebihi slot shared memory {self.slot_bytes} byte")
+        with self._write_lock:
+            buf = self.shm.buf
+            seq = self._seq[0]
+            # seq ganjil sebelum payload/header ditulis: pembaca yang sedang menyalin akan mengulang
+            self._seq[0] = seq + 1
+            _, active, *lengths = SHARED_FIELDS.unpack_from(buf, SHARED_SEQ.size)
+            slot = 1 - active
+            offset = self._slot_offset(slot)
+            buf[offset:offset + size] = payload
+            lengths[slot] = size
+            SHARED_FIELDS.pack_into(buf, SHARED_SEQ.size, version, slot, *lengths)
+            self._seq[0] = seq + 2
+
+    def read(self):
+        """``(versi, payload)`` yang konsisten dari slot aktif"""
+        buf = self.shm.buf
+        while True:
+            seq = self._seq[0]
+            if seq % 2:
+                time.sleep(0)
+                continue
+            version, active, *lengths = SHARED_FIELDS.unpack_from(buf, SHARED_SEQ.size)
+            if self._seq[0] != seq:
+                # Header berubah saat dibaca
+                continue
+            offset = self._slot_offset(active)
+            payload = bytes(buf[offset:offset + lengths[active]])
+            if self._seq[0] <= seq + 2:
+                return version, payload
+
+    def close(self, unlink=False):
+        self._seq.release()
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+class SharedStatePublisher:
+    """Sisi penulis: salin snapshot terbaru store ke buffer bersama.
+
+    Publish digabung (paling sering sekali per ``interval``) agar ingest
+    dengan laju tinggi tidak mem-pickle setiap versi; ``flush()`` dipakai
+    setelah RPC tulis supaya worker pemanggil langsung melihat hasilnya.
+    """
+
+    def __init__(self, buffer, store, interval=SHARED_PUBLISH_SECONDS):
+        self.buffer = buffer
+        self.store = store
+        self.interval = interval
+        self._dirty = threading.Event()
+        self._lock = threading.Lock()
+        self._published = 0
+        self.errors = 0
+        store.add_listener(lambda previous, snapshot: self._dirty.set())
+
+    def flush(self):
+        with self._lock:
+            self._dirty.clear()
+            snapshot = self.store.snapshot()
+            if snapshot.version == self._published:
+                return
+            self.buffer.write(snapshot.version, pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL))
+            self._published = snapshot.version
+
+    def start(self):
+        threading.Thread(target=self._run, name="shared-publish", daemon=True).start()
+
+    def _run(self):
+        while True:
+            self._dirty.wait()
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                # Thread tetap hidup; publish berikutnya dicoba lagi pada versi baru
+                self.errors += 1
+                logger.exception("Gagal mempublikasikan snapshot ke shared memory")
+
+class SharedStateReader:
+    """Sisi worker: pengganti ``HospitalStateStore`` yang hanya-baca.
+
+    Snapshot di-unpickle sekali per versi per worker; setelah itu semua
+    request di worker ini membaca objek yang sama seperti mode satu proses.
+    """
+
+    def __init__(self, buffer, epoch, poll_seconds=SHARED_POLL_SECONDS):
+        self.buffer = buffer
+        self.epoch = epoch
+        self.poll_seconds = poll_seconds
+        self._snapshot = None
+        self._listeners = []
+        self._lock = threading.Lock()
+        self.poll()
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def poll(self):
+        """Muat versi baru bila ada, lalu panggil listener (mis. SSE)"""
+        current = self._snapshot
+        if current is not None and self.buffer.version() == current.version:
+            return current
+        with self._lock:
+            previous = self._snapshot
+            if previous is not None and self.buffer.version() == previous.version:
+                return previous
+            _, payload = self.buffer.read()
+            snapshot = pickle.loads(payload)
+            self._snapshot = snapshot
+            for listener in self._listeners:
+                listener(previous, snapshot)
+            return snapshot
+
+    def snapshot(self):
+        return self.poll()
+
+    @property
+    def version(self):
+        return self.snapshot().version
+
+    def start(self):
+        threading.Thread(target=self._run, name="shared-poll", daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.poll_seconds)
+            self.poll()
+
+class WriterServer:
+    """RPC penulis: worker memanggil method ``target`` lewat socket Unix.
+
+    ``publisher`` opsional (None untuk shard wilayah yang tidak berbagi
+    snapshot lewat shared memory).
+    """
+
+    def __init__(self, target, publisher, authkey, address=None):
+        self.target = target
+        self.publisher = publisher
+        self.listener = Listener(address, family="AF_UNIX", authkey=authkey)
+
+    @property
+    def address(self):
+        return self.listener.address
+
+    def serve_forever(self):
+        while True:
+            connection = self.listener.accept()
+            threading.Thread(target=self._handle, args=(connection,), daemon=True).start()
+
+    def _handle(self, connection):
+        with connection:
+            while True:
+                try:
+                    method, args, kwargs = connection.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    result = ("ok", getattr(self.target, method)(*args, **kwargs))
+                    # Read-your-writes: worker pemanggil melihat versi hasil tulisnya
+                    if self.publisher is not None:
+                        self.publisher.flush()
+                except Exception as e:
+                    result = ("error", e)
+                connection.send(result)
+
+class RemoteWriter:
+    """Sisi worker: meneruskan operasi tulis ke proses penulis"""
+
+    def __init__(self, address, authkey):
+        self.address = address
+        self.authkey = authkey
+        self._local = threading.local()
+
+    def call(self, method, *args, **kwargs):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = Client(self.address, family="AF_UNIX", authkey=self.authkey)
+        connection.send((method, args, kwargs))
+        status, result = connection.recv()
+        if status == "error":
+            raise result
+        return result
+
+    def __getattr__(self, method):
+        if method.startswith("_"):
+            raise AttributeError(method)
+        return lambda *args, **kwargs: self.call(method, *args, **kwargs)
@@ -0,0 +1,405 @@
+"""Log state append-only di disk: frame delta + checkpoint yang di-mmap saat restore"""
+from dataclasses import dataclass
+from datetime import datetime
+import bisect
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from columnar import COLUMN_FIELDS, HospitalColumns
+
+# magic, versi, timestamp (epoch), panjang payload, crc32 payload
+FRAME_HEADER = struct.Struct("<4sQdII")
+FRAME_MAGIC = b"RSL1"
+# magic, versi, timestamp, panjang metadata JSON
+CHECKPOINT_HEADER = struct.Struct("<4sQdI")
+CHECKPOINT_MAGIC = b"RSC1"
+CHECKPOINT_ALIGN = 64
+
+STATE_CHECKPOINT_SECONDS = 600
+STATE_CHECKPOINT_BYTES = 64 * 1024 * 1024
+STATE_LOG_COMPRESS_LEVEL = 1
+# Jeda sebelum thread log mencoba lagi setelah gagal tulis (disk penuh, EIO)
+STATE_LOG_RETRY_SECONDS = 5
+
+logger = logging.getLogger(__name__)
+
+class RegistryMismatch(LookupError):
+    """Checkpoint ditulis untuk registry rumah sakit yang berbeda"""
+
+def _dumps(value):
+    return zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"), STATE_LOG_COMPRESS_LEVEL)
+
+def _loads(payload):
+    return json.loads(zlib.decompress(payload))
+
+def _epoch(timestamp):
+    return datetime.fromisoformat(timestamp).timestamp()
+
+@dataclass
+class LoggedState:
+    """State hasil restore/replay: record per section + kolom, siap dipublikasikan"""
+    version: int
+    timestamp: float
+    sections: dict
+    columns: HospitalColumns
+    external: set
+
+def _key(value):
+    # Kunci queues (hospital_id, polyclinic) tersimpan sebagai list JSON
+    return tuple(value) if isinstance(value, list) else value
+
+class SnapshotLog:
+    """Log delta state + checkpoint periodik dalam satu direktori.
+
+    Setiap checkpoint ``checkpoint-<versi>.ckpt`` memulai segmen
+    ``wal-<versi>.log`` berisi frame delta setelahnya. Listener store hanya
+    menyimpan referensi snapshot terbaru; thread penulis menghitung delta
+    terhadap snapshot terakhir yang ditulis (versi yang terlewat digabung),
+    sehingga jalur ingest tidak pernah menunggu disk. Riwayat (bila
+    diberikan) ikut disalin ke disk pada setiap checkpoint.
+    """
+
+    def __init__(self, directory, sections, record_key, retention_days, history=None,
+                 checkpoint_seconds=STATE_CHECKPOINT_SECONDS, checkpoint_bytes=STATE_CHECKPOINT_BYTES):
+        self.directory = directory
+        # TimeSeriesStore opsional yang di-persist bersama setiap checkpoint
+        self.history = history
+        self.sections = tuple(sections)
+        self.record_key = record_key
+        self.retention_seconds = retention_days * 86400
+        self.checkpoint_seconds = checkpoint_seconds
+        self.checkpoint_bytes = checkpoint_bytes
+        os.makedirs(directory, exist_ok=True)
+        # Katalog checkpoint urut versi: [(versi, timestamp)]
+        self._checkpoints = []
+        for name in sorted(os.listdir(directory)):
+            if name.startswith("checkpoint-") and name.endswith(".ckpt"):
+                header = self._checkpoint_header(self._path("checkpoint", int(name[11:-5])))
+                if header is not None:
+                    self._checkpoints.append(header)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        # Lock terpisah dari _lock (dipegang saat tulis disk) agar publish tidak menunggu disk
+        self._pending_lock = threading.Lock()
+        self._pending = None
+        self._base = None
+        self._segment = None
+        self._segment_bytes = 0
+        self._checkpointed = 0.0
+        self._thread = None
+        self._store = None
+        # (versi checkpoint, offset akhir frame valid) dari restore terakhir
+        self._tail = None
+        # (versi checkpoint, offset frame berikutnya, state) dari state_at terakhir;
+        # replay ke waktu yang maju cukup membaca frame setelah offset
+        self._replayed = None
+        self._replay_lock = threading.Lock()
+        self.frames = 0
+        self.checkpoints = 0
+        self.coalesced = 0
+        self.errors = 0
+        # True sejak tulis gagal sampai checkpoint baru berhasil ditulis
+        self.failing = False
+
+    def _path(self, kind, version):
+        suffix = "ckpt" if kind == "checkpoint" else "log"
+        return os.path.join(self.directory, f"{kind}-{version:012d}.{suffix}")
+
+    # --------------------------- checkpoint ---------------------------
+
+    def _checkpoint_header(self, path):
+        try:
+            with open(path, "rb") as f:
+                magic, version, timestamp, _ = CHECKPOINT_HEADER.unpack(f.read(CHECKPOINT_HEADER.size))
+        except (OSError, struct.error):
+            return None
+        return (version, timestamp) if magic == CHECKPOINT_MAGIC else None
+
+    def write_checkpoint(self, snapshot, external, fingerprint):
+        """Tulis checkpoint (atomik lewat rename) lalu mulai segmen log baru"""
+        version, timestamp = snapshot.version, _epoch(snapshot.timestamp)
+        arrays = [(name, np.ascontiguousarray(snapshot.columns[name])) for name in COLUMN_FIELDS]
+        blob = _dumps({
+            "sections": {name: snapshot.section(name) for name in self.sections},
+            "external": [[section, key] for section, key in external]
+        })
+        layout, offset = [], 0
+        for name, array in arrays:
+            layout.append({"name": name, "dtype": array.dtype.str, "shape": array.shape, "offset": offset})
+            offset += -(-array.nbytes // CHECKPOINT_ALIGN) * CHECKPOINT_ALIGN
+        meta = json.dumps({
+            "fingerprint": fingerprint,
+            "size": snapshot.columns.size,
+            "columns": layout,
+            "blob_offset": offset,
+            "blob_length": len(blob)
+        }).encode("utf-8")
+        data_start = -(-(CHECKPOINT_HEADER.size + len(meta)) // CHECKPOINT_ALIGN) * CHECKPOINT_ALIGN
+
+        path = self._path("checkpoint", version)
+        with open(path + ".tmp", "wb") as f:
+            f.write(CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, version, timestamp, len(meta)) + meta)
+            for (name, array), column in zip(arrays, layout):
+                f.seek(data_start + column["offset"])
+                f.write(array.tobytes())
+            f.seek(data_start + offset)
+            f.write(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+        with self._lock:
+            if self._segment is not None:
+                self._segment.close()
+            self._segment = open(self._path("wal", version), "ab")
+            self._segment_bytes = 0
+            self._checkpointed = time.monotonic()
+            bisect.insort(self._checkpoints, (version, timestamp))
+            self.checkpoints += 1
+        if self.history is not None:
+            self.history.persist()
+        self._expire(timestamp)
+
+    def _read_checkpoint(self, version, fingerprint=None):
+        """State dari checkpoint; kolom langsung di-mmap (tanpa salin)"""
+        with open(self._path("checkpoint", version), "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _, version, timestamp, meta_length = CHECKPOINT_HEADER.unpack_from(mapped, 0)
+        meta = json.loads(mapped[CHECKPOINT_HEADER.size:CHECKPOINT_HEADER.size + meta_length])
+        if fingerprint is not None and meta["fingerprint"] != fingerprint:
+            return None
+        data_start = -(-(CHECKPOINT_HEADER.size + meta_length) // CHECKPOINT_ALIGN) * CHECKPOINT_ALIGN
+        blob_start = data_start + meta["blob_offset"]
+        state = _loads(mapped[blob_start:blob_start + meta["blob_length"]])
+        sections = {name: state["sections"][name] for name in self.sections}
+
+        stored = {column["name"]: column for column in meta["columns"]}
+        if set(stored) == set(COLUMN_FIELDS):
+            arrays = {}
+            for name, column in stored.items():
+                dtype = np.dtype(column["dtype"])
+                count = int(np.prod(column["shape"]))
+                arrays[name] = np.frombuffer(mapped, dtype=dtype, count=count,
+                                             offset=data_start + column["offset"]).reshape(column["shape"])
+            columns = HospitalColumns.from_arrays(arrays)
+        else:
+            # Skema kolom berubah sejak checkpoint ditulis: bangun ulang dari record
+            columns = HospitalColumns.from_sections(sections)
+        external = {(section, _key(key)) for section, key in state["external"]}
+        return LoggedState(version, timestamp, sections, columns, external)
+
+    # ----------------------------- frame -----------------------------
+
+    def _frames(self, version, decode=True, start=0):
+        """Frame ``(versi, timestamp, perubahan, offset akhir)`` di segmen checkpoint ``version``"""
+        try:
+            with open(self._path("wal", version), "rb") as f:
+                f.seek(start)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        position = 0
+        while position + FRAME_HEADER.size <= len(data):
+            magic, frame_version, timestamp, length, checksum = FRAME_HEADER.unpack_from(data, position)
+            payload = data[position + FRAME_HEADER.size:position + FRAME_HEADER.size + length]
+            # Frame terakhir bisa terpotong bila proses mati saat menulis
+            if magic != FRAME_MAGIC or len(payload) < length or zlib.crc32(payload) != checksum:
+                return
+            position += FRAME_HEADER.size + length
+            yield frame_version, timestamp, _loads(payload) if decode else None, start + position
+
+    def _write_frame(self, previous, snapshot):
+        changes = []
+        for name in self.sections:
+            old, new = previous.section(name), snapshot.section(name)
+            if old is new:
+                continue
+            for position, (before, after) in enumerate(zip(old, new)):
+                if before is not after:
+                    external = self._store.is_external(name, self.record_key(name, after))
+                    changes.append([name, position, after, external])
+        if not changes:
+            return
+        payload = _dumps(changes)
+        frame = FRAME_HEADER.pack(FRAME_MAGIC, snapshot.version, _epoch(snapshot.timestamp),
+                                  len(payload), zlib.crc32(payload)) + payload
+        with self._lock:
+            self._segment.write(frame)
+            self._segment.flush()
+            self._segment_bytes += len(frame)
+            self.frames += 1
+
+    def _apply(self, state, changes, version, timestamp):
+        touched = {}
+        for section, position, record, external in changes:
+            records = state.sections[section]
+            records[position] = record
+            touched.setdefault(section, {})[position] = record
+            if external:
+                state.external.add((section, self.record_key(section, record)))
+        for section, records in touched.items():
+            state.columns = state.columns.with_records(section, list(records.items()))
+        state.version = version
+        state.timestamp = timestamp
+
+    # ---------------------------- publik -----------------------------
+
+    def latest_version(self):
+        """Versi tertinggi yang pernah dicatat (0 bila log kosong)"""
+        if not self._checkpoints:
+            return 0
+        version = self._checkpoints[-1][0]
+        for frame_version, _, _, _ in self._frames(version, decode=False):
+            version = frame_version
+        return version
+
+    def restore(self, fingerprint):
+        """State terakhir: checkpoint terbaru + ekor log; None bila tidak ada/registry berbeda"""
+        if not self._checkpoints:
+            return None
+        version = self._checkpoints[-1][0]
+        state = self._read_checkpoint(version, fingerprint)
+        if state is None:
+            return None
+        end = 0
+        for frame_version, timestamp, changes, end in self._frames(version):
+            self._apply(state, changes, frame_version, timestamp)
+        self._tail = (version, end)
+        return state
+
+    def state_at(self, at, fingerprint=None):
+        """State sebagaimana terlihat pada waktu ``at`` (epoch); None bila di luar log.
+
+        ``RegistryMismatch`` bila checkpoint ditulis untuk registry lain
+        (posisi record tidak lagi cocok dengan registry yang dimuat).
+        """
+        with self._lock:
+            checkpoints = list(self._checkpoints)
+        position = bisect.bisect_right([timestamp for _, timestamp in checkpoints], at)
+        if position == 0:
+            return None
+        version = checkpoints[position - 1][0]
+        with self._replay_lock:
+            cached = self._replayed
+            if cached is not None and cached[0] == version and cached[2].timestamp <= at:
+                _, offset, state = cached
+            else:
+                state = self._read_checkpoint(version, fingerprint)
+                if state is None:
+                    raise RegistryMismatch("Log state ditulis untuk registry rumah sakit yang berbeda")
+                offset = 0
+            for frame_version, timestamp, changes, end in self._frames(version, start=offset):
+                if timestamp > at:
+                    break
+                self._apply(state, changes, frame_version, timestamp)
+                offset = end
+            self._replayed = (version, offset, state)
+            # Salinan: _apply mengganti record di list section milik cache
+            return LoggedState(state.version, state.timestamp,
+                               {name: list(records) for name, records in state.sections.items()},
+                               state.columns, set(state.external))
+
+    def attach(self, store, fingerprint):
+        """Catat publish ``store`` mulai dari snapshot saat ini.
+
+        Setelah ``restore()`` frame baru disambung ke segmen terakhir
+        (dipotong di frame valid terakhir); tanpa restore checkpoint awal
+        ditulis oleh thread log. Frame baru ditulis setelah ``start()``
+        (dipisah agar ``serve.py`` bisa fork sebelum thread apa pun berjalan).
+        """
+        self._store = store
+        self._fingerprint = fingerprint
+        self._base = store.snapshot()
+        if self._tail is not None:
+            version, end = self._tail
+            self._segment = open(self._path("wal", version), "ab")
+            self._segment.truncate(end)
+            self._segment_bytes = end
+            self._checkpointed = time.monotonic()
+        store.add_listener(self.on_publish)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="snapshot-log", daemon=True)
+            self._thread.start()
+
+    def on_publish(self, previous, snapshot):
+        """Listener store: O(1), hanya menandai snapshot terbaru"""
+        with self._pending_lock:
+            if self._pending is not None:
+                self.coalesced += 1
+            self._pending = snapshot
+        self._wakeup.set()
+
+    def _run(self):
+        # Checkpoint ditulis saat belum ada segmen, dan setelah tulis gagal:
+        # frame bisa terpotong di akhir segmen, jadi frame berikutnya masuk segmen baru
+        needs_checkpoint = self._segment is None
+        while True:
+            if not needs_checkpoint:
+                self._wakeup.wait()
+                self._wakeup.clear()
+            # Ditukar di bawah lock: publish di antara baca dan reset tidak boleh hilang
+            with self._pending_lock:
+                snapshot, self._pending = self._pending, None
+            try:
+                if needs_checkpoint:
+                    if snapshot is None or snapshot.version <= self._base.version:
+                        snapshot = self._base
+                    self.write_checkpoint(snapshot, self._store.external_keys(), self._fingerprint)
+                    self._base = snapshot
+                    needs_checkpoint = self.failing = False
+                    continue
+                if snapshot is None or snapshot.version <= self._base.version:
+                    continue
+                self._write_frame(self._base, snapshot)
+                self._base = snapshot
+                if (time.monotonic() - self._checkpointed >= self.checkpoint_seconds
+                        or self._segment_bytes >= self.checkpoint_bytes):
+                    self.write_checkpoint(snapshot, self._store.external_keys(), self._fingerprint)
+            except Exception:
+                self.errors += 1
+                self.failing = needs_checkpoint = True
+                logger.exception("Gagal menulis log state ke %s", self.directory)
+                # Snapshot yang gagal ditulis dikembalikan kecuali sudah ada yang lebih baru
+                with self._pending_lock:
+                    if self._pending is None and snapshot is not None:
+                        self._pending = snapshot
+                time.sleep(STATE_LOG_RETRY_SECONDS)
+
+    def _expire(self, now):
+        """Hapus checkpoint + segmen yang seluruhnya lebih tua dari retensi"""
+        cutoff = now - self.retention_seconds
+        with self._lock:
+            # Checkpoint terakhir sebelum cutoff tetap disimpan: ia dasar replay ke cutoff
+            keep_from = max(bisect.bisect_right([timestamp for _, timestamp in self._checkpoints], cutoff) - 1, 0)
+            expired, self._checkpoints = self._checkpoints[:keep_from], self._checkpoints[keep_from:]
+        for version, _ in expired:
+            for kind in ("checkpoint", "wal"):
+                try:
+                    os.remove(self._path(kind, version))
+                except FileNotFoundError:
+                    pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "directory": self.directory,
+                "checkpoints": len(self._checkpoints),
+                "oldest": self._checkpoints[0][1] if self._checkpoints else None,
+                "frames_written": self.frames,
+                "checkpoints_written": self.checkpoints,
+                "coalesced": self.coalesced,
+                "segment_bytes": self._segment_bytes,
+                "errors": self.errors,
+                "failing": self.failing,
+                "running": self._thread is not None and self._thread.is_alive()
+            }
@@ -0,0 +1,247 @@
+"""Push stream (Server-Sent Events) berisi delta state RS per section"""
+from collections import deque
+import json
+import queue
+import threading
+import time
+
+STREAM_HEARTBEAT_SECONDS = 15
+STREAM_REPLAY_SIZE = 512
+STREAM_CLIENT_BUFFER = 64
+# Pasangan snapshot yang menunggu di-diff; bila penuh yang tertua dibuang
+# dan klien yang melewatinya dikirimi snapshot penuh
+STREAM_PENDING_LIMIT = 256
+
+def diff_values(old, new):
+    """Field yang berubah dari ``old`` ke ``new`` (nested, hanya daun yang beda)"""
+    changes = {}
+    for key, value in new.items():
+        previous = old.get(key)
+        if previous is value:
+            continue
+        if isinstance(value, dict) and isinstance(previous, dict):
+            nested = diff_values(previous, value)
+            if nested:
+                changes[key] = nested
+        elif previous != value:
+            changes[key] = value
+    return changes
+
+def diff_snapshots(previous, snapshot, sections, record_key):
+    """Daftar perubahan per RS dan section antara dua snapshot.
+
+    Record yang tidak disentuh penulis adalah objek yang sama (copy-on-write),
+    jadi pengecekan ``is`` cukup untuk melewatinya tanpa membandingkan isi.
+    Posisi record per section tetap antar versi sehingga record lama dicari
+    lewat indeks; pencarian per kunci hanya bila panjang section berubah.
+    """
+    changes = []
+    for section in sections:
+        old_records = previous.section(section)
+        new_records = snapshot.section(section)
+        if old_records is new_records:
+            continue
+        if len(old_records) == len(new_records):
+            pairs = zip(old_records, new_records)
+        else:
+            old_by_key = {record_key(section, record): record for record in old_records}
+            pairs = ((old_by_key.get(record_key(section, record)), record) for record in new_records)
+        for old, record in pairs:
+            if old is record:
+                continue
+            delta = diff_values(old, record) if old is not None else dict(record)
+            delta.pop("last_updated", None)
+            if not delta:
+                continue
+            change = {"hospital_id": record["hospital_id"], "section": section, "changes": delta}
+            if section == "queues":
+                change["polyclinic"] = record["polyclinic"]
+            changes.append(change)
+    return changes
+
+def format_event(event_id, event, data):
+    """Encode satu event SSE (sekali encode, dipakai semua klien)"""
+    payload = json.dumps(data, separators=(",", ":"))
+    return f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n".encode("utf-8")
+
+class StreamSubscriber:
+    """Buffer per klien; bila penuh klien ditandai tertinggal (lagged)"""
+
+    def __init__(self, maxsize=STREAM_CLIENT_BUFFER):
+        self.queue = queue.Queue(maxsize)
+        self.lagged = False
+
+    def push(self, version, message, base):
+        try:
+            self.queue.put_nowait((version, message, base))
+        except queue.Full:
+            # Klien lambat: jangan menahan penulis, kirim ulang snapshot nanti
+            self.lagged = True
+
+    def drain(self):
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                return
+
+class StreamHub:
+    """Mengubah snapshot baru menjadi event delta dan menyebarkannya ke klien.
+
+    Listener publish hanya mengantrekan pasangan snapshot; diff dan encode
+    dikerjakan thread hub di luar lock penulis store. Event terakhir disimpan
+    di replay buffer terbatas agar klien yang tersambung ulang dengan
+    ``Last-Event-ID`` cukup menerima sisa event.
+    """
+
+    def __init__(self, epoch, sections, record_key, snapshot_payload,
+                 replay_size=STREAM_REPLAY_SIZE, client_buffer=STREAM_CLIENT_BUFFER, cache=None):
+        self.epoch = epoch
+        # Opsional: objek dengan ``get(key, build)`` agar event snapshot
+        # di-encode sekali per versi untuk semua klien yang tersambung
+        self.cache = cache
+        self.sections = sections
+        self.record_key = record_key
+        self.snapshot_payload = snapshot_payload
+        self.client_buffer = client_buffer
+        self._replay = deque(maxlen=replay_size)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._pending = deque(maxlen=STREAM_PENDING_LIMIT)
+        self._pending_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def event_id(self, version):
+        return f"{self.epoch}-{version}"
+
+    def parse_event_id(self, raw):
+        """Versi dari ``Last-Event-ID``; None jika bukan dari proses ini"""
+        if not raw:
+            return None
+        epoch, _, version = raw.rpartition("-")
+        if epoch != self.epoch or not version.isdigit():
+            return None
+        return int(version)
+
+    def on_publish(self, previous, snapshot):
+        """Listener state store: antrekan pasangan snapshot untuk thread hub"""
+        if previous is None:
+            return
+        with self._pending_lock:
+            self._pending.append((previous, snapshot))
+        self._wakeup.set()
+
+    def start(self):
+        """Jalankan thread diff (idempoten; aman dipanggil ulang setelah fork)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="stream-hub", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            while True:
+                with self._pending_lock:
+                    if not self._pending:
+                        break
+                    previous, snapshot = self._pending.popleft()
+                self.publish_delta(previous, snapshot)
+
+    def publish_delta(self, previous, snapshot):
+        """Hitung delta ``previous`` -> ``snapshot`` lalu kirim ke semua klien"""
+        data = {
+            "version": snapshot.version,
+            "timestamp": snapshot.timestamp,
+            "changes": diff_snapshots(previous, snapshot, self.sections, self.record_key)
+        }
+        if snapshot.overview != previous.overview:
+            data["overview"] = snapshot.overview
+        if snapshot.trends != previous.trends:
+            data["trends"] = snapshot.trends
+        message = format_event(self.event_id(snapshot.version), "delta", data)
+        with self._lock:
+            self._replay.append((snapshot.version, message, previous.version))
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.push(snapshot.version, message, previous.version)
+
+    def snapshot_message(self, snapshot):
+        def build():
+            return format_event(self.event_id(snapshot.version), "snapshot", self.snapshot_payload(snapshot))
+        if self.cache is None:
+            return build()
+        return self.cache.get(("stream-snapshot", snapshot.version), build)
+
+    def replay_since(self, version):
+        """Event ``(versi, pesan)`` setelah ``version``; None jika sudah keluar dari buffer"""
+        with self._lock:
+            events = list(self._replay)
+        if not events:
+            return None
+        backlog = [event for event in events if event[0] > version]
+        # Delta hanya berlaku di atas versi dasarnya; versi yang tidak pernah
+        # dilihat hub ini (mis. publish digabung di worker lain) butuh snapshot
+        bases = [version] + [event[0] for event in backlog[:-1]]
+        if any(event[2] != base for event, base in zip(backlog, bases)):
+            return None
+        return [(event_version, message) for event_version, message, _ in backlog]
+
+    @property
+    def client_count(self):
+        return len(self._subscribers)
+
+    def stream(self, current_snapshot, last_event_id=None, heartbeat=STREAM_HEARTBEAT_SECONDS):
+        """Generator SSE untuk satu klien"""
+        self.start()
+        subscriber = StreamSubscriber(self.client_buffer)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        try:
+            yield b"retry: 3000\n\n"
+            # Klien sudah terdaftar sebelum snapshot/replay dibaca, jadi tidak
+            # ada event yang hilang; duplikat dilewati lewat sent_version.
+            snapshot = current_snapshot()
+            version = self.parse_event_id(last_event_id)
+            backlog = self.replay_since(version) if version is not None else None
+            if backlog is None:
+                sent_version = snapshot.version
+                yield self.snapshot_message(snapshot)
+            else:
+                sent_version = version
+                for event_version, message in backlog:
+                    sent_version = event_version
+                    yield message
+
+            last_sent = time.monotonic()
+            while True:
+                if subscriber.lagged:
+                    subscriber.drain()
+                    subscriber.lagged = False
+                    snapshot = current_snapshot()
+                    sent_version = snapshot.version
+                    yield self.snapshot_message(snapshot)
+                    last_sent = time.monotonic()
+                    continue
+                timeout = max(0.0, heartbeat - (time.monotonic() - last_sent))
+                try:
+                    event_version, message, base = subscriber.queue.get(timeout=timeout)
+                except queue.Empty:
+                    yield b": heartbeat\n\n"
+                    last_sent = time.monotonic()
+                    continue
+                if event_version <= sent_version:
+                    continue
+                if base != sent_version:
+                    # Ada pasangan yang terbuang dari antrean hub: delta ini
+                    # tidak berlaku di atas versi klien, kirim snapshot penuh
+                    subscriber.lagged = True
+                    continue
+                sent_version = event_version
+                yield message
+                last_sent = time.monotonic()
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
@@ -0,0 +1,74 @@
+from itertools import product
+
+import numpy as np
+import pytest
+
+from allocation import min_cost_assignment
+
+def best_phase(cost, patients, remaining):
+    """Brute force satu fase: jumlah pasien terlayani maksimum, lalu biaya minimum"""
+    best = None
+    for choice in product(range(-1, cost.shape[1]), repeat=len(patients)):
+        used = np.bincount([h for h in choice if h >= 0], minlength=cost.shape[1])
+        if (used > remaining).any() or any(h >= 0 and not np.isfinite(cost[p, h]) for p, h in zip(patients, choice)):
+            continue
+        score = (-sum(h >= 0 for h in choice), sum(cost[p, h] for p, h in zip(patients, choice) if h >= 0))
+        if best is None or score < best:
+            best = score
+    return best
+
+def phase_score(cost, patients, assign):
+    return (-int((assign[patients] >= 0).sum()), sum(cost[p, assign[p]] for p in patients if assign[p] >= 0))
+
+def test_later_phase_does_not_move_earlier_assignment():
+    cost = np.array([[-100.0, -90.0], [-100.0, np.inf]])
+    assert min_cost_assignment(cost, [1, 1], [[0], [1]]).tolist() == [0, -1]
+
+@pytest.mark.parametrize("seed", range(200))
+def test_matches_brute_force_per_phase(seed):
+    rng = np.random.default_rng(seed)
+    n_hospitals = int(rng.integers(1, 4))
+    rows = rng.integers(-5, 6, size=(int(rng.integers(1, 4)), n_hospitals)).astype(float)
+    rows[rng.random(rows.shape) < 0.25] = np.inf
+    # Baris kembar menguji penggabungan pasien identik menjadi satu kelas
+    cost = rows[rng.integers(0, len(rows), size=int(rng.integers(1, 6)))]
+    capacity = rng.integers(0, 3, size=n_hospitals)
+    order = rng.permutation(len(cost))
+    cuts = sorted(rng.choice(np.arange(1, len(cost) + 1), size=min(len(cost), int(rng.integers(1, 3))), replace=False))
+    phases = [order[start:end].tolist() for start, end in zip([0, *cuts], cuts)]
+
+    assign = min_cost_assignment(cost, capacity, phases)
+
+    assert (np.bincount(assign[assign >= 0], minlength=n_hospitals) <= capacity).all()
+    assert all(np.isfinite(cost[p, h]) for p, h in enumerate(assign) if h >= 0)
+    assert all(assign[p] == -1 for p in set(range(len(cost))) - {p for phase in phases for p in phase})
+    remaining = capacity.copy()
+    for phase in phases:
+        assert phase_score(cost, phase, assign) == best_phase(cost, phase, remaining)
+        remaining -= np.bincount(assign[phase][assign[phase] >= 0], minlength=n_hospitals)
+
+@pytest.mark.parametrize("seed", range(50))
+def test_greedy_fallback_respects_capacity_and_phases(seed):
+    rng = np.random.default_rng(seed)
+    n_patients, n_hospitals = int(rng.integers(1, 30)), int(rng.integers(1, 8))
+    cost = rng.integers(-50, 0, size=(n_patients, n_hospitals)).astype(float)
+    cost[rng.random(cost.shape) < 0.2] = np.inf
+    capacity = rng.integers(0, 4, size=n_hospitals)
+    cut = int(rng.integers(0, n_patients + 1))
+    phases = [list(range(cut)), list(range(cut, n_patients))]
+
+    assign = min_cost_assignment(cost, capacity, phases, max_cells=0)
+
+    assert (np.bincount(assign[assign >= 0], minlength=n_hospitals) <= capacity).all()
+    assert all(np.isfinite(cost[p, h]) for p, h in enumerate(assign) if h >= 0)
+    # Pasien fase kedua hanya mendapat slot yang tidak bisa dipakai pasien fase pertama
+    for p in phases[0]:
+        if assign[p] < 0:
+            free = capacity - np.bincount(assign[phases[0]][assign[phases[0]] >= 0], minlength=n_hospitals)
+            assert not (np.isfinite(cost[p]) & (free > 0)).any()
+
+def test_greedy_fallback_picks_cheapest_pairs_first():
+    cost = np.array([[-10.0, -9.0], [-8.0, np.inf]])
+    # Greedy: pasien 0 mengambil RS 0, pasien 1 tidak kebagian (eksak: 0->1, 1->0)
+    assert min_cost_assignment(cost, [1, 1], [[0, 1]], max_cells=0).tolist() == [0, -1]
+    assert min_cost_assignment(cost, [1, 1], [[0, 1]]).tolist() == [1, 0]
@@ -0,0 +1,24 @@
+import main
+
+def test_etag_differs_per_content_coding():
+    client = main.app.test_client()
+    identity = client.get("/api/dashboard", headers={"Accept-Encoding": "identity"})
+    gzipped = client.get("/api/dashboard", headers={"Accept-Encoding": "gzip"})
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert "Content-Encoding" not in identity.headers
+    assert identity.headers["ETag"] != gzipped.headers["ETag"]
+    assert identity.get_data() != gzipped.get_data()
+
+def test_not_modified_only_for_matching_coding():
+    client = main.app.test_client()
+    etag = client.get("/api/dashboard", headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+    not_modified = client.get("/api/dashboard", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert "Accept-Encoding" in not_modified.headers["Vary"]
+    assert client.get("/api/dashboard", headers={"Accept-Encoding": "identity", "If-None-Match": etag}).status_code == 200
+
+def test_not_modified_for_weak_validator():
+    client = main.app.test_client()
+    etag = client.get("/api/dashboard").headers["ETag"]
+    assert client.get("/api/dashboard", headers={"If-None-Match": f"W/{etag}"}).status_code == 304
+    assert client.get("/api/dashboard", headers={"If-None-Match": "*"}).status_code == 304
@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+import main
+from ingest import INGEST_INT_MAX, IngestError, IngestPipeline, validate_values
+
+TEMPLATE = {"icu": {"total": 40, "occupied": 20, "occupancy_rate": 50.0}, "score": 1.5, "name": "RS"}
+
+@pytest.mark.parametrize("values", [
+    {"icu": {"occupied": 3}},
+    {"icu": {"total": 0}},
+    {"icu": {"total": INGEST_INT_MAX}},
+    {"score": 2},
+    {"score": 0.25},
+    {"name": "RS Baru"}
+])
+def test_valid_values(values):
+    validate_values(values, TEMPLATE, {"occupancy_rate"})
+
+@pytest.mark.parametrize("values", [
+    {"icu": {"occupied": 3.7}},
+    {"icu": {"occupied": 3.0}},
+    {"icu": {"occupied": True}},
+    {"icu": {"occupied": -1}},
+    {"icu": {"total": INGEST_INT_MAX + 1}},
+    {"icu": {"total": 3_000_000_000}},
+    {"icu": {"occupancy_rate": 10.0}},
+    {"score": float("nan")},
+    {"score": float("inf")},
+    {"name": 5},
+    {"unknown": 1},
+    {"hospital_id": "RS999"},
+    {}
+])
+def test_invalid_values(values):
+    with pytest.raises(IngestError):
+        validate_values(values, TEMPLATE, {"occupancy_rate"})
+
+@pytest.fixture
+def pipeline():
+    store = main.HospitalStateStore(main.HOSPITALS, tick_interval=0)
+    return store, IngestPipeline(store, main.INGEST_SECTIONS)
+
+def ingest(pipeline, *lines):
+    return pipeline.ingest([line if isinstance(line, str) else json.dumps(line) for line in lines])
+
+def test_pipeline_rejects_bad_numbers_per_line(pipeline):
+    store, pipe = pipeline
+    hospital_id = main.HOSPITALS[0]["id"]
+    version = store.version
+    result = ingest(
+        pipe,
+        f'{{"hospital_id": "{hospital_id}", "section": "beds", "values": {{"icu": {{"occupied": NaN}}}}}}',
+        f'{{"hospital_id": "{hospital_id}", "section": "beds", "values": {{"icu": {{"total": Infinity}}}}}}',
+        {"hospital_id": hospital_id, "section": "beds", "values": {"icu": {"occupied": 3.7}}},
+        {"hospital_id": hospital_id, "section": "beds", "values": {"icu": {"total": 3_000_000_000}}},
+        {"hospital_id": hospital_id, "section": "emergency", "values": {"waiting_patients": 12}}
+    )
+    assert result["accepted"] == 1
+    assert [error["line"] for error in result["errors"]] == [1, 2, 3, 4]
+    assert store.version == version + 1
+    assert store.record("emergency", hospital_id)["waiting_patients"] == 12
+
+def test_pipeline_rejects_occupied_above_total(pipeline):
+    store, pipe = pipeline
+    hospital_id = main.HOSPITALS[0]["id"]
+    result = ingest(pipe, {"hospital_id": hospital_id, "section": "beds", "values": {"icu": {"total": 1, "occupied": 2}}})
+    assert result["accepted"] == 0 and result["errors"]
+
+def test_pipeline_accepts_zero_totals(pipeline):
+    store, pipe = pipeline
+    hospital_id = main.HOSPITALS[0]["id"]
+    result = ingest(pipe, {"hospital_id": hospital_id, "section": "beds",
+                           "values": {bed_type: {"total": 0, "occupied": 0} for bed_type in ("icu", "regular", "isolation")}})
+    assert result["accepted"] == 1
+    record = store.record("beds", hospital_id)
+    assert record["icu"]["occupancy_rate"] == 0.0 and record["icu"]["available"] == 0
+    json.dumps(store.snapshot().visualizations, allow_nan=False)
+
+def test_pipeline_skips_duplicates_and_stale_seq(pipeline):
+    store, pipe = pipeline
+    hospital_id = main.HOSPITALS[0]["id"]
+    update = {"hospital_id": hospital_id, "section": "emergency", "values": {"waiting_patients": 4},
+              "idempotency_key": "a", "source": "his", "seq": 5}
+    assert ingest(pipe, update)["accepted"] == 1
+    assert ingest(pipe, update)["duplicates"] == 1
+    assert ingest(pipe, {**update, "idempotency_key": "b", "seq": 4})["stale"] == 1
@@ -0,0 +1,119 @@
+import threading
+import time
+
+import pytest
+
+import main
+from instrumentation import Histogram, MetricsRegistry, SamplingProfiler
+
+@pytest.fixture
+def client():
+    return main.app.test_client()
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Latensi", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, "/a")
+    assert histogram.render() == [
+        'latency_seconds_bucket{route="/a",le="0.1"} 2',
+        'latency_seconds_bucket{route="/a",le="1.0"} 3',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 4',
+        'latency_seconds_sum{route="/a"} 3.65',
+        'latency_seconds_count{route="/a"} 4',
+    ]
+
+def test_registry_renders_help_type_and_escaped_labels():
+    registry = MetricsRegistry()
+    counter = registry.counter("errors_total", "Jumlah error", ("route",))
+    counter.inc('/a"b\\c')
+    counter.inc('/a"b\\c', amount=2)
+    registry.collector(lambda: [("queue_depth", "gauge", "Kedalaman antrean", 7)])
+    assert registry.render().splitlines() == [
+        "# HELP errors_total Jumlah error",
+        "# TYPE errors_total counter",
+        'errors_total{route="/a\\"b\\\\c"} 3',
+        "# HELP queue_depth Kedalaman antrean",
+        "# TYPE queue_depth gauge",
+        "queue_depth 7",
+    ]
+
+def test_timer_records_nested_calls():
+    histogram = Histogram("stage_seconds", "Tahap", ("stage",))
+    timer = histogram.time("outer")
+    with timer:
+        with timer:
+            pass
+    assert histogram.render()[-1] == 'stage_seconds_count{stage="outer"} 2'
+
+def test_metrics_endpoint_labels_requests_by_route(client):
+    client.get("/api/beds")
+    client.get("/api/hospitals/RS-TIDAK-ADA")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    text = response.get_data(as_text=True)
+    assert "# TYPE http_request_duration_seconds histogram" in text
+    assert 'http_request_duration_seconds_bucket{route="/api/beds",method="GET",status="200",le="0.0005"}' in text
+    assert 'http_request_duration_seconds_count{route="/api/hospitals/<hospital_id>",method="GET",status="404"}' in text
+    assert 'le="+Inf"' in text
+    assert 'stage_duration_seconds_count{stage="serialize"}' in text
+    for name in ("response_cache_hits_total", "response_cache_bytes", "state_version", "stream_clients"):
+        assert f"\n{name} " in text
+
+def test_profiler_disabled_by_default(client):
+    assert not main.PROFILER_ENABLED
+    for method in ("get", "post", "delete"):
+        assert getattr(client, method)("/api/profiler").status_code == 404
+
+def test_profiler_route_start_and_stop(client, monkeypatch):
+    monkeypatch.setattr(main, "PROFILER_ENABLED", True)
+    assert client.post("/api/profiler", json={"route": "/tidak-ada"}).status_code == 400
+    assert client.post("/api/profiler", json={"route": "/api/beds", "seconds": -1}).status_code == 400
+    started = client.post("/api/profiler", json={"route": "/api/beds", "seconds": 5}).get_json()
+    assert started["route"] == "/api/beds" and started["running"]
+    stopped = client.delete("/api/profiler").get_json()
+    assert not stopped["running"]
+    assert not main.profiler.enabled
+
+def busy_request(profiler, route, stop):
+    profiler.enter(route)
+    try:
+        while not stop.is_set():
+            sum(range(1000))
+    finally:
+        profiler.leave()
+
+def other_request(profiler, route, stop):
+    busy_request(profiler, route, stop)
+
+def test_profiler_samples_only_target_route():
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start("/target", seconds=5)
+    stop = threading.Event()
+    threads = [threading.Thread(target=busy_request, args=(profiler, "/target", stop)),
+               threading.Thread(target=other_request, args=(profiler, "/lain", stop))]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while profiler.samples < 5:
+        assert time.monotonic() < deadline, "profiler tidak mengambil sampel"
+        time.sleep(0.01)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    profiler.stop()
+    report = profiler.report()
+    assert not report["running"] and report["samples"] >= 5
+    assert sum(stack["count"] for stack in report["stacks"]) == report["samples"]
+    # Thread route lain tidak pernah disampel
+    assert not any("other_request" in frame for stack in report["stacks"] for frame in stack["frames"])
+    assert not profiler.enabled
+
+def test_profiler_stops_at_deadline():
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start("/target", seconds=0.05)
+    profiler._thread.join(5)
+    assert not profiler.running and not profiler.enabled
+    # Setelah berhenti, enter() tidak mendaftarkan thread lagi
+    profiler.enter("/target")
+    assert not profiler._active
@@ -0,0 +1,32 @@
+import json
+
+import pytest
+
+import main
+
+@pytest.fixture
+def client():
+    return main.app.test_client()
+
+@pytest.mark.parametrize("query", ["limit=2", "fields=dates", "format=ndjson"])
+def test_list_params_rejected_for_dict_section(client, query):
+    response = client.get(f"/api/trends?{query}")
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+@pytest.mark.parametrize("path", ["/api/beds?limit=2", "/api/emergency?fields=waiting_patients", "/api/hospitals?limit=3"])
+def test_streamed_page_encoded_like_jsonify(client, path):
+    body = client.get(path).get_data()
+    with main.app.app_context():
+        assert main.jsonify(json.loads(body)).get_data().strip() == body
+
+def test_cursor_walks_all_records(client):
+    expected = client.get("/api/beds").get_json()["data"]
+    seen, cursor = [], None
+    while True:
+        page = client.get("/api/beds?limit=7" + (f"&cursor={cursor}" if cursor else "")).get_json()
+        seen.extend(page["data"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == expected
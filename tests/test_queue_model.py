@@ -0,0 +1,120 @@
+import os
+
+import pytest
+
+import main
+import queue_model
+from queue_model import QueueModel
+
+TS = 1767225600
+
+@pytest.fixture
+def store():
+    return main.HospitalStateStore(main.HOSPITALS, tick_interval=0)
+
+def events(model, *items):
+    return model.process(list(enumerate(items, 1)))
+
+def event(kind, patient_id, hospital_id=None, **extra):
+    return {"hospital_id": hospital_id or main.HOSPITALS[0]["id"], "patient_id": patient_id, "type": kind, **extra}
+
+def emergency(store):
+    return store.record("emergency", main.HOSPITALS[0]["id"])
+
+def test_er_lifecycle_updates_record(store):
+    model = QueueModel(store)
+    result = events(model,
+                    event("arrival", "a", ts=TS), event("arrival", "b", ts=TS + 60, severity="urgent"),
+                    event("triage", "a", severity="critical", ts=TS + 120),
+                    event("service_start", "a", ts=TS + 600))
+    assert result["accepted"] == 4 and not result["errors"]
+    record = emergency(store)
+    assert (record["waiting_patients"], record["in_treatment"]) == (1, 1)
+    assert record["severity_distribution"]["critical"] == 1 and record["severity_distribution"]["urgent"] == 1
+    assert record["avg_waiting_time"] == 10
+
+    events(model, event("discharge", "a", ts=TS + 1800))
+    record = emergency(store)
+    assert (record["waiting_patients"], record["in_treatment"]) == (1, 0)
+    assert record["severity_distribution"]["critical"] == 0
+
+def test_polyclinic_queue(store):
+    queue = store.snapshot().queues[0]
+    model = QueueModel(store)
+    ts = TS + 3600
+    events(model,
+           event("arrival", 1, queue["hospital_id"], polyclinic=queue["polyclinic"], ts=ts),
+           event("arrival", 2, queue["hospital_id"], polyclinic=queue["polyclinic"], ts=ts),
+           event("service_start", 1, queue["hospital_id"], polyclinic=queue["polyclinic"], ts=ts + 60),
+           event("discharge", 1, queue["hospital_id"], polyclinic=queue["polyclinic"], ts=ts + 660))
+    record = store.record("queues", (queue["hospital_id"], queue["polyclinic"]))
+    assert record["current_queue"] == 1
+    assert record["avg_service_time"] == 10 and record["estimated_wait"] == 10
+
+@pytest.mark.parametrize("bad", [
+    event("arrival", "x", hospital_id="RS-TIDAK-ADA"),
+    event("arrival", "x", polyclinic="Poli Tidak Ada"),
+    event("discharge", "belum-datang"),
+    event("arrival", "x", ts=1e20),
+    event("arrival", "x", ts=-1e20),
+    event("arrival", "x", ts=float("nan")),
+    event("arrival", "x", ts=float("inf")),
+    event("arrival", "x", ts=10 ** 400),
+    event("arrival", "x", ts="kemarin"),
+    event("arrival", "x", ts="99999-01-01"),
+    event("arrival", "x", ts=True),
+    event("arrival", "x", severity="parah"),
+    event("triage", "x"),
+    event("teleport", "x"),
+    event("arrival", True),
+    "bukan object"
+])
+def test_invalid_event_is_a_line_error(store, bad):
+    model = QueueModel(store)
+    result = events(model, bad, event("arrival", "ok", ts=TS))
+    assert result["accepted"] == 1
+    assert [error["line"] for error in result["errors"]] == [1]
+
+def test_duplicate_arrival_and_double_service_rejected(store):
+    model = QueueModel(store)
+    result = events(model, event("arrival", "a", ts=TS), event("arrival", "a", ts=TS),
+                    event("service_start", "a", ts=TS + 1), event("service_start", "a", ts=TS + 2))
+    assert result["accepted"] == 2
+    assert [error["line"] for error in result["errors"]] == [2, 4]
+
+def test_events_route_rejects_out_of_range_ts():
+    client = main.app.test_client()
+    body = b'{"hospital_id": "%s", "patient_id": "p", "type": "arrival", "ts": 1e20}\n' % main.HOSPITALS[0]["id"].encode()
+    response = client.post("/api/events", data=body, content_type="application/x-ndjson")
+    assert response.status_code == 400
+    assert response.get_json()["errors"][0]["line"] == 1
+
+def test_state_survives_restart(store, tmp_path):
+    model = QueueModel(store, directory=str(tmp_path))
+    events(model, event("arrival", "a", ts=TS), event("arrival", "b", ts=TS, severity="urgent"),
+           event("service_start", "a", ts=TS + 300))
+
+    restarted = QueueModel(store, directory=str(tmp_path))
+    assert restarted.stats() == model.stats()
+    # Pasien yang datang sebelum restart bisa dilayani dan dipulangkan
+    result = events(restarted, event("discharge", "a", ts=TS + 900), event("service_start", "b", ts=TS + 960),
+                    event("arrival", "c", ts=TS + 1000))
+    assert result["accepted"] == 3 and not result["errors"]
+    record = emergency(store)
+    assert (record["waiting_patients"], record["in_treatment"]) == (1, 1)
+    assert record["severity_distribution"]["urgent"] == 1
+
+def test_journal_compaction_and_truncated_tail(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(queue_model, "QUEUE_JOURNAL_BYTES", 200)
+    model = QueueModel(store, directory=str(tmp_path))
+    for i in range(20):
+        events(model, event("arrival", i, ts=TS + i))
+    # Hanya satu generasi (state + journal) yang tersisa
+    assert len(os.listdir(tmp_path)) == 2
+    journal = next(name for name in os.listdir(tmp_path) if name.startswith("queue-events-"))
+    with open(tmp_path / journal, "a") as f:
+        f.write('["%s", null, 99, "arri' % main.HOSPITALS[0]["id"])
+
+    restarted = QueueModel(store, directory=str(tmp_path))
+    assert restarted.stats()["active_patients"] == 20
+    assert events(restarted, event("discharge", 0, ts=TS + 100))["accepted"] == 1
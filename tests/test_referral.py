@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+import main
+
+@pytest.fixture
+def client():
+    return main.app.test_client()
+
+def hospital():
+    return main.HOSPITALS[0]
+
+@pytest.mark.parametrize("location", [
+    {"max_km": "inf"},
+    {"max_km": "nan"},
+    {"max_km": "Infinity"},
+    {"lat": "nan"},
+    {"lon": "-inf"},
+    {"max_km": -1},
+    {"lat": 91},
+    {"lat": "utara"}
+])
+def test_invalid_location_rejected(client, location):
+    body = {"complaint": "demam tinggi", "lat": hospital()["lat"], "lon": hospital()["lon"], "limit": 3, **location}
+    assert client.post("/api/referral/recommend", json=body).status_code == 400
+    batch = {"patients": [body], "limit": 3}
+    assert client.post("/api/referral/recommend/batch", json=batch).status_code == 400
+
+def test_location_limits_distance(client):
+    body = {"complaint": "demam tinggi", "lat": hospital()["lat"], "lon": hospital()["lon"], "max_km": 1, "limit": 5}
+    response = client.post("/api/referral/recommend", json=body)
+    assert response.status_code == 200
+    recommendations = response.get_json()["recommendations"]
+    assert recommendations and all(r["details"]["distance_km"] <= 1 for r in recommendations)
+
+COMPLAINTS = ["nyeri dada", "demam tinggi", "batuk", "kontrol rutin", "patah tulang"]
+SPECIALTIES = ["Umum", "Jantung", "Anak", "Bedah", "Spesialis Tidak Ada"]
+
+def random_snapshot(rng):
+    """Snapshot dengan tempat tidur/IGD acak agar banyak skor seri"""
+    store = main.HospitalStateStore(main.HOSPITALS, tick_interval=0)
+    for i, hospital in enumerate(main.HOSPITALS):
+        beds = store.snapshot().beds[i]
+        store.update(hospital["id"], "beds", {
+            bed_type: {"occupied": rng.randint(0, beds[bed_type]["total"])} for bed_type in ("icu", "regular")
+        })
+        store.update(hospital["id"], "emergency", {"waiting_patients": rng.choice([0, 5, 25, 60])})
+    return store.snapshot()
+
+def random_patient(rng):
+    data = {"complaint": rng.choice(COMPLAINTS), "specialty": rng.choice(SPECIALTIES)}
+    if rng.random() < 0.7:
+        hospital = rng.choice(main.HOSPITALS)
+        data.update(lat=hospital["lat"] + rng.uniform(-0.05, 0.05), lon=hospital["lon"] + rng.uniform(-0.05, 0.05))
+        if rng.random() < 0.5:
+            data["max_km"] = rng.choice([0.5, 3, 8, 20])
+    return main.patient_info(data)
+
+def ranked_ids(result):
+    return [(r["hospital_id"], r["score"]) for r in result["recommendations"]]
+
+@pytest.mark.parametrize("seed", range(40))
+def test_batch_ranking_matches_single_patient(seed):
+    rng = random.Random(seed)
+    snapshot = random_snapshot(rng)
+    patients = [random_patient(rng) for _ in range(12)]
+    order = {hospital["id"]: i for i, hospital in enumerate(main.HOSPITALS)}
+    for limit in (None, 1, 3):
+        batch = main.rank_referrals(snapshot, patients, limit)
+        for patient, result in zip(patients, batch):
+            single, = main.rank_referrals(snapshot, [patient], limit)
+            assert result == single
+            full, = main.rank_referrals(snapshot, [patient])
+            # limit = prefiks ranking penuh
+            assert ranked_ids(result) == ranked_ids(full)[:limit]
+            # Skor menurun; seri dipecah urutan registry
+            keys = [(-score, order[hospital_id]) for hospital_id, score in ranked_ids(full)]
+            assert keys == sorted(keys)
+            location = patient.get("location")
+            if location is not None and "max_km" in location:
+                # Tepat RS dalam radius max_km yang tersisa
+                within = {
+                    hospital["id"] for hospital in main.HOSPITALS
+                    if main.haversine_km(location["lat"], location["lon"], hospital["lat"], hospital["lon"])
+                    <= location["max_km"]
+                }
+                assert {hospital_id for hospital_id, _ in ranked_ids(full)} == within
+            else:
+                assert len(full["recommendations"]) == len(main.HOSPITALS)
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from columnar import COLUMN_FIELDS, HospitalColumns
+from referral_index import INDEX_REBUILD_FRACTION, CapabilityIndex, ReferralIndex
+
+SIZE = 400
+KEYS = [(bed_type, specialty) for bed_type in ("icu", "regular", "isolation") for specialty in (None, "Jantung", "Anak")]
+
+def random_columns(rng):
+    # Rentang nilai sempit agar banyak skor seri (urutan seri = slot menaik)
+    columns = {}
+    for name in COLUMN_FIELDS:
+        if name == "traffic":
+            columns[name] = rng.integers(0, 40, size=(SIZE, 24), dtype=np.int32)
+        elif name.endswith("_total"):
+            columns[name] = rng.integers(0, 80, size=SIZE, dtype=np.int32)
+        else:
+            columns[name] = rng.integers(0, 40, size=SIZE, dtype=np.int32)
+    return columns
+
+def changed(columns, rng, count):
+    columns = {name: array.copy() for name, array in columns.items()}
+    slots = rng.choice(SIZE, size=count, replace=False)
+    for name in rng.choice([name for name in COLUMN_FIELDS if name != "traffic"], size=3, replace=False):
+        columns[name][slots] = rng.integers(0, 80, size=count, dtype=np.int32)
+    return columns
+
+def assert_same(index, rebuilt):
+    for name, values in rebuilt.features.items():
+        assert np.array_equal(index.features[name], values), name
+    for name, values in rebuilt.tiers.items():
+        assert np.array_equal(index.tiers[name], values), name
+    assert np.array_equal(index.points, rebuilt.points)
+    for key in KEYS:
+        for ours, expected in zip(index.ranking(key), rebuilt.ranking(key)):
+            assert np.array_equal(ours, expected), key
+
+@pytest.mark.parametrize("seed", range(20))
+def test_incremental_update_matches_rebuild(seed):
+    rng = np.random.default_rng(seed)
+    types = ("Tipe A", "Tipe B", "Tipe C", "Tipe D")
+    capability = CapabilityIndex([{"type": types[i % 4], "name": f"RS {i}"} for i in range(SIZE)])
+    arrays = random_columns(rng)
+    hour = int(rng.integers(0, 24))
+    index = ReferralIndex.build(HospitalColumns.from_arrays(arrays), hour, capability, KEYS)
+    for step in range(10):
+        # Sebagian besar langkah inkremental; sesekali lewat ambang rebuild atau ganti jam
+        count = int(rng.integers(0, SIZE * INDEX_REBUILD_FRACTION)) if step % 4 else int(SIZE * 0.5)
+        arrays = changed(arrays, rng, count)
+        if step == 7:
+            hour = (hour + 1) % 24
+        columns = HospitalColumns.from_arrays(arrays)
+        index = index.updated(columns, hour)
+        assert_same(index, ReferralIndex.build(columns, hour, capability, KEYS))
+
+def test_unchanged_columns_reuse_rankings():
+    rng = np.random.default_rng(0)
+    capability = CapabilityIndex([{"type": "Tipe B", "name": f"RS {i}"} for i in range(SIZE)])
+    columns = HospitalColumns.from_arrays(random_columns(rng))
+    index = ReferralIndex.build(columns, 3, capability, KEYS)
+    same = index.updated(columns, 3)
+    assert same.ranking(KEYS[0]) is index.ranking(KEYS[0])
@@ -0,0 +1,108 @@
+import json
+import os
+
+import pytest
+
+import registry
+from registry import REGISTRY_CACHE_SUFFIX, RegistryError, load_registry, parse_registry
+
+def hospital(id="RS001", **fields):
+    return {"id": id, "name": f"RS {id}", "type": "Tipe B", "address": "Jl. Dago, Kec. Coblong",
+            "lat": -6.89, "lon": 107.61, **fields}
+
+def write_json(path, records):
+    path.write_text(json.dumps(records))
+    return str(path)
+
+def test_loads_json(tmp_path):
+    path = write_json(tmp_path / "rs.json", [hospital("RS001"), hospital("RS002", name="RS Borromeus")])
+    loaded = load_registry(path)
+    assert len(loaded) == 2
+    assert loaded.get("RS002")["name"] == "RS Borromeus"
+    assert loaded.search("borromeus")[0] == 1
+
+def test_loads_csv(tmp_path):
+    path = tmp_path / "rs.csv"
+    # BOM Excel, spasi di sekitar nilai, specialties dipisah titik koma
+    path.write_bytes(
+        "\ufeffid,name,type,address,lat,lon,specialties\n"
+        "RS001, RS Satu ,Tipe A,Jl. Dago,-6.89,107.61,Jantung; Anak\n"
+        "RS002,RS Dua,Tipe C,Jl. Riau,-6.91,107.62,\n".encode("utf-8"))
+    loaded = load_registry(str(path))
+    first, second = loaded.records
+    assert first["name"] == "RS Satu" and first["lat"] == -6.89 and first["specialties"] == ["Jantung", "Anak"]
+    assert "specialties" not in second
+
+@pytest.mark.parametrize("lat, lon", [
+    ("-6.89", 107.61),
+    (float("nan"), 107.61),
+    (-6.89, float("inf")),
+    (True, 107.61),
+    (None, 107.61),
+    (-91, 107.61),
+    (-6.89, 181),
+    ([1], 107.61),
+])
+def test_json_rejects_invalid_location(tmp_path, lat, lon):
+    path = write_json(tmp_path / "rs.json", [hospital(lat=lat, lon=lon)])
+    with pytest.raises(RegistryError):
+        load_registry(path)
+
+@pytest.mark.parametrize("lat", ["nan", "inf", "utara", "", "95"])
+def test_csv_rejects_invalid_location(tmp_path, lat):
+    path = tmp_path / "rs.csv"
+    path.write_text(f"id,name,type,address,lat,lon\nRS001,RS,Tipe A,Jl. Dago,{lat},107.61\n")
+    with pytest.raises(RegistryError):
+        load_registry(str(path))
+
+@pytest.mark.parametrize("data", [
+    "{",
+    json.dumps({"id": "RS001"}),
+    json.dumps([hospital(), hospital()]),
+    json.dumps([hospital(name="")]),
+])
+def test_rejects_invalid_json(data):
+    with pytest.raises(RegistryError):
+        parse_registry(data.encode("utf-8"), "rs.json")
+
+def test_index_cache_reused_until_content_changes(tmp_path, monkeypatch):
+    path = write_json(tmp_path / "rs.json", [hospital("RS001")])
+    load_registry(path)
+    cache_path = path + REGISTRY_CACHE_SUFFIX
+    assert os.path.exists(cache_path)
+
+    parses = []
+    parse = registry.parse_registry
+    monkeypatch.setattr(registry, "parse_registry", lambda *args: parses.append(1) or parse(*args))
+    # Hanya mtime berubah (mis. checkout ulang): isi sama, cache tetap dipakai
+    os.utime(path, (0, 0))
+    assert len(load_registry(path)) == 1 and parses == []
+
+    write_json(tmp_path / "rs.json", [hospital("RS001"), hospital("RS002")])
+    assert len(load_registry(path)) == 2 and parses == [1]
+    # Cache ditulis ulang untuk isi baru
+    assert len(load_registry(path)) == 2 and parses == [1]
+
+def test_corrupt_or_stale_cache_is_rebuilt(tmp_path):
+    path = write_json(tmp_path / "rs.json", [hospital("RS001")])
+    cache_path = path + REGISTRY_CACHE_SUFFIX
+    load_registry(path)
+    with open(cache_path, "r+b") as f:
+        header = f.read(len(registry.REGISTRY_CACHE_MAGIC) + 20)
+        f.truncate(len(header) + 3)
+    assert load_registry(path).get("RS001") is not None
+    # Cache format lama (magic berbeda) diabaikan
+    with open(cache_path, "r+b") as f:
+        f.write(b"RSX0")
+    assert load_registry(path).get("RS001") is not None
+    with open(cache_path, "rb") as f:
+        assert f.read(4) == registry.REGISTRY_CACHE_MAGIC
+
+def test_cache_dir_separate_from_data(tmp_path):
+    data_dir, cache_dir = tmp_path / "data", tmp_path / "cache"
+    data_dir.mkdir()
+    cache_dir.mkdir()
+    path = write_json(data_dir / "rs.json", [hospital("RS001")])
+    load_registry(path, str(cache_dir))
+    assert os.listdir(cache_dir) == ["rs.json" + REGISTRY_CACHE_SUFFIX]
+    assert os.listdir(data_dir) == ["rs.json"]
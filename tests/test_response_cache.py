@@ -0,0 +1,123 @@
+import gzip
+import threading
+
+import pytest
+
+import main
+from response_cache import ENCODINGS, ResponseCache, compress
+
+def test_evicts_least_recently_used_first():
+    cache = ResponseCache(max_bytes=30)
+    for key in "abc":
+        cache.get(key, lambda: b"x" * 10)
+    # Hit memindahkan "a" ke ujung LRU, jadi "b" yang tergeser
+    assert cache.get("a", lambda: pytest.fail("a seharusnya hit")) == b"x" * 10
+    cache.get("d", lambda: b"y" * 10)
+    assert list(cache._entries) == ["c", "a", "d"]
+    assert cache.stats()["evictions"] == 1 and cache.stats()["bytes"] == 30
+    cache.get("e", lambda: b"z" * 20)
+    assert list(cache._entries) == ["d", "e"]
+
+def test_oversized_body_is_returned_but_not_stored():
+    cache = ResponseCache(max_bytes=10)
+    cache.get("a", lambda: b"x" * 5)
+    assert cache.get("big", lambda: b"y" * 11) == b"y" * 11
+    assert list(cache._entries) == ["a"]
+
+def test_concurrent_misses_build_once():
+    cache = ResponseCache()
+    started, release = threading.Event(), threading.Event()
+    calls, results = [], []
+
+    def build():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return b"body"
+
+    def fetch():
+        results.append(cache.get("key", build))
+
+    threads = [threading.Thread(target=fetch) for _ in range(8)]
+    threads[0].start()
+    assert started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    while cache.stats()["coalesced"] < 7:
+        threading.Event().wait(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert calls == [1] and results == [b"body"] * 8
+    assert cache.stats()["misses"] == 1 and cache.stats()["coalesced"] == 7
+
+def test_failed_build_propagates_to_waiters_and_is_not_cached():
+    cache = ResponseCache()
+    started, release = threading.Event(), threading.Event()
+    errors = []
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("gagal")
+
+    def fetch():
+        try:
+            cache.get("key", failing)
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=fetch) for _ in range(3)]
+    threads[0].start()
+    assert started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    while cache.stats()["coalesced"] < 2:
+        threading.Event().wait(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(errors) == 3
+    assert cache.get("key", lambda: b"ok") == b"ok"
+
+def test_small_body_is_not_compressed():
+    cache = ResponseCache()
+    assert cache.encoded("k", lambda: b"{}", "gzip") == (b"{}", "identity")
+
+def test_compressed_variant_built_from_identity_body():
+    cache = ResponseCache()
+    body = b"[" + b"1," * 2000 + b"1]"
+    encoded, encoding = cache.encoded("k", lambda: body, "gzip")
+    assert encoding == "gzip" and gzip.decompress(encoded) == body
+    assert cache.encoded("k", lambda: pytest.fail("identity seharusnya hit"), "gzip") == (encoded, "gzip")
+    assert cache.encoded("k", lambda: pytest.fail("identity seharusnya hit")) == (body, "identity")
+
+def test_brotli_variant_when_available():
+    brotli = pytest.importorskip("brotli")
+    body = b"[" + b"1," * 2000 + b"1]"
+    encoded, encoding = ResponseCache().encoded("k", lambda: body, "br")
+    assert encoding == "br" and brotli.decompress(encoded) == body
+
+@pytest.mark.parametrize("accept, expected", [
+    ("gzip", "gzip"),
+    ("br, gzip;q=0.5", "br" if "br" in ENCODINGS else "gzip"),
+    # Tanpa paket brotli permintaan br saja jatuh ke identity
+    ("br", "br" if "br" in ENCODINGS else None),
+    ("gzip;q=0", None),
+    ("identity", None),
+    ("", None),
+])
+def test_accept_encoding_negotiation(accept, expected):
+    client = main.app.test_client()
+    identity = client.get("/api/beds", headers={"Accept-Encoding": "identity"}).data
+    response = client.get("/api/beds", headers={"Accept-Encoding": accept})
+    assert response.headers.get("Content-Encoding") == expected
+    assert "Accept-Encoding" in response.headers["Vary"]
+    if expected == "gzip":
+        assert gzip.decompress(response.data) == identity
+    elif expected is None:
+        assert response.data == identity
+
+def test_unsupported_encoding_rejected():
+    with pytest.raises(ValueError):
+        compress(b"x", "deflate")
@@ -0,0 +1,111 @@
+import itertools
+import threading
+import time
+
+import main
+import sharding
+from sharding import RemoteShard, group_by_region, merge_ranked
+
+class FakeRemoteShard(RemoteShard):
+    """RemoteShard dengan RPC palsu; ``state_since`` pertama tertahan sampai ``release`` (maks. 0.5 s)"""
+
+    def __init__(self):
+        super().__init__("Kota Uji", None, None, None, main._record_key)
+        self.versions = itertools.count(1)
+        self.release = threading.Event()
+        self.sections = {"emergency": ({"hospital_id": "RS1"}, {"hospital_id": "RS2"})}
+
+    def call(self, method, *args):
+        if method == "state_since":
+            version = next(self.versions)
+            if version == 1:
+                self.release.wait(0.5)
+            return ("uji", version), "", self.sections, None
+        return 0
+
+def test_slow_refresh_does_not_overwrite_newer_state(monkeypatch):
+    monkeypatch.setattr(sharding, "SHARD_POLL_SECONDS", 60)
+    shard = FakeRemoteShard()
+    slow = threading.Thread(target=shard.state)
+    slow.start()
+    time.sleep(0.05)
+    # Tulis dari thread lain selama refresh pertama masih berjalan
+    shard.apply([])
+    assert shard.state()[0] == ("uji", 2)
+    shard.release.set()
+    slow.join()
+    assert shard.state()[0] == ("uji", 2)
+    assert shard.record("emergency", "RS2") == {"hospital_id": "RS2"}
+
+def test_group_by_region_and_merge_ranked():
+    hospitals = [
+        {"id": "A", "address": "Jl. X, Kec. Y, Kota Bandung"},
+        {"id": "B", "address": "Jl. X, Kec. Z, Kab. Bandung"},
+        {"id": "C", "address": "Jl. X, Kec. W, Kota Bandung"},
+        {"id": "D", "region": "Kota Cimahi"}
+    ]
+    ordered, ranges = group_by_region(hospitals)
+    assert [h["id"] for h in ordered] == ["A", "C", "B", "D"]
+    assert ranges == [("Kota Bandung", 0, 2), ("Kab. Bandung", 2, 3), ("Kota Cimahi", 3, 4)]
+
+    ranked = [[(0, {"score": 70}), (1, {"score": 50})], [(2, {"score": 70}), (3, {"score": 60})]]
+    assert [r["score"] for r in merge_ranked(ranked, 3)] == [70, 70, 60]
+
+def make_sharded():
+    hospitals, ranges = group_by_region(main.HOSPITALS)
+    ranges = ranges[:2]
+    hospitals = hospitals[:ranges[-1][2]]
+    shards = [main.RegionShard(region, main.HospitalStateStore(hospitals[start:end]))
+              for region, start, end in ranges]
+    return main.ShardedStateStore(hospitals, ranges, shards), shards
+
+def bump(shard):
+    record = shard.store.snapshot().emergency[0]
+    shard.apply([{"hospital_id": record["hospital_id"], "section": "emergency", "polyclinic": None,
+                  "values": {"waiting_patients": record["waiting_patients"] + 1}}])
+
+def test_version_vector_survives_shard_restart():
+    store, shards = make_sharded()
+    for _ in range(3):
+        bump(shards[0])
+    before = store.snapshot()
+    # Restart shard 0: epoch baru, versi mulai dari awal (jumlah versi shard turun)
+    old = shards[0].store
+    shards[0].store = main.HospitalStateStore(old.hospitals)
+    assert shards[0].store.version < old.version
+    after = store.snapshot()
+    assert after is not before and after.version > before.version
+    # Shard lain naik setelahnya: tetap terdeteksi meski jumlah versi mentah belum melewati yang lama
+    bump(shards[1])
+    assert store.snapshot().version > after.version
+    # Perubahan di shard yang di-restart juga dipakai
+    bump(shards[0])
+    latest = store.snapshot()
+    assert latest.version > after.version and store.snapshot() is latest
+
+def test_stale_shard_state_does_not_regress_snapshot():
+    store, shards = make_sharded()
+    stale = shards[0].state()
+    bump(shards[0])
+    bump(shards[1])
+    current = store.snapshot()
+    fresh = shards[0].state
+    shards[0].state = lambda: stale
+    bump(shards[1])
+    # Shard 0 mundur, shard 1 maju: shard 0 tetap dari snapshot sebelumnya
+    mixed = store.snapshot()
+    assert mixed.version == current.version + 1
+    assert mixed.emergency[:len(stale[2]["emergency"])] == current.emergency[:len(stale[2]["emergency"])]
+    shards[0].state = fresh
+    assert store.snapshot() is mixed
+
+def test_state_from_retired_epoch_is_ignored():
+    store, shards = make_sharded()
+    old_state = shards[0].state()
+    shards[0].store = main.HospitalStateStore(shards[0].store.hospitals)
+    restarted = store.snapshot()
+    fresh = shards[0].state
+    shards[0].state = lambda: old_state
+    assert store.snapshot() is restarted
+    shards[0].state = fresh
+    assert store.combined_version([shard.state()[0] for shard in shards]) == restarted.version
@@ -0,0 +1,80 @@
+import multiprocessing
+import pickle
+
+import pytest
+
+from shared_state import SHARED_SEQ, SHARED_SLOT_MIN_BYTES, SharedStateBuffer
+
+PAYLOAD_BYTES = 1024 * 1024
+
+class ProbeBuffer(SharedStateBuffer):
+    """Catat ``seq`` setiap kali offset slot dihitung (tepat sebelum payload disalin)"""
+
+    def __init__(self, shm, slot_bytes):
+        super().__init__(shm, slot_bytes)
+        self.seen = []
+
+    def _slot_offset(self, slot):
+        self.seen.append(SHARED_SEQ.unpack_from(self.shm.buf, 0)[0])
+        return super()._slot_offset(slot)
+
+@pytest.fixture
+def buffer():
+    buffer = SharedStateBuffer.create(slot_bytes=PAYLOAD_BYTES)
+    yield buffer
+    buffer.close(unlink=True)
+
+def payload_for(version):
+    return bytes([version % 251]) * PAYLOAD_BYTES
+
+def test_write_read_roundtrip(buffer):
+    buffer.write(1, b"satu")
+    buffer.write(2, b"dua")
+    assert buffer.read() == (2, b"dua")
+    assert buffer.version() == 2
+
+def test_payload_written_while_seq_is_odd():
+    probe = ProbeBuffer.create(slot_bytes=1024)
+    try:
+        for version in range(1, 5):
+            probe.seen.clear()
+            probe.write(version, b"x" * version)
+            assert probe.seen[-1] % 2 == 1
+            assert SHARED_SEQ.unpack_from(probe.shm.buf, 0)[0] % 2 == 0
+    finally:
+        probe.close(unlink=True)
+
+def test_oversized_payload_rejected(buffer):
+    with pytest.raises(ValueError):
+        buffer.write(1, b"x" * (PAYLOAD_BYTES + 1))
+
+def test_slot_sized_from_snapshot():
+    size = int(71.5 * 1024 * 1024)
+    assert SharedStateBuffer.slot_bytes_for(size) > size
+    assert SharedStateBuffer.slot_bytes_for(10) == SHARED_SLOT_MIN_BYTES
+
+def _publish(name, count):
+    from multiprocessing import shared_memory
+    shm = shared_memory.SharedMemory(name=name)
+    writer = SharedStateBuffer(shm, PAYLOAD_BYTES)
+    for version in range(1, count + 1):
+        writer.write(version, payload_for(version))
+    writer.close()
+
+def test_reader_never_sees_torn_payload_across_processes(buffer):
+    buffer.write(0, payload_for(0))
+    process = multiprocessing.get_context("fork").Process(target=_publish, args=(buffer.name, 3000))
+    process.start()
+    reads = 0
+    while process.is_alive() or reads == 0:
+        version, payload = buffer.read()
+        assert payload == payload_for(version)
+        reads += 1
+    process.join()
+    assert process.exitcode == 0
+    assert buffer.read() == (3000, payload_for(3000))
+
+def test_reader_unpickles_published_snapshot(buffer):
+    buffer.write(7, pickle.dumps({"version": 7}))
+    version, payload = buffer.read()
+    assert version == 7 and pickle.loads(payload) == {"version": 7}
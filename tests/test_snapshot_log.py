@@ -0,0 +1,152 @@
+from datetime import datetime
+import time
+
+import numpy as np
+import pytest
+
+import main
+from columnar import COLUMN_FIELDS
+import snapshot_log
+from snapshot_log import SnapshotLog
+
+FINGERPRINT = "registry-test"
+
+def open_log(directory):
+    return SnapshotLog(str(directory), main.STATE_SECTIONS, main._record_key, 1)
+
+def wait_logged(log, version, timeout=10):
+    deadline = time.monotonic() + timeout
+    while log.latest_version() < version:
+        assert time.monotonic() < deadline, "log tidak menyusul store"
+        time.sleep(0.01)
+
+def assert_state(state, snapshot):
+    assert state.version == snapshot.version
+    for name in main.STATE_SECTIONS:
+        assert list(state.sections[name]) == list(snapshot.section(name)), name
+    for name in COLUMN_FIELDS:
+        assert np.array_equal(state.columns[name], snapshot.columns[name]), name
+
+@pytest.fixture
+def logged(tmp_path):
+    """Store yang dicatat log, dengan beberapa versi ingest dan satu refresh simulasi"""
+    store = main.HospitalStateStore(main.HOSPITALS, tick_interval=0)
+    log = open_log(tmp_path)
+    log.attach(store, FINGERPRINT)
+    log.start()
+    wait_logged(log, store.version)
+    hospital_id = main.HOSPITALS[0]["id"]
+    snapshots = []
+    for waiting in (5, 9, 13):
+        store.update(hospital_id, "emergency", {"waiting_patients": waiting})
+        wait_logged(log, store.version)
+        snapshots.append(store.snapshot())
+    store.update(main.HOSPITALS[1]["id"], "beds", {"icu": {"occupied": 1}})
+    store.refresh()
+    wait_logged(log, store.version)
+    snapshots.append(store.snapshot())
+    return tmp_path, store, snapshots
+
+def test_restart_restores_latest_state(logged):
+    directory, store, _ = logged
+    state = open_log(directory).restore(FINGERPRINT)
+    assert_state(state, store.snapshot())
+    assert state.external == store.external_keys()
+
+    restarted = main.HospitalStateStore(main.HOSPITALS, tick_interval=0, restore=state)
+    assert restarted.version > store.version
+    restarted.refresh()
+    # Record dari ingest tidak ditimpa simulasi setelah restart
+    assert restarted.record("emergency", main.HOSPITALS[0]["id"])["waiting_patients"] == 13
+    assert restarted.record("beds", main.HOSPITALS[1]["id"])["icu"]["occupied"] == 1
+
+def test_restore_rejects_other_registry(logged):
+    directory, _, _ = logged
+    assert open_log(directory).restore("registry-lain") is None
+
+def test_replay_returns_state_at_each_version(logged):
+    directory, _, snapshots = logged
+    log = open_log(directory)
+    for snapshot in snapshots:
+        assert_state(log.state_at(datetime.fromisoformat(snapshot.timestamp).timestamp()), snapshot)
+    assert log.state_at(0) is None
+
+def test_replay_reuses_last_state_when_moving_forward(logged, monkeypatch):
+    directory, _, snapshots = logged
+    log = open_log(directory)
+    reads = []
+    read_checkpoint = log._read_checkpoint
+    monkeypatch.setattr(log, "_read_checkpoint", lambda *args: reads.append(args) or read_checkpoint(*args))
+    times = [datetime.fromisoformat(snapshot.timestamp).timestamp() for snapshot in snapshots]
+    for at, snapshot in zip(times, snapshots):
+        assert_state(log.state_at(at, FINGERPRINT), snapshot)
+    assert len(reads) == 1
+    # Mundur ke waktu sebelum state cache: mulai lagi dari checkpoint
+    assert_state(log.state_at(times[0], FINGERPRINT), snapshots[0])
+    assert len(reads) == 2
+    # State yang dikembalikan tidak ikut berubah saat cache maju
+    first = log.state_at(times[0], FINGERPRINT)
+    log.state_at(times[-1], FINGERPRINT)
+    assert first.version == snapshots[0].version
+    assert first.sections["emergency"][0]["waiting_patients"] == 5
+
+def test_replay_rejects_other_registry(logged, monkeypatch):
+    directory, _, snapshots = logged
+    at = datetime.fromisoformat(snapshots[-1].timestamp).timestamp()
+    with pytest.raises(snapshot_log.RegistryMismatch):
+        open_log(directory).state_at(at, "registry-lain")
+    monkeypatch.setattr(main, "snapshot_log", open_log(directory))
+    response = main.app.test_client().get(f"/api/replay?at={at}")
+    assert response.status_code == 409
+    assert "error" in response.get_json()
+
+def test_restart_appends_to_existing_segment(logged):
+    directory, store, _ = logged
+    log = open_log(directory)
+    state = log.restore(FINGERPRINT)
+    restarted = main.HospitalStateStore(main.HOSPITALS, tick_interval=0, restore=state, version=state.version)
+    log.attach(restarted, FINGERPRINT)
+    log.start()
+    restarted.update(main.HOSPITALS[2]["id"], "emergency", {"waiting_patients": 21})
+    wait_logged(log, restarted.version)
+    assert_state(open_log(directory).restore(FINGERPRINT), restarted.snapshot())
+
+@pytest.mark.parametrize("at", ["inf", "-inf", "nan", "1e20", "1e12", "bukan-waktu"])
+def test_replay_route_rejects_out_of_range_at(at):
+    response = main.app.test_client().get(f"/api/replay?at={at}")
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+def test_write_error_is_logged_and_recovered(tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(snapshot_log, "STATE_LOG_RETRY_SECONDS", 0.01)
+    store = main.HospitalStateStore(main.HOSPITALS, tick_interval=0)
+    log = open_log(tmp_path)
+    log.attach(store, FINGERPRINT)
+    log.start()
+    wait_logged(log, store.version)
+
+    write_frame = log._write_frame
+    failures = iter([OSError(28, "No space left on device")])
+
+    def flaky(previous, snapshot):
+        error = next(failures, None)
+        if error is not None:
+            raise error
+        write_frame(previous, snapshot)
+
+    monkeypatch.setattr(log, "_write_frame", flaky)
+    store.update(main.HOSPITALS[0]["id"], "emergency", {"waiting_patients": 31})
+    wait_logged(log, store.version)
+    deadline = time.monotonic() + 10
+    while log.failing:
+        assert time.monotonic() < deadline, "log tidak pulih dari kegagalan"
+        time.sleep(0.01)
+
+    stats = log.stats()
+    assert stats["errors"] == 1 and stats["running"] and not stats["failing"]
+    assert "Gagal menulis log state" in caplog.text
+    # Setelah gagal, state terbaru masuk checkpoint baru dan bisa dipulihkan
+    assert_state(open_log(tmp_path).restore(FINGERPRINT), store.snapshot())
+    store.update(main.HOSPITALS[0]["id"], "emergency", {"waiting_patients": 32})
+    wait_logged(log, store.version)
+    assert_state(open_log(tmp_path).restore(FINGERPRINT), store.snapshot())
@@ -0,0 +1,46 @@
+import json
+import math
+
+import pytest
+
+import main
+
+@pytest.fixture
+def store():
+    return main.HospitalStateStore(main.HOSPITALS, tick_interval=0)
+
+def test_failed_apply_leaves_records_and_columns_consistent(store):
+    hospital_id = main.HOSPITALS[0]["id"]
+    before = store.snapshot()
+    with pytest.raises((OverflowError, ValueError)):
+        store.apply([
+            {"hospital_id": hospital_id, "section": "emergency", "values": {"waiting_patients": 3}},
+            {"hospital_id": hospital_id, "section": "beds", "values": {"icu": {"total": 3_000_000_000}}}
+        ])
+    assert store.snapshot() is before
+    assert store.record("beds", hospital_id)["icu"]["total"] == before.beds[0]["icu"]["total"]
+    assert store.record("emergency", hospital_id) is before.emergency[0]
+    assert not store.is_external("emergency", hospital_id)
+
+    # Penulisan berikutnya tetap memakai state lama yang utuh
+    snapshot = store.apply([{"hospital_id": hospital_id, "section": "emergency", "values": {"waiting_patients": 3}}])
+    assert snapshot.version == before.version + 1
+    assert int(snapshot.columns["er_waiting"][0]) == 3
+    assert snapshot.overview["total_er_patients"] == sum(
+        r["waiting_patients"] + r["in_treatment"] for r in snapshot.emergency)
+
+def test_zero_totals_produce_valid_json(store):
+    hospital_id = main.HOSPITALS[0]["id"]
+    snapshot = store.apply([
+        {"hospital_id": hospital_id, "section": "beds", "values": {
+            bed_type: {"total": 0, "occupied": 0} for bed_type in ("icu", "regular", "isolation")}},
+        {"hospital_id": hospital_id, "section": "staff", "values": {
+            "staff": {"doctors": {"total": 0, "on_duty": 0}}}}
+    ])
+    charts = snapshot.visualizations
+    assert charts["occupancy_by_hospital"][0]["occupancy_rate"] == 0.0
+    json.dumps(charts, allow_nan=False)
+
+    index = main.ReferralIndex.build(snapshot.columns, 10, main.referral_context.capability_index)
+    assert all(math.isfinite(v) for v in index.features["occupancy_rate"])
+    assert all(math.isfinite(v) for v in index.features["doctor_ratio"])
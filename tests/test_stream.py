@@ -0,0 +1,157 @@
+import json
+import threading
+import time
+
+import pytest
+
+import main
+from stream import StreamHub, diff_snapshots
+
+def parse(message):
+    """``(id, event, data)`` dari satu event SSE"""
+    fields = dict(line.split(": ", 1) for line in message.decode("utf-8").strip().split("\n"))
+    return fields["id"], fields["event"], json.loads(fields["data"])
+
+def wait_replayed(hub, version, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not hub._replay or hub._replay[-1][0] < version:
+        assert time.monotonic() < deadline, "hub tidak menyusul store"
+        time.sleep(0.01)
+
+@pytest.fixture
+def store():
+    return main.HospitalStateStore(main.HOSPITALS, tick_interval=0)
+
+def make_hub(store, listen=True, **options):
+    hub = StreamHub(
+        epoch=store.epoch,
+        sections=main.STATE_SECTIONS,
+        record_key=main._record_key,
+        snapshot_payload=lambda snapshot: {"version": snapshot.version},
+        **options
+    )
+    if listen:
+        store.add_listener(hub.on_publish)
+    hub.start()
+    return hub
+
+def keyed_diff(previous, snapshot):
+    """Diff lewat pencarian kunci (perilaku lama) sebagai pembanding"""
+    class Padded:
+        # Satu record tambahan: panjang section beda, jalur indeks tidak dipakai
+        def section(self, name):
+            return previous.section(name) + ({"hospital_id": "RS-LAIN", "polyclinic": "-"},)
+    return diff_snapshots(Padded(), snapshot, main.STATE_SECTIONS, main._record_key)
+
+def sort_changes(changes):
+    return sorted(changes, key=lambda change: json.dumps(change, sort_keys=True))
+
+def test_diff_by_position_matches_diff_by_key(store):
+    previous = store.snapshot()
+    store.update(main.HOSPITALS[0]["id"], "emergency", {"waiting_patients": 40})
+    store.update(main.HOSPITALS[3]["id"], "beds", {"icu": {"occupied": 2}})
+    store.refresh()
+    snapshot = store.snapshot()
+    changes = diff_snapshots(previous, snapshot, main.STATE_SECTIONS, main._record_key)
+    emergency = [change for change in changes if change["section"] == "emergency"]
+    assert emergency[0]["hospital_id"] == main.HOSPITALS[0]["id"]
+    assert emergency[0]["changes"]["waiting_patients"] == 40
+    assert sort_changes(changes) == sort_changes(keyed_diff(previous, snapshot))
+
+def test_resume_from_last_event_id_sends_only_missed_deltas(store):
+    hub = make_hub(store)
+    hospital_id = main.HOSPITALS[0]["id"]
+    store.update(hospital_id, "emergency", {"waiting_patients": 1})
+    seen = store.version
+    for waiting in (2, 3):
+        store.update(hospital_id, "emergency", {"waiting_patients": waiting})
+    wait_replayed(hub, store.version)
+
+    client = hub.stream(store.snapshot, hub.event_id(seen))
+    assert next(client) == b"retry: 3000\n\n"
+    events = [parse(next(client)) for _ in range(2)]
+    assert [event for _, event, _ in events] == ["delta", "delta"]
+    assert [data["version"] for _, _, data in events] == [seen + 1, seen + 2]
+    assert events[-1][2]["changes"][0]["changes"] == {"waiting_patients": 3}
+    client.close()
+
+@pytest.mark.parametrize("last_event_id", ["epoch-lain-1", "bukan-id", None])
+def test_unknown_last_event_id_gets_snapshot(store, last_event_id):
+    hub = make_hub(store)
+    store.update(main.HOSPITALS[0]["id"], "emergency", {"waiting_patients": 1})
+    wait_replayed(hub, store.version)
+    client = hub.stream(store.snapshot, last_event_id)
+    next(client)
+    _, event, data = parse(next(client))
+    assert event == "snapshot" and data == {"version": store.version}
+    client.close()
+
+def test_last_event_id_outside_replay_buffer_gets_snapshot(store):
+    hub = make_hub(store, replay_size=2)
+    seen = store.version
+    for waiting in range(4):
+        store.update(main.HOSPITALS[0]["id"], "emergency", {"waiting_patients": waiting})
+    wait_replayed(hub, store.version)
+    client = hub.stream(store.snapshot, hub.event_id(seen))
+    next(client)
+    assert parse(next(client))[1] == "snapshot"
+    client.close()
+
+def test_lagged_client_resyncs_with_snapshot(store):
+    hub = make_hub(store, client_buffer=2)
+    client = hub.stream(store.snapshot)
+    next(client)
+    assert parse(next(client))[1] == "snapshot"
+    for waiting in range(5):
+        store.update(main.HOSPITALS[0]["id"], "emergency", {"waiting_patients": waiting})
+    wait_replayed(hub, store.version)
+
+    events = []
+    while not events or events[-1][1] != "snapshot":
+        events.append(parse(next(client)))
+    assert events[-1][2] == {"version": store.version}
+    # Setelah resync klien kembali menerima delta biasa
+    store.update(main.HOSPITALS[0]["id"], "emergency", {"waiting_patients": 9})
+    _, event, data = parse(next(client))
+    assert event == "delta" and data["version"] == store.version
+    client.close()
+
+def test_delta_with_missing_base_triggers_resync(store):
+    # Tanpa listener: pasangan snapshot dikirim manual, seolah antrean hub membuang satu
+    hub = make_hub(store, listen=False)
+    client = hub.stream(store.snapshot)
+    next(client)
+    assert parse(next(client))[2] == {"version": store.version}
+    snapshots = []
+    for waiting in (11, 12, 13):
+        store.update(main.HOSPITALS[0]["id"], "emergency", {"waiting_patients": waiting})
+        snapshots.append(store.snapshot())
+    hub.publish_delta(snapshots[0], snapshots[1])
+    _, event, data = parse(next(client))
+    assert event == "snapshot" and data == {"version": store.version}
+    store.update(main.HOSPITALS[0]["id"], "emergency", {"waiting_patients": 14})
+    hub.publish_delta(snapshots[2], store.snapshot())
+    _, event, data = parse(next(client))
+    assert event == "delta" and data["changes"][0]["changes"] == {"waiting_patients": 14}
+    client.close()
+
+def test_slow_consumer_does_not_block_publish_and_is_evicted_on_close(store):
+    hub = make_hub(store, client_buffer=1)
+    client = hub.stream(store.snapshot)
+    next(client)
+    assert hub.client_count == 1
+    done = threading.Event()
+
+    def publish():
+        for waiting in range(50):
+            store.update(main.HOSPITALS[0]["id"], "emergency", {"waiting_patients": waiting})
+        done.set()
+
+    threading.Thread(target=publish).start()
+    # Klien tidak membaca sama sekali: penulis tetap selesai
+    assert done.wait(10)
+    wait_replayed(hub, store.version)
+    subscriber, = hub._subscribers
+    assert subscriber.lagged and subscriber.queue.qsize() == 1
+    client.close()
+    assert hub.client_count == 0
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+import main
+from timeseries import TimeSeriesStore
+
+START = 1767225600
+
+@pytest.fixture
+def store():
+    history = TimeSeriesStore(["RS1", "RS2"], ("occupancy_rate",), retention_days=2)
+    for minute, value in enumerate([10.0, 20.0, 30.0, 40.0]):
+        history.record(START + minute * 60, {"occupancy_rate": np.array([value, np.nan])})
+    return history
+
+def test_rollup_aggregates(store):
+    end = START + 3 * 60
+    for agg, expected in (("avg", 25.0), ("min", 10.0), ("max", 40.0), ("last", 40.0)):
+        _, _, data = store.query("occupancy_rate", START, end, "1h", agg)
+        assert data[0, -1] == expected
+        assert np.isnan(data[1, -1])
+
+def test_minute_tier_only_supports_last(store):
+    _, _, data = store.query("occupancy_rate", START, START + 3 * 60, "1m", "last")
+    assert data[0].tolist() == [10.0, 20.0, 30.0, 40.0]
+    for agg in ("avg", "min", "max"):
+        with pytest.raises(ValueError):
+            store.query("occupancy_rate", START, START + 3 * 60, "1m", agg)
+
+def test_history_route_minute_resolution():
+    client = main.app.test_client()
+    assert client.get("/api/history?resolution=1m").status_code == 200
+    assert client.get("/api/history?resolution=1m&agg=last").status_code == 200
+    assert client.get("/api/history?resolution=1m&agg=avg").status_code == 400
+
+def test_publish_samples_history_once_per_interval(monkeypatch):
+    history = TimeSeriesStore([h["id"] for h in main.HOSPITALS], main.HISTORY_METRICS, retention_days=1)
+    calls = []
+    record = history.record
+    monkeypatch.setattr(history, "record", lambda *args: (calls.append(args), record(*args)))
+    store = main.HospitalStateStore(main.HOSPITALS, tick_interval=0, history=history)
+    trends = store.snapshot().trends
+    for _ in range(5):
+        store.refresh()
+    assert len(calls) == 1
+    assert store.snapshot().trends is trends
+    monkeypatch.setattr(main, "HISTORY_SAMPLE_SECONDS", 0)
+    store.refresh()
+    assert len(calls) == 2
+
+@pytest.mark.parametrize("query", ["end=inf", "end=nan", "end=1e300", "end=1e12", "start=-1e12",
+                                   "start=1e12&end=1e12", "end=99999-01-01", "end=kemarin"])
+def test_history_route_rejects_out_of_range_time(query):
+    response = main.app.test_client().get(f"/api/history?{query}")
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+WIB = 7 * 3600
+
+@pytest.mark.parametrize("utc_offset, buckets", [(0, 1), (WIB, 2)])
+def test_daily_buckets_follow_local_midnight(utc_offset, buckets):
+    history = TimeSeriesStore(["RS1"], ("occupancy_rate",), retention_days=3, utc_offset=utc_offset)
+    # 23:30 dan 00:30 WIB: hari lokal berbeda, hari UTC sama
+    for hours, value in ((16.5, 10.0), (17.5, 30.0)):
+        history.record(START + hours * 3600, {"occupancy_rate": np.array([value])})
+    days, _, data = history.query("occupancy_rate", START + 16 * 3600, START + 18 * 3600, "1d", "avg")
+    assert len(days) == buckets
+    assert all((day + utc_offset) % 86400 == 0 for day in days)
+    assert data[0].tolist() == ([20.0] if buckets == 1 else [10.0, 30.0])
+
+def test_minute_tier_has_shorter_retention():
+    history = TimeSeriesStore(["RS1"], ("occupancy_rate",), retention_days=3, minute_retention_hours=1)
+    for minute in range(0, 180, 30):
+        history.record(START + minute * 60, {"occupancy_rate": np.array([float(minute)])})
+    end = START + 150 * 60
+    _, _, minutes = history.query("occupancy_rate", START, end, "1m", "last")
+    # Hanya 60 menit terakhir yang ada di tier 1m
+    assert minutes.shape[1] == 60
+    assert np.nanmax(minutes) == 150.0 and np.count_nonzero(~np.isnan(minutes)) == 2
+    _, _, hours = history.query("occupancy_rate", START, end, "1h", "last")
+    assert hours[0].tolist() == [30.0, 90.0, 150.0]
+    assert history.memory_bytes < TimeSeriesStore(["RS1"], ("occupancy_rate",), retention_days=3,
+                                                  minute_retention_hours=72).memory_bytes
+
+def test_restore_requires_same_bucket_layout(tmp_path):
+    history = TimeSeriesStore(["RS1"], ("occupancy_rate",), retention_days=2, directory=str(tmp_path))
+    history.record(START, {"occupancy_rate": np.array([50.0])})
+    history.persist()
+    assert TimeSeriesStore(["RS1"], ("occupancy_rate",), retention_days=2, directory=str(tmp_path)).restored
+    for options in ({"utc_offset": WIB}, {"minute_retention_hours": 6}):
+        assert not TimeSeriesStore(["RS1"], ("occupancy_rate",), retention_days=2, directory=str(tmp_path),
+                                   **options).restored
+    # File sudah ditimpa layout lain tanpa persist: tidak boleh dipulihkan sebagai layout awal
+    assert not TimeSeriesStore(["RS1"], ("occupancy_rate",), retention_days=2, directory=str(tmp_path)).restored
@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+from triage import (NON_URGENT, SEVERITY_LEVELS, TRIAGE_MATCHER, TriageMatcher, analyze_severity,
+                    analyze_severity_many)
+
+def substring_triage(complaint):
+    """Implementasi lama: cek substring per keyword, level demi level"""
+    text = complaint.lower()
+    for code, label, keywords in SEVERITY_LEVELS:
+        matched = {keyword for keyword in keywords if keyword in text}
+        if matched:
+            return code, label, matched
+    return NON_URGENT + (set(),)
+
+FRAGMENTS = [keyword for _, _, keywords in SEVERITY_LEVELS for keyword in keywords] + [
+    "sesa", "nyer", "dad", "jan", "mun", "tah", "ter", "sakit", "perut", "kepala",
+    "parah", "hebat", "a", "k", " ", " ", "  ", ",", ".", "-", "pasien", "sejak", "pagi"
+]
+
+def random_complaint(rng):
+    parts = [rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 8))]
+    text = "".join(part if rng.random() < 0.5 else " " + part for part in parts)
+    return "".join(ch.upper() if rng.random() < 0.2 else ch for ch in text)
+
+@pytest.mark.parametrize("seed", range(300))
+def test_matches_substring_loop_on_random_complaints(seed):
+    rng = random.Random(seed)
+    for _ in range(20):
+        complaint = random_complaint(rng)
+        code, label, matched = substring_triage(complaint)
+        result = TRIAGE_MATCHER.match(complaint)
+        assert (result["severity_code"], result["severity_text"]) == (code, label), complaint
+        assert set(result["matched_keywords"]) == matched, complaint
+        assert analyze_severity(complaint) == (code, label)
+
+@pytest.mark.parametrize("complaint, code, matched", [
+    # Keyword critical di dalam keyword urgent: level tertinggi menang
+    ("Sesak ringan sejak pagi", "critical", ["sesak"]),
+    ("serangan jantung", "critical", ["serangan jantung", "jantung"]),
+    # Keyword saling tumpang tindih ("darah muntah" / "muntah terus")
+    ("darah muntah terus", "critical", ["darah muntah"]),
+    ("muntah terus menerus", "urgent", ["muntah terus"]),
+    # Prefiks bersama: "nyeri" dan "nyeri perut" / "nyeri dada"
+    ("nyeri perut dan nyeri dada", "critical", ["nyeri dada"]),
+    ("nyeri perut", "urgent", ["nyeri perut"]),
+    ("nyeri", "semi_urgent", ["nyeri"]),
+    # Keyword yang melintasi batas keyword lain ("dada sakit" + "sakit kepala")
+    ("dada sakit kepala", "critical", ["dada sakit"]),
+    ("demam tinggi dan batuk", "urgent", ["demam tinggi"]),
+    ("DEMAM", "semi_urgent", ["demam"]),
+    ("kontrol rutin", "non_urgent", []),
+    ("", "non_urgent", []),
+])
+def test_fixed_cases(complaint, code, matched):
+    result = TRIAGE_MATCHER.match(complaint)
+    assert result["severity_code"] == code
+    assert sorted(result["matched_keywords"]) == sorted(matched)
+
+def test_level_order_decides_priority():
+    levels = [
+        ("high", "High", ["nyeri dada"]),
+        ("low", "Low", ["nyeri", "dada"]),
+    ]
+    matcher = TriageMatcher(levels)
+    assert matcher.match("nyeri dada")["severity_code"] == "high"
+    assert matcher.match("dada nyeri")["severity_code"] == "low"
+    # Keyword yang muncul di dua level mengikuti level pertama
+    matcher = TriageMatcher([("a", "A", ["batuk"]), ("b", "B", ["batuk", "flu"])])
+    assert matcher.match("batuk flu") == {"severity_code": "a", "severity_text": "A", "matched_keywords": ["batuk"]}
+
+def test_batch_matches_single():
+    complaints = ["nyeri dada", "batuk", None, "kontrol"]
+    results = analyze_severity_many(complaints)
+    assert [(result["severity_code"], result["severity_text"]) for result in results] == [
+        analyze_severity(complaint) for complaint in complaints
+    ]
@@ -0,0 +1,215 @@
+"""Penyimpanan time-series berbasis ring buffer NumPy per RS dan metrik"""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+# Resolusi -> lebar bucket (detik)
+RESOLUTIONS = {"1m": 60, "1h": 3600, "1d": 86400}
+AGGREGATES = ("min", "max", "avg", "last")
+HISTORY_RETENTION_DAYS = 90
+# Tier 1 menit jauh lebih besar per hari (1440 bucket/hari/RS/metrik): cukup
+# untuk memantau hari ini; rentang lebih panjang dibaca dari tier 1h/1d
+HISTORY_MINUTE_RETENTION_HOURS = 48
+
+class TimeSeriesStore:
+    """Ring buffer ber-ukuran tetap untuk setiap (metrik, RS, resolusi).
+
+    Tier 1 menit hanya menyimpan nilai terakhir per menit (retensi
+    ``minute_retention_hours``); tier 1 jam dan 1 hari menyimpan rollup
+    min/max/sum/count/last yang diperbarui saat penulisan, sehingga query
+    90 hari cukup membaca ribuan bucket, bukan ratusan ribu sampel.
+    Batas bucket mengikuti waktu lokal ``utc_offset`` (detik di timur UTC):
+    bucket 1d dimulai tengah malam lokal, bukan tengah malam UTC. Satu
+    array ``stamp`` per tier menandai bucket mana yang sedang menempati
+    tiap posisi ring, jadi data lama tertimpa tanpa perlu dibersihkan dan
+    memori tetap sebesar ``memory_bytes``.
+
+    Dengan ``directory`` setiap array punya salinan file ``.npy``.
+    Penulisan tetap ke memori; ``persist()`` menyalin hanya bucket yang
+    berubah sejak persist sebelumnya ke file. Saat restart file dengan
+    RS/metrik/retensi yang sama di-mmap copy-on-write (``restored`` = True),
+    jadi riwayat langsung tersedia tanpa dibaca penuh.
+    """
+
+    def __init__(self, series_ids, metrics, retention_days=HISTORY_RETENTION_DAYS, directory=None,
+                 minute_retention_hours=HISTORY_MINUTE_RETENTION_HOURS, utc_offset=0):
+        self.series_ids = list(series_ids)
+        self.metrics = tuple(metrics)
+        self._slot = {series_id: i for i, series_id in enumerate(self.series_ids)}
+        self._metric = {metric: i for i, metric in enumerate(self.metrics)}
+        self.retention_seconds = retention_days * 86400
+        self.minute_retention_seconds = min(minute_retention_hours * 3600, self.retention_seconds)
+        self.utc_offset = int(utc_offset)
+        self.directory = directory
+        self.restored = directory is not None and self._layout_matches()
+        self._complete = self.restored
+        # resolusi -> [bucket terkecil, terbesar] yang ditulis sejak persist terakhir
+        self._dirty = {}
+        self._files = {}
+
+        shape = (len(self.metrics), len(self.series_ids))
+        self._tiers = {}
+        for resolution, step in RESOLUTIONS.items():
+            retention = self.minute_retention_seconds if resolution == "1m" else self.retention_seconds
+            capacity = retention // step
+            tier = {
+                "step": step,
+                "capacity": capacity,
+                "stamp": self._array(f"{resolution}-stamp", (capacity,), np.int64, -1),
+                "last": self._array(f"{resolution}-last", shape + (capacity,), np.float32)
+            }
+            if resolution != "1m":
+                tier["min"] = self._array(f"{resolution}-min", shape + (capacity,), np.float32)
+                tier["max"] = self._array(f"{resolution}-max", shape + (capacity,), np.float32)
+                tier["sum"] = self._array(f"{resolution}-sum", shape + (capacity,), np.float64)
+                tier["count"] = self._array(f"{resolution}-count", shape + (capacity,), np.uint32)
+            self._tiers[resolution] = tier
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            if not self.restored:
+                # File .npy akan ditimpa dengan layout baru: layout.json lama tidak berlaku lagi
+                try:
+                    os.remove(os.path.join(directory, "layout.json"))
+                except FileNotFoundError:
+                    pass
+            for resolution, tier in self._tiers.items():
+                self._files[resolution] = {
+                    name: self._file(f"{resolution}-{name}", array)
+                    for name, array in tier.items() if isinstance(array, np.ndarray)
+                }
+
+    def _layout(self):
+        return {
+            "series": hashlib.sha1("\n".join(self.series_ids).encode("utf-8")).hexdigest(),
+            "metrics": list(self.metrics),
+            "retention_seconds": self.retention_seconds,
+            "minute_retention_seconds": self.minute_retention_seconds,
+            "utc_offset": self.utc_offset
+        }
+
+    def _layout_matches(self):
+        try:
+            with open(os.path.join(self.directory, "layout.json")) as f:
+                return json.load(f) == self._layout()
+        except (OSError, ValueError):
+            return False
+
+    def _array(self, name, shape, dtype, fill=0):
+        if self.restored:
+            return np.load(os.path.join(self.directory, f"{name}.npy"), mmap_mode="c")
+        return np.full(shape, fill, dtype=dtype)
+
+    def _file(self, name, array):
+        path = os.path.join(self.directory, f"{name}.npy")
+        if self.restored:
+            return np.load(path, mmap_mode="r+")
+        return np.lib.format.open_memmap(path, mode="w+", dtype=array.dtype, shape=array.shape)
+
+    def persist(self):
+        """Salin bucket yang berubah sejak persist terakhir ke file; no-op tanpa ``directory``"""
+        if self.directory is None:
+            return
+        dirty, self._dirty = self._dirty, {}
+        for resolution, (low, high) in dirty.items():
+            tier, files = self._tiers[resolution], self._files[resolution]
+            capacity = tier["capacity"]
+            positions = slice(None) if high - low + 1 >= capacity else np.arange(low, high + 1) % capacity
+            for name, target in files.items():
+                target[..., positions] = tier[name][..., positions]
+                target.flush()
+        if not self._complete:
+            # layout.json ditulis terakhir: file tanpa layout.json dianggap belum lengkap
+            with open(os.path.join(self.directory, "layout.json"), "w") as f:
+                json.dump(self._layout(), f)
+            self._complete = True
+
+    @property
+    def memory_bytes(self):
+        """Total memori array (tetap, tidak tumbuh seiring waktu)"""
+        return sum(array.nbytes for tier in self._tiers.values()
+                   for array in tier.values() if isinstance(array, np.ndarray))
+
+    def record(self, timestamp, values):
+        """Catat satu sampel untuk semua RS.
+
+        ``values`` memetakan metrik ke array sepanjang jumlah RS (``nan``
+        = tidak ada data). Sampel yang lebih tua dari isi ring diabaikan.
+        """
+        sample = np.full((len(self.metrics), len(self.series_ids)), np.nan, dtype=np.float64)
+        for metric, series in values.items():
+            sample[self._metric[metric]] = series
+        present = ~np.isnan(sample)
+        seconds = int(timestamp) + self.utc_offset
+
+        for resolution, tier in self._tiers.items():
+            bucket = seconds // tier["step"]
+            pos = bucket % tier["capacity"]
+            stamp = tier["stamp"][pos]
+            if stamp > bucket:
+                continue
+            if self.directory is not None:
+                low, high = self._dirty.get(resolution, (bucket, bucket))
+                self._dirty[resolution] = (min(low, bucket), max(high, bucket))
+            if stamp < bucket:
+                tier["stamp"][pos] = bucket
+                tier["last"][..., pos] = np.nan
+                if resolution != "1m":
+                    tier["min"][..., pos] = np.inf
+                    tier["max"][..., pos] = -np.inf
+                    tier["sum"][..., pos] = 0
+                    tier["count"][..., pos] = 0
+
+            tier["last"][..., pos] = np.where(present, sample, tier["last"][..., pos])
+            if resolution != "1m":
+                tier["min"][..., pos] = np.fmin(tier["min"][..., pos], sample)
+                tier["max"][..., pos] = np.fmax(tier["max"][..., pos], sample)
+                tier["sum"][..., pos] += np.where(present, sample, 0)
+                tier["count"][..., pos] += present
+
+    def query(self, metric, start, end, resolution="1h", agg="avg", series_ids=None):
+        """Nilai per bucket antara ``start`` dan ``end`` (epoch detik).
+
+        Mengembalikan ``(timestamps, series_ids, matrix)`` dengan matriks
+        ``(jumlah_rs, jumlah_bucket)``; bucket kosong bernilai ``nan``.
+        """
+        if metric not in self._metric:
+            raise ValueError(f"Metrik tidak dikenal: {metric}")
+        if resolution not in self._tiers:
+            raise ValueError(f"Resolusi tidak dikenal: {resolution}")
+        if agg not in AGGREGATES:
+            raise ValueError(f"Agregasi tidak dikenal: {agg}")
+        if resolution == "1m" and agg != "last":
+            # Tier 1 menit hanya menyimpan nilai terakhir
+            raise ValueError("Resolusi 1m hanya mendukung agg=last")
+        if series_ids is None:
+            series_ids = self.series_ids
+        missing = [series_id for series_id in series_ids if series_id not in self._slot]
+        if missing:
+            raise KeyError(f"RS tidak dikenal: {', '.join(missing)}")
+
+        tier = self._tiers[resolution]
+        step, capacity = tier["step"], tier["capacity"]
+        last_bucket = (int(end) + self.utc_offset) // step
+        first_bucket = max((int(start) + self.utc_offset) // step, last_bucket - capacity + 1)
+        buckets = np.arange(first_bucket, last_bucket + 1, dtype=np.int64)
+        positions = buckets % capacity
+        valid = tier["stamp"][positions] == buckets
+
+        m = self._metric[metric]
+        rows = np.array([self._slot[series_id] for series_id in series_ids], dtype=int)
+        cells = np.ix_(rows, positions)
+        if agg == "last":
+            data = tier["last"][m][cells].astype(np.float64)
+        elif agg == "avg":
+            count = tier["count"][m][cells]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                data = tier["sum"][m][cells] / count
+            data[count == 0] = np.nan
+        else:
+            data = tier[agg][m][cells].astype(np.float64)
+            data[~np.isfinite(data)] = np.nan
+
+        data[:, ~valid] = np.nan
+        return buckets * step - self.utc_offset, list(series_ids), data
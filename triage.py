@@ -0,0 +1,104 @@
+"""Triage keluhan pasien dengan automaton keyword yang dikompilasi sekali"""
+import re
+
+# Urutan level = urutan prioritas (critical > urgent > semi-urgent)
+SEVERITY_LEVELS = [
+    ("critical", "Critical", [
+        'sesak', 'napas', 'dada sakit', 'nyeri dada', 'pingsan',
+        'tidak sadar', 'kejang', 'darah muntah', 'stroke',
+        'jantung', 'serangan jantung', 'kecelakaan', 'luka parah',
+        'pendarahan hebat', 'trauma kepala', 'koma'
+    ]),
+    ("urgent", "Urgent", [
+        'demam tinggi', 'muntah terus', 'diare parah', 'nyeri perut',
+        'sakit perut hebat', 'luka bakar', 'patah tulang', 'cedera',
+        'alergi parah', 'sesak ringan', 'pusing hebat', 'keracunan'
+    ]),
+    ("semi_urgent", "Semi-Urgent", [
+        'demam', 'batuk', 'flu', 'sakit kepala', 'mual', 'muntah',
+        'diare', 'nyeri', 'bengkak', 'luka', 'infeksi', 'gatal'
+    ]),
+]
+
+NON_URGENT = ("non_urgent", "Non-Urgent")
+
+class TriageMatcher:
+    """Satu automaton gabungan untuk seluruh keyword semua level kegawatan.
+
+    Keyword disusun menjadi trie lalu dikompilasi sekali menjadi satu regex
+    ``(?=(...))``; mesin regex (C) berjalan menyusuri trie di setiap posisi
+    teks, sehingga biaya per keluhan tidak tumbuh linear dengan jumlah
+    keyword. Di tiap posisi regex mengembalikan keyword terpanjang; semua
+    keyword lain yang mulai di posisi itu pasti prefiksnya, jadi daftar
+    prefiks yang sudah dihitung di depan melengkapi hasilnya.
+    """
+
+    def __init__(self, levels=SEVERITY_LEVELS):
+        self.levels = [(code, text) for code, text, _ in levels]
+        ranks = {}
+        for rank, (_, _, keywords) in enumerate(levels):
+            for keyword in keywords:
+                ranks.setdefault(keyword.lower(), rank)
+
+        trie = {}
+        for keyword in ranks:
+            node = trie
+            for ch in keyword:
+                node = node.setdefault(ch, {})
+            node[""] = True
+
+        # keyword -> semua keyword yang merupakan prefiksnya (termasuk dirinya)
+        self._prefix_matches = {}
+        for keyword in ranks:
+            self._prefix_matches[keyword] = tuple(
+                (ranks[keyword[:end]], keyword[:end])
+                for end in range(1, len(keyword) + 1)
+                if keyword[:end] in ranks
+            )
+        self._pattern = re.compile("(?=(" + _trie_pattern(trie) + "))") if ranks else None
+
+    def find_all(self, text):
+        """Semua pasangan ``(rank, keyword)`` yang muncul di teks, urut posisi"""
+        if self._pattern is None:
+            return []
+        prefix_matches = self._prefix_matches
+        found = []
+        for longest in self._pattern.findall(text.lower()):
+            found.extend(prefix_matches[longest])
+        return found
+
+    def match(self, complaint):
+        """Level kegawatan tertinggi beserta keyword yang cocok pada level itu"""
+        found = self.find_all(complaint or "")
+        if not found:
+            code, text = NON_URGENT
+            return {"severity_code": code, "severity_text": text, "matched_keywords": []}
+        best = min(rank for rank, _ in found)
+        matched = []
+        for rank, keyword in found:
+            if rank == best and keyword not in matched:
+                matched.append(keyword)
+        code, text = self.levels[best]
+        return {"severity_code": code, "severity_text": text, "matched_keywords": matched}
+
+def _trie_pattern(node):
+    """Regex untuk satu node trie; cabang terpanjang dicoba lebih dulu (greedy)"""
+    branches = [re.escape(ch) + _trie_pattern(child) for ch, child in sorted(node.items()) if ch]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if "" in node:
+        return (body + "?") if len(branches) > 1 else "(?:" + body + ")?"
+    return body
+
+TRIAGE_MATCHER = TriageMatcher()
+
+def analyze_severity(complaint):
+    """Analisis tingkat kegawatan berdasarkan keluhan"""
+    result = TRIAGE_MATCHER.match(complaint)
+    return result["severity_code"], result["severity_text"]
+
+def analyze_severity_many(complaints):
+    """Triage banyak keluhan sekaligus (automaton yang sama untuk semua)"""
+    match = TRIAGE_MATCHER.match
+    return [match(complaint) for complaint in complaints]